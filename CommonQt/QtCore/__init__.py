@@ -4,3 +4,4 @@ except ImportError:
     from PySide.QtCore import *
 
 from .updater import UpdateTimer
+from .scheduler import UpdateScheduler
@@ -0,0 +1,112 @@
+try:
+    from PySide2 import QtCore
+except ImportError:
+    from PySide import QtCore
+
+
+class UpdateScheduler(QtCore.QObject):
+    """
+    Coalesces bursts of update requests into a single deferred update.  Every request restarts a
+    single shot timer so the update is only run once the requests have settled.
+
+    If a state function is given then it is called before each update and the update is skipped
+    when the state is the same as it was for the last update that was run.  The state function
+    should be cheap, ie: version stamps rather than collecting data, as it is called for every
+    update that would have been run
+
+    Args:
+        callback (callable): This is the update that is to be run
+
+    Kwargs:
+        interval (int|optional): This is the time in milliseconds to wait for the requests to settle
+                 default: 50
+        coalesce (bool|optional): True or False if the requests are to be coalesced.  When False
+                                  the update is run straight away for every request
+                 default: True
+        stateFunction (callable|optional): This returns the current state that the update depends on
+    """
+
+    updatePerformed = QtCore.Signal()
+
+    def __init__(self, callback, **kwargs):
+        super(UpdateScheduler, self).__init__()
+
+        self.callback = callback
+        self.coalesce = kwargs.get('coalesce', True)
+        self.stateFunction = kwargs.get('stateFunction', None)
+
+        self._lastState = None
+        self._hasState = False
+        self._metrics = {'requested': 0,
+                         'performed': 0,
+                         'coalesced': 0,
+                         'skipped': 0}
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(kwargs.get('interval', 50))
+        self.timer.timeout.connect(self._run)
+
+    @property
+    def metrics(self):
+        """
+        Returns:
+            dict: This is the number of updates that were requested, performed, coalesced into
+                  another request and skipped as the state was unchanged
+        """
+        return dict(self._metrics)
+
+    def resetMetrics(self):
+        """
+        Resets all the metrics back to zero
+        """
+        for key in self._metrics:
+            self._metrics[key] = 0
+
+    def invalidate(self):
+        """
+        Clears the last state so the next update is always run, ie: when the update has also been
+        run directly
+        """
+        self._lastState = None
+        self._hasState = False
+
+    def request(self, *args):
+        """
+        Requests an update.  This can be connected directly to any signal
+        Args:
+            *args: Unused in place to avoid errors when it gets called from signals
+        """
+        self._metrics['requested'] += 1
+        if not self.coalesce:
+            self._run()
+            return
+
+        if self.timer.isActive():
+            self._metrics['coalesced'] += 1
+        self.timer.start()
+
+    def flush(self):
+        """
+        Runs any pending update straight away
+        """
+        if self.timer.isActive():
+            self.timer.stop()
+            self._run()
+
+    def _run(self):
+        """
+        Runs the update unless the state has not changed since the last update was run
+        """
+        if self.stateFunction is not None:
+            state = self.stateFunction()
+            if self._hasState and state == self._lastState:
+                self._metrics['skipped'] += 1
+                return
+
+            self._lastState = state
+            self._hasState = True
+
+        self._metrics['performed'] += 1
+        self.callback()
+        self.updatePerformed.emit()
@@ -9,8 +9,10 @@ from .customWidgets.filteredComboBox import FilteredComboBox
 from .customWidgets.baseWidget import BaseWidget
 from .customWidgets.labeledWidget import LabeledWidget
 from .customWidgets.customListWidget import CustomListWidget
+from .customWidgets.customListView import CustomListView
 from .customWidgets.customMessage import CustomMessage
 from .customWidgets.codeEditor import CodeEditor
 from .customWidgets.mouseClickEmitter import MouseEventFilter
+from .customWidgets.inputBlocker import InputBlocker
 
 from .highlighters import syntaxPython
@@ -0,0 +1,160 @@
+try:
+    from PySide2 import QtWidgets, QtGui, QtCore
+
+except ImportError:
+    from PySide import QtGui, QtCore
+    QtWidgets = QtGui
+
+
+class CustomListView(QtWidgets.QListView):
+    """
+    Model based version of the CustomListWidget.  Only the rows that are visible are ever painted so
+    this is intended for lists with a large number of items.  The right click menu has the same api
+    as the CustomListWidget.
+
+    The model is expected to return the data item for each row with the itemRole so that the items
+    can be collected from the view
+    """
+
+    actionSingle = 'single'
+    actionMultiple = 'multiple'
+    itemRole = QtCore.Qt.UserRole
+
+    def __init__(self):
+        super(CustomListView, self).__init__()
+
+        self.menu = None
+        self.menuActions = list()
+
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(self.ExtendedSelection)
+        self.setStyleSheet('QListView::item { border-bottom: 1px solid grey; } '
+                           'QListView::item:selected {background-color: '
+                           'QLinearGradient( x1: 0, y1: 0, x2: 0, y2: 1, stop: 0 #148F77, '
+                           'stop: 1 #0E6251);}')
+
+    def count(self):
+        """
+        Returns:
+            int: This is the number of rows in the model
+        """
+        if self.model() is None:
+            return 0
+
+        return self.model().rowCount()
+
+    def item(self, row):
+        """
+        Args:
+            row (int): This is the row to collect the item for
+
+        Returns:
+            object: This is the data item for the row from the model
+        """
+        return self.model().index(row, 0).data(self.itemRole)
+
+    @property
+    def items(self):
+        """
+        Returns:
+            list: All the data items in the model
+        """
+        return [self.item(row) for row in range(self.count())]
+
+    @property
+    def selectedItems(self):
+        """
+        Returns:
+            list: All the data items for the currently selected rows
+        """
+        return [index.data(self.itemRole) for index in self.selectedIndexes()]
+
+    def addMenuItem(self, name, action, **kwargs):
+        """
+        This is used to add a menu item to the right click menu.  Selection type can be either
+        single or multiple
+        Args:
+            name (str): This is the name for the menu item
+            action (callable): This is the action that will be triggered by the menu item.  This
+                               will have the row passed to it
+        Kwargs:
+            selectionType (int|optional): This is either single or multiple to determine the items
+                                          that will pertain to the action
+        """
+        menuAction = QtWidgets.QAction(name, self)
+        kwargs['action'] = action
+        menuAction.setData(kwargs)
+        self.menuActions.append(menuAction)
+
+    def mousePressEvent(self, event):
+        """
+        This is overridden to add in a menu to allow for easy customization and additional actions
+        to items in the list
+        Args:
+            event (QtGui.QMouseEvent): This is the QMouseEvent that triggered the method
+        """
+
+        # Collect the current item under the mouse
+        pos = self.mapFromGlobal(QtGui.QCursor.pos())
+        index = self.indexAt(pos)
+        row = index.row()
+
+        # If the event is not a button press then we just treat this as a regular event
+        if not event.type() == QtCore.QEvent.MouseButtonPress:
+            return super(CustomListView, self).mousePressEvent(event)
+
+        # If the event is a right click then we will show our menu if there are any items
+        if event.button() == QtCore.Qt.RightButton:
+            if self.count() == 0:
+                event.ignore()
+                return
+
+            # If there aren't and defined menu items then we ignore the event and return
+            if not self.menuActions:
+                event.ignore()
+                return
+
+            self.menu = QtWidgets.QMenu()
+            self.selectionModel().setCurrentIndex(index, QtCore.QItemSelectionModel.Current)
+            self._populateMenuItems()
+            action = self.menu.exec_(QtGui.QCursor.pos())
+            if not action:
+                event.ignore()
+                return
+            if action.data().get('selectionType', self.actionSingle) == self.actionSingle:
+                rows = [row]
+            else:
+                rows = [selectedIndex.row() for selectedIndex in self.selectedIndexes()]
+
+            # Call the action with the current rows
+            action.data().get('action')(rows)
+            return
+
+        # Here we clear the selection if the user presses the left button
+        elif event.button() == QtCore.Qt.LeftButton:
+            if row < 0:
+                self.clearSelection()
+                event.ignore()
+                return
+            return super(CustomListView, self).mousePressEvent(event)
+        else:
+            event.ignore()
+
+    def _populateMenuItems(self):
+        """
+        This will create and populate all the menu items for the right click menu.  Creating
+        separate entries if there are any defined sub menus.
+        """
+
+        subMenus = dict()
+        for menuAction in self.menuActions:
+            subMenu = menuAction.data().get('subMenu', '')
+            menuActions = subMenus.get(subMenu, list())
+            menuActions.append(menuAction)
+            subMenus[subMenu] = menuActions
+
+        for subMenu, menuActions in subMenus.items():
+            if subMenu:
+                self.menu.addSection(subMenu)
+            for menuAction in menuActions:
+                self.menu.addAction(menuAction)
@@ -0,0 +1,89 @@
+try:
+    from PySide2 import QtWidgets, QtCore
+except ImportError:
+    from PySide import QtGui, QtCore
+    QtWidgets = QtGui
+
+
+class InputBlocker(QtCore.QObject):
+    """
+    Event filter that blocks all the mouse and keyboard input to the application, apart from the
+    allowed widgets, while it is active.  Events are still processed so the application stays
+    responsive and keeps painting, ie: while a long running edit is made in chunks that must not
+    have any other edits made between them
+
+    Kwargs:
+        allowed (list[QWidget]|optional): These are the widgets, and their children, that still
+                                          receive input while the input is blocked
+    """
+
+    _blockedEvents = {QtCore.QEvent.MouseButtonPress,
+                      QtCore.QEvent.MouseButtonRelease,
+                      QtCore.QEvent.MouseButtonDblClick,
+                      QtCore.QEvent.Wheel,
+                      QtCore.QEvent.KeyPress,
+                      QtCore.QEvent.KeyRelease,
+                      QtCore.QEvent.ShortcutOverride,
+                      QtCore.QEvent.DragEnter,
+                      QtCore.QEvent.Drop}
+
+    def __init__(self, **kwargs):
+        super(InputBlocker, self).__init__()
+
+        self.allowed = list(kwargs.get('allowed', list()))
+        self._active = False
+
+    @property
+    def isActive(self):
+        """
+        Returns:
+            bool: True or False if the input is being blocked
+        """
+        return self._active
+
+    def start(self):
+        """
+        Starts blocking the input to the application
+        """
+        if self._active:
+            return
+
+        QtWidgets.QApplication.instance().installEventFilter(self)
+        self._active = True
+
+    def stop(self):
+        """
+        Stops blocking the input to the application
+        """
+        if not self._active:
+            return
+
+        QtWidgets.QApplication.instance().removeEventFilter(self)
+        self._active = False
+
+    def eventFilter(self, obj, event):
+        """
+        Override handler used to drop any input that is not for the allowed widgets
+        """
+        if event.type() in self._blockedEvents and not self._isAllowed(obj):
+            return True
+
+        return super(InputBlocker, self).eventFilter(obj, event)
+
+    def _isAllowed(self, obj):
+        """
+        Args:
+            obj (QObject): This is the object that the event is for
+
+        Returns:
+            bool: True or False if the object is, or is within, one of the allowed widgets
+        """
+        if not isinstance(obj, QtWidgets.QWidget):
+            # The window handles pass the input on to the widgets so they are filtered there
+            return True
+
+        for widget in self.allowed:
+            if obj is widget or widget.isAncestorOf(obj):
+                return True
+
+        return False
@@ -24,6 +24,12 @@ class MultiCompleteLine(QtWidgets.QLineEdit):
                                          completion addition
         completionAddition (str|optional): This is the value that will be added to each completion
                                            when it is activated
+        completionEngine (object|optional): This is an engine used to look up and rank the
+                                            completions, see common.completion.  When not set the
+                                            completions are filtered by the QCompleter
+        prefixCharacters (str|optional): These are characters which are stripped from the start of
+                                         the current word before it is completed and are kept when
+                                         the completion is inserted, ie: operators such as ( or !
     """
 
     itemComplete = QtCore.Signal(str)
@@ -45,6 +51,7 @@ class MultiCompleteLine(QtWidgets.QLineEdit):
                               QtCore.Qt.Key_Escape]
 
         self._completionValues = None
+        self._completionEngine = None
         self._completionAddition = None
         self._separators = None
         self._baseValidator = self.validator()
@@ -53,6 +60,8 @@ class MultiCompleteLine(QtWidgets.QLineEdit):
         self.escapeClear = kwargs.get('escapeClear', False)
         self.separators = kwargs.get('separators', [' '])
         self.completionAddition = kwargs.get('completionAddition', None)
+        self.completionEngine = kwargs.get('completionEngine', None)
+        self.prefixCharacters = kwargs.get('prefixCharacters', '')
 
     @property
     def completionAddition(self):
@@ -76,6 +85,29 @@ class MultiCompleteLine(QtWidgets.QLineEdit):
             raise ValueError('The given addition is invalid.  Please ensure that the addition is '
                              'included in the separators')
 
+    @property
+    def completionEngine(self):
+        """
+        Returns:
+            object|None: This is the engine used to look up the completions, see common.completion
+        """
+        return self._completionEngine
+
+    @completionEngine.setter
+    def completionEngine(self, engine):
+        """
+        Sets the engine used to look up and rank the completions.  As the engine returns only the
+        completions for the current prefix the QCompleter is set to show them unfiltered
+        Args:
+            engine (object|None): This is the completion engine, see common.completion
+        """
+        self._completionEngine = engine
+        if engine is None:
+            self._completer.setCompletionMode(QtWidgets.QCompleter.PopupCompletion)
+        else:
+            self._completer.setCompletionMode(QtWidgets.QCompleter.UnfilteredPopupCompletion)
+            engine.setValues(self._completionValues or list())
+
     @property
     def separators(self):
         """
@@ -141,7 +173,7 @@ class MultiCompleteLine(QtWidgets.QLineEdit):
 
         return ''.join(letters)
 
-    def setCompletionValues(self, values, updateCache=True):
+    def setCompletionValues(self, values, updateCache=True, frequencies=None):
         """
         This is used to set the values that are to be used for the autocompletion
         Args:
@@ -149,12 +181,17 @@ class MultiCompleteLine(QtWidgets.QLineEdit):
             updateCache (bool|optional): True or False if the internal cache of completions is to be
                                          updated.  This is only used internally and set to false
                                          when we are limiting existing items
+            frequencies (dict|optional): This is a dict of each value to the number of times it
+                                         occurs.  This is passed to the completion engine to rank the
+                                         completions
         """
 
         if not isinstance(values, list):
             values = list(values)
         if updateCache:
             self._completionValues = values
+            if self._completionEngine is not None:
+                self._completionEngine.setValues(values, frequencies)
         self.completerModel.setStringList(values)
 
     def setRegEx(self, regex):
@@ -216,19 +253,27 @@ class MultiCompleteLine(QtWidgets.QLineEdit):
 
         prefix = self._completer.completionPrefix()
 
-        if prefix:
-            completion = completion.split(prefix, 1)[-1]
+        # Fuzzy completions do not have to start with the typed text so the whole word is replaced
+        if prefix and not completion.startswith(prefix):
+            replace = True
+
+        if prefix and not replace:
+            completion = completion[len(prefix):]
 
         if replace:
-            self.currentWordAction(action=self.actionReplace)
+            currentWord = self.currentWordAction(action=self.actionReplace)
+            if self.prefixCharacters:
+                completion = currentWord[:len(currentWord) - len(
+                    currentWord.lstrip(self.prefixCharacters))] + completion
 
         if self.completionAddition and completion:
             completion += self.completionAddition
 
         self.insert(completion)
         cursorPosition = int(self.cursorPosition())
-        separators = self.separators.findall(self.text())
-        self.setText(re.sub(self.separators.pattern + '+', separators[0], self.text()))
+        # Only repeated separators are collapsed so any other characters between the values, such as
+        # operators in an expression, are left as they were typed
+        self.setText(re.sub('({0})\\1+'.format(self.separators.pattern), r'\1', self.text()))
         self.setCursorPosition(cursorPosition)
 
         self.itemComplete.emit(self.currentWordAction(action=self.actionGet,
@@ -307,10 +352,17 @@ class MultiCompleteLine(QtWidgets.QLineEdit):
         """
         if prefix is None:
             prefix = self.textUnderCursor
+            if self.prefixCharacters:
+                prefix = prefix.lstrip(self.prefixCharacters)
 
-        values = self._completionValues or list()
-        if self.ignoreExisting:
-            values = [value for value in values if value not in self.values]
+        # The existing values are only parsed once rather than for every possible completion
+        existingValues = set(self.values) if self.ignoreExisting else None
+        if self._completionEngine is not None:
+            values = self._completionEngine.complete(prefix, exclude=existingValues)
+        else:
+            values = self._completionValues or list()
+            if existingValues:
+                values = [value for value in values if value not in existingValues]
         self.setCompletionValues(values, updateCache=False)
 
         if prefix != self._completer.completionPrefix() or force:
@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+
+_benchmarkDir = os.path.dirname(os.path.abspath(__file__))
+_rootDir = os.path.dirname(_benchmarkDir)
+# The stubs are only ever placed on the path here so that they can never shadow a real nuke
+sys.path.insert(0, os.path.join(_benchmarkDir, 'stubs'))
+sys.path.insert(0, _rootDir)
+sys.path.insert(0, _benchmarkDir)
+
+import nuke
+
+import common.utilities
+import common.dependencies
+import nodeTag.index
+import nodeTag.logic
+import searchReplace.logic
+
+import scripts
+
+
+'''
+Headless benchmark suite for the nodeTag and searchReplace tools.  This runs with plain python using
+the synthetic nuke module within benchmarks/stubs, see benchmarks/stubs/nuke.py, so the timings
+are only a relative measure of the python side of the tools and should be compared between commits
+rather than taken as the time within a Nuke session
+
+Usage:
+    python benchmarks/runBenchmarks.py
+    python benchmarks/runBenchmarks.py --sizes 1000 10000 --repeat 3
+    python benchmarks/runBenchmarks.py --compare benchmarks/results/<commit>.json
+
+The results are written as json to benchmarks/results/<commit>.json unless an output is given
+'''
+
+BENCHMARKS = list()
+
+
+def benchmark(name):
+    """
+    Decorator to register a function with the benchmark suite.  The function will receive the
+    context dict for the current script, see _createContext
+    Args:
+        name (str): This is the name that the timings are recorded under
+    """
+    def register(function):
+        BENCHMARKS.append((name, function))
+        return function
+
+    return register
+
+
+@benchmark('TagIndex.rebuild')
+def benchmarkIndexRebuild(context):
+    nodeTag.index.TagIndex.rebuild()
+
+
+@benchmark('findNodes(tag)')
+def benchmarkFindNodes(context):
+    nodeTag.logic.findNodes(['comp'])
+
+
+@benchmark('findNodes(tags, matchAll=False)')
+def benchmarkFindNodesAny(context):
+    nodeTag.logic.findNodes(['roto', 'paint', 'shotA'], matchAll=False, recurseGroups=True)
+
+
+@benchmark('findNodes(expression)')
+def benchmarkFindNodesExpression(context):
+    nodeTag.logic.findNodes('(comp | roto) & !deprecated', recurseGroups=True)
+
+
+@benchmark('findNodes(exactMatch=False)')
+def benchmarkFindNodesPartial(context):
+    nodeTag.logic.findNodes(['sh'], exactMatch=False, caseSensitive=False, recurseGroups=True)
+
+
+@benchmark('findNodes(limitToSelected)')
+def benchmarkFindNodesSelected(context):
+    nodeTag.logic.findNodes(['comp'], limitToSelected=True)
+
+
+@benchmark('findNodes(nodes)')
+def benchmarkFindNodesGiven(context):
+    nodeTag.logic.findNodes(['comp'], nodes=context['sample'])
+
+
+@benchmark('findNodes(nodeClass, limit=1)')
+def benchmarkFindNodesPreview(context):
+    nodeTag.logic.findNodes(['comp'], nodeClass='Grade', recurseGroups=True, limit=1)
+
+
+@benchmark('getAllTags')
+def benchmarkGetAllTags(context):
+    nodeTag.logic.getAllTags()
+
+
+@benchmark('getTagStatistics')
+def benchmarkGetTagStatistics(context):
+    nodeTag.logic.getTagStatistics()
+
+
+@benchmark('tagNodes + removeTags')
+def benchmarkTagNodes(context):
+    nodeTag.logic.tagNodes(context['sample'], ['benchmark'], append=True)
+    nodeTag.logic.modifyTags(context['sample'], remove=['benchmark'])
+
+
+@benchmark('allNodes(recurseGroups=True)')
+def benchmarkAllNodes(context):
+    common.utilities.allNodes(recurseGroups=True)
+
+
+@benchmark('allNodes(uncached)')
+def benchmarkAllNodesUncached(context):
+    common.utilities.NodeCache.refresh()
+    common.utilities.allNodes(recurseGroups=True, recurseGizmos=True)
+
+
+@benchmark('select(sample)')
+def benchmarkSelect(context):
+    common.utilities.select(context['sample'])
+    common.utilities.deselect()
+
+
+@benchmark('Dependencies.getDependencies')
+def benchmarkDependencies(context):
+    for node in context['chainEnds']:
+        common.dependencies.Dependencies.getDependencies(node, recurseGroups=True)
+
+
+@benchmark('searchReplace.getNodeInfo')
+def benchmarkGetNodeInfo(context):
+    searchReplace.logic.getNodeInfo(context['allNodes'], 'plates', 'elements')
+
+
+@benchmark('searchReplace.getNodeInfo(limit=10)')
+def benchmarkGetNodeInfoPreview(context):
+    searchReplace.logic.getNodeInfo(None, 'plates', 'elements', recurseGroups=True, limit=10)
+
+
+def _createContext(nodeCount, seed):
+    """
+    Builds the script for the given size and collects the nodes that are shared between the
+    benchmarks
+    Args:
+        nodeCount (int): This is the number of nodes to build the script with
+        seed (int): This is the seed for the script generation
+
+    Returns:
+        dict: This is the context passed to each benchmark
+    """
+    nodes = scripts.buildScript(nodeCount, seed=seed)
+    randomizer = random.Random(seed)
+    rootNodes = [node for node in nodes if node.parent() is nuke.root()]
+    chainEnds = set(rootNodes).difference(node.input(0) for node in rootNodes)
+
+    return {'nodeCount': nodeCount,
+            'nodes': nodes,
+            'allNodes': common.utilities.allNodes(recurseGroups=True),
+            'sample': set(randomizer.sample(rootNodes, max(1, len(rootNodes) // 10))),
+            'chainEnds': randomizer.sample(sorted(chainEnds, key=lambda node: node.name()),
+                                           min(20, len(chainEnds)))}
+
+
+def _time(function, context, repeat):
+    """
+    Args:
+        function (callable): This is the benchmark to time
+        context (dict): This is the context to pass to the benchmark
+        repeat (int): This is the number of times to run the benchmark
+
+    Returns:
+        dict: This is the min, median and mean of the timings in seconds
+    """
+    timings = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(context)
+        timings.append(time.perf_counter() - start)
+
+    return {'min': min(timings),
+            'median': statistics.median(timings),
+            'mean': statistics.mean(timings),
+            'repeat': repeat}
+
+
+def _getCommit():
+    """
+    Returns:
+        str: This is the current git commit of the repository or unknown if it can't be found
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=_rootDir,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def runBenchmarks(sizes, **kwargs):
+    """
+    This will build a script for each of the given sizes and time all the registered benchmarks
+
+    Args:
+        sizes (list): This is a list of the node counts to benchmark
+
+    Kwargs:
+        repeat (int|optional): This is the number of times to run each benchmark
+               default: 5
+        seed (int|optional): This is the seed for the script generation
+             default: 0
+        filter (str|optional): Only benchmarks with this string in their name are run
+
+    Returns:
+        dict: This is the results with the environment information
+    """
+    repeat = kwargs.get('repeat', 5)
+    seed = kwargs.get('seed', 0)
+    nameFilter = kwargs.get('filter', None)
+
+    results = {'commit': _getCommit(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'seed': seed,
+               'results': dict()}
+
+    for nodeCount in sizes:
+        start = time.perf_counter()
+        context = _createContext(nodeCount, seed)
+        logging.info('Built {0} node script in {1:.2f}s'.format(nodeCount, time.perf_counter() - start))
+
+        sizeResults = results['results'].setdefault(str(nodeCount), dict())
+        for name, function in BENCHMARKS:
+            if nameFilter and nameFilter not in name:
+                continue
+
+            sizeResults[name] = _time(function, context, repeat)
+            logging.info('{0:>8} {1:<36} {2:10.3f}ms'.format(nodeCount, name,
+                                                             sizeResults[name]['median'] * 1000))
+
+    return results
+
+
+def compareResults(results, baseline):
+    """
+    Logs the ratio of the median timings against a baseline set of results
+
+    Args:
+        results (dict): This is the current results
+        baseline (dict): This is the results to compare against
+    """
+    logging.info('Comparing against {0}'.format(baseline.get('commit')))
+    for nodeCount, sizeResults in results['results'].items():
+        baselineResults = baseline['results'].get(nodeCount, dict())
+        for name, timings in sizeResults.items():
+            if name not in baselineResults:
+                continue
+
+            ratio = timings['median'] / max(baselineResults[name]['median'], 1e-9)
+            logging.info('{0:>8} {1:<36} {2:8.2f}x'.format(nodeCount, name, ratio))
+
+
+def main(args=None):
+
+    parser = argparse.ArgumentParser(description=__doc__ or 'Headless benchmarks for the nuke tools')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--filter', default=None)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--compare', default=None)
+    arguments = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+    results = runBenchmarks(arguments.sizes,
+                            repeat=arguments.repeat,
+                            seed=arguments.seed,
+                            filter=arguments.filter)
+
+    output = arguments.output or os.path.join(_benchmarkDir, 'results',
+                                              '{0}.json'.format(results['commit']))
+    with open(output, 'w') as outputFile:
+        json.dump(results, outputFile, indent=4, sort_keys=True)
+    logging.info('Results written to {0}'.format(output))
+
+    if arguments.compare:
+        with open(arguments.compare) as baselineFile:
+            compareResults(results, json.load(baselineFile))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import random
+
+import nuke
+
+import nodeTag.logic
+
+from nodeTag.globals import Globals
+
+
+'''
+Generates synthetic nuke scripts for the benchmark suite.  The scripts are built from chains of
+nodes which mimic the general layout of a comp, a read at the top of each chain with a series of
+filters below it.  A portion of the chains are placed within groups and gizmos and the tags are
+distributed with a long tail so that there are a handful of common tags and many rare ones
+'''
+
+tagVocabulary = ['comp', 'roto', 'paint', 'cleanup', 'keying', 'despill', 'grain', 'lensing',
+                 'tracking', 'matchmove', 'fx', 'lighting', 'env', 'fg', 'bg', 'mg', 'hero',
+                 'approved', 'wip', 'deprecated', 'review', 'client', 'temp', 'denoise', 'retime',
+                 'precomp', 'cg', 'plate', 'element', 'smoke', 'fire', 'debris', 'sky', 'water',
+                 'crowd', 'set-ext', 'beauty', 'aov', 'utility', 'camera', 'stereo', 'left',
+                 'right', 'v001', 'v002', 'v003', 'shotA', 'shotB', 'shotC', 'shotD']
+filterClasses = ['Blur', 'Grade', 'ColorCorrect', 'Transform', 'Merge2', 'Roto', 'Keyer',
+                 'Shuffle2', 'Dot', 'Crop']
+
+
+def _pickTags(randomizer):
+    """
+    Args:
+        randomizer (random.Random): This is the random generator to use
+
+    Returns:
+        set: This is a set of 0 - 4 tags weighted towards the start of the vocabulary
+    """
+    count = randomizer.choice([0, 0, 1, 1, 1, 2, 2, 3, 4])
+    return {tagVocabulary[min(int(randomizer.paretovariate(1.2)) - 1, len(tagVocabulary) - 1)]
+            for _ in range(count)}
+
+
+def _createChain(length, randomizer, group=None):
+    """
+    This will create a chain of nodes starting with a read node
+    Args:
+        length (int): This is the number of nodes in the chain
+        randomizer (random.Random): This is the random generator to use
+
+    Kwargs:
+        group (nuke.Group|optional): This is the group to create the nodes within
+
+    Returns:
+        list: This is a list of the nodes created
+    """
+    read = nuke.createNode('Read', group=group)
+    fileKnob = nuke.File_Knob('file')
+    read.addKnob(fileKnob)
+    fileKnob.setValue('/jobs/show/seq{0:03}/plates/{1}_v{2:03}.####.exr'.format(
+        randomizer.randint(1, 40), read.name(), randomizer.randint(1, 20)))
+
+    nodes = [read]
+    for _ in range(length - 1):
+        node = nuke.createNode(randomizer.choice(filterClasses), group=group)
+        node.setInput(0, nodes[-1])
+        nodes.append(node)
+
+    return nodes
+
+
+def buildScript(nodeCount, **kwargs):
+    """
+    This will clear the current fake script and build a new one with roughly the given number of
+    nodes
+
+    Args:
+        nodeCount (int): This is the number of nodes to create
+
+    Kwargs:
+        seed (int|optional): This is the seed used so that the scripts are reproducible
+             default: 0
+        chainLength (int|optional): This is the number of nodes within each chain
+                    default: 50
+        groupRatio (float|optional): This is the ratio of chains that are placed within groups
+                   default: 0.1
+        gizmoRatio (float|optional): This is the ratio of chains that are placed within gizmos
+                   default: 0.02
+        selectedRatio (float|optional): This is the ratio of nodes that are selected
+                      default: 0.05
+        expressionRatio (float|optional): This is the ratio of nodes that are expression linked
+                                          to a node in another chain
+                        default: 0.02
+
+    Returns:
+        list: This is a list of all the nodes that were created
+    """
+    randomizer = random.Random(kwargs.get('seed', 0))
+    chainLength = kwargs.get('chainLength', 50)
+    groupRatio = kwargs.get('groupRatio', 0.1)
+    gizmoRatio = kwargs.get('gizmoRatio', 0.02)
+    selectedRatio = kwargs.get('selectedRatio', 0.05)
+    expressionRatio = kwargs.get('expressionRatio', 0.02)
+
+    nuke.scriptClear()
+
+    nodes = list()
+    while len(nodes) < nodeCount:
+        length = min(chainLength, nodeCount - len(nodes))
+        roll = randomizer.random()
+        group = None
+        if length > 1 and roll < gizmoRatio:
+            group = nuke.createNode('Gizmo_{0}'.format(randomizer.randint(1, 5)))
+            nodes.append(group)
+            length -= 1
+        elif length > 1 and roll < gizmoRatio + groupRatio:
+            group = nuke.createNode('Group')
+            nodes.append(group)
+            length -= 1
+
+        nodes.extend(_createChain(length, randomizer, group=group))
+
+    for node in nodes:
+        tags = _pickTags(randomizer)
+        if tags:
+            nodeTag.logic.createKnobs(node).setValue(Globals.tagSeparator.join(sorted(tags)))
+        if randomizer.random() < selectedRatio:
+            node['selected'].setValue(True)
+        if randomizer.random() < expressionRatio:
+            node._expressionLinks.append(randomizer.choice(nodes))
+
+    return nodes
@@ -0,0 +1,556 @@
+"""
+Synthetic stand-in for the nuke python module used by the benchmark suite.
+
+This only models the small part of the nuke api that the tools in this repository touch so that
+the logic can be timed with plain python outside of a Nuke session.  It is not a complete or
+accurate emulation of nuke and should never be placed on the path of a real Nuke install.
+
+Modelled:
+    nodes, groups, gizmos, knobs (String_Knob, File_Knob, Tab_Knob, Boolean_Knob), node
+    selection, inputs, expression links for dependencies, undo groups, main thread execution and
+    the knobChanged/onCreate/onDestroy callbacks.  Only the knob values that are set within an
+    undo group are recorded for undo and redo, which, as in nuke, do not run any callbacks
+"""
+GUI = False
+
+INVISIBLE = 0x01
+INPUTS = 0x01
+HIDDEN_INPUTS = 0x02
+EXPRESSIONS = 0x04
+
+_callbacks = {'knobChanged': list(),
+              'onCreate': list(),
+              'onUserCreate': list(),
+              'onDestroy': list(),
+              'onScriptLoad': list(),
+              'onScriptClose': list()}
+_thisStack = list()
+_contextStack = list()
+
+
+class Knob(object):
+
+    def __init__(self, name, label=None, value=None):
+
+        self._name = name
+        self._label = label or name
+        self._value = value
+        self._flags = 0
+        self._node = None
+
+    def name(self):
+        return self._name
+
+    def label(self):
+        return self._label
+
+    def value(self):
+        return self._value
+
+    def getValue(self):
+        return self._value
+
+    def setValue(self, value):
+
+        changed = value != self._value
+        if changed and Undo._recording is not None:
+            Undo._recording.append((self, self._value))
+        self._value = value
+        if changed and self._node is not None:
+            _runCallbacks('knobChanged', self._node, self)
+
+        return True
+
+    def setFlag(self, flag):
+        self._flags |= flag
+
+    def clearFlag(self, flag):
+        self._flags &= ~flag
+
+    def getFlag(self, flag):
+        return bool(self._flags & flag)
+
+    def isAnimated(self):
+        return False
+
+    def node(self):
+        return self._node
+
+
+class String_Knob(Knob):
+
+    def __init__(self, name, label=None, value=''):
+        super(String_Knob, self).__init__(name, label=label, value=value)
+
+
+class File_Knob(Knob):
+
+    def __init__(self, name, label=None, value=''):
+        super(File_Knob, self).__init__(name, label=label, value=value)
+
+
+class Tab_Knob(Knob):
+    pass
+
+
+class Boolean_Knob(Knob):
+
+    def __init__(self, name, label=None, value=False):
+        super(Boolean_Knob, self).__init__(name, label=label, value=bool(value))
+
+
+class Node(object):
+
+    def __init__(self, nodeClass, name, parent=None):
+
+        self._class = nodeClass
+        self._name = name
+        self._parent = parent
+        self._knobs = dict()
+        self._knobOrder = list()
+        self._inputs = list()
+        self._expressionLinks = list()
+        self._valid = True
+
+        for knob in [String_Knob('name', value=name),
+                     Boolean_Knob('selected'),
+                     Boolean_Knob('disable')]:
+            self.addKnob(knob)
+
+    def _check(self):
+        if not self._valid:
+            raise ValueError('A PythonObject is not attached to a node')
+
+    def Class(self):
+        self._check()
+        return self._class
+
+    def name(self):
+        self._check()
+        return self._name
+
+    def fullName(self):
+        self._check()
+        if self._parent is None or self._parent is _root:
+            return self._name
+
+        return '{0}.{1}'.format(self._parent.fullName(), self._name)
+
+    def knob(self, name):
+        self._check()
+        return self._knobs.get(name, None)
+
+    def knobs(self):
+        self._check()
+        return dict(self._knobs)
+
+    def numKnobs(self):
+        return len(self._knobOrder)
+
+    def allKnobs(self):
+        return [self._knobs[name] for name in self._knobOrder]
+
+    def __getitem__(self, name):
+        knob = self.knob(name)
+        if knob is None:
+            raise NameError('unknown knob: {0}'.format(name))
+        return knob
+
+    def addKnob(self, knob):
+
+        self._knobs[knob.name()] = knob
+        self._knobOrder.append(knob.name())
+        knob._node = self
+        return True
+
+    def removeKnob(self, knob):
+
+        self._knobOrder.remove(knob.name())
+        del self._knobs[knob.name()]
+        knob._node = None
+
+    def isSelected(self):
+        return bool(self._knobs['selected'].value())
+
+    def setSelected(self, selected):
+        self._knobs['selected'].setValue(bool(selected))
+
+    def inputs(self):
+        return len(self._inputs)
+
+    def input(self, index):
+        try:
+            return self._inputs[index]
+        except IndexError:
+            return None
+
+    def setInput(self, index, node):
+
+        while len(self._inputs) <= index:
+            self._inputs.append(None)
+        self._inputs[index] = node
+        return True
+
+    def parent(self):
+        return self._parent
+
+    def __enter__(self):
+        # Matches nuke on python 3.7 where only groups can be used as a context
+        raise AttributeError('__enter__')
+
+    def __exit__(self, *args):
+        raise AttributeError('__exit__')
+
+    def __repr__(self):
+        return '<{0}({1}) at 0x{2:x}>'.format(self._class, self._name, id(self))
+
+
+class Group(Node):
+
+    def __init__(self, nodeClass, name, parent=None):
+        super(Group, self).__init__(nodeClass, name, parent=parent)
+
+        self._nodes = list()
+        self._children = dict()
+
+    def nodes(self):
+        return list(self._nodes)
+
+    def begin(self):
+        _contextStack.append(self)
+        return self
+
+    def end(self):
+        _contextStack.pop()
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, *args):
+        self.end()
+
+
+class Gizmo(Group):
+    pass
+
+
+class Root(Group):
+
+    def __init__(self):
+        super(Root, self).__init__('Root', 'root')
+
+    def fullName(self):
+        return 'root'
+
+
+class Undo(object):
+
+    _depth = 0
+    _disabled = False
+    _recording = None
+    _undoStack = list()
+    _redoStack = list()
+
+    def __init__(self):
+        self._open = False
+
+    def begin(self, name=None):
+        if Undo._depth == 0 and not Undo._disabled:
+            Undo._recording = list()
+        Undo._depth += 1
+        self._open = True
+
+    def end(self):
+        if self._open:
+            Undo._depth -= 1
+            self._open = False
+
+        if Undo._depth == 0 and Undo._recording is not None:
+            if Undo._recording:
+                Undo._undoStack.append(Undo._recording)
+                del Undo._redoStack[:]
+            Undo._recording = None
+
+    def cancel(self):
+        self.end()
+
+    @classmethod
+    def disable(cls):
+        cls._disabled = True
+
+    @classmethod
+    def enable(cls):
+        cls._disabled = False
+
+    @classmethod
+    def disabled(cls):
+        return cls._disabled
+
+    @classmethod
+    def undoSize(cls):
+        return len(cls._undoStack)
+
+    @classmethod
+    def redoSize(cls):
+        return len(cls._redoStack)
+
+    @staticmethod
+    def _swap(source, target):
+
+        if not source:
+            return
+
+        changes = source.pop()
+        target.append([(knob, knob._value) for knob, _ in reversed(changes)])
+        for knob, value in reversed(changes):
+            knob._value = value
+
+    @classmethod
+    def undo(cls):
+        cls._swap(cls._undoStack, cls._redoStack)
+
+    @classmethod
+    def redo(cls):
+        cls._swap(cls._redoStack, cls._undoStack)
+
+
+_root = Root()
+_names = dict()
+
+
+def _runCallbacks(kind, node, knob=None):
+
+    if not _callbacks[kind]:
+        return
+
+    _thisStack.append((node, knob))
+    try:
+        for function, args, kwargs, nodeClass in list(_callbacks[kind]):
+            if nodeClass not in ('*', node._class):
+                continue
+            function(*args, **kwargs)
+    finally:
+        _thisStack.pop()
+
+
+def _addCallback(kind, function, args=(), kwargs=None, nodeClass='*'):
+
+    if not isinstance(args, tuple):
+        args = (args,)
+    _callbacks[kind].append((function, args, kwargs or dict(), nodeClass))
+
+
+def _removeCallback(kind, function, args=(), kwargs=None, nodeClass='*'):
+
+    _callbacks[kind] = [item for item in _callbacks[kind] if item[0] != function]
+
+
+def addKnobChanged(function, args=(), kwargs=None, nodeClass='*', node=None):
+    _addCallback('knobChanged', function, args, kwargs, nodeClass)
+
+
+def removeKnobChanged(function, args=(), kwargs=None, nodeClass='*', node=None):
+    _removeCallback('knobChanged', function, args, kwargs, nodeClass)
+
+
+def addOnCreate(function, args=(), kwargs=None, nodeClass='*'):
+    _addCallback('onCreate', function, args, kwargs, nodeClass)
+
+
+def removeOnCreate(function, args=(), kwargs=None, nodeClass='*'):
+    _removeCallback('onCreate', function, args, kwargs, nodeClass)
+
+
+def addOnUserCreate(function, args=(), kwargs=None, nodeClass='*'):
+    _addCallback('onUserCreate', function, args, kwargs, nodeClass)
+
+
+def addOnDestroy(function, args=(), kwargs=None, nodeClass='*'):
+    _addCallback('onDestroy', function, args, kwargs, nodeClass)
+
+
+def removeOnDestroy(function, args=(), kwargs=None, nodeClass='*'):
+    _removeCallback('onDestroy', function, args, kwargs, nodeClass)
+
+
+def addOnScriptLoad(function, args=(), kwargs=None, nodeClass='Root'):
+    _addCallback('onScriptLoad', function, args, kwargs, nodeClass)
+
+
+def addOnScriptClose(function, args=(), kwargs=None, nodeClass='Root'):
+    _addCallback('onScriptClose', function, args, kwargs, nodeClass)
+
+
+def thisNode():
+    if _thisStack:
+        return _thisStack[-1][0]
+    return thisGroup()
+
+
+def thisKnob():
+    if _thisStack:
+        return _thisStack[-1][1]
+    return None
+
+
+def thisGroup():
+    if _contextStack:
+        return _contextStack[-1]
+    return _root
+
+
+def root():
+    return _root
+
+
+def _uniqueName(nodeClass):
+
+    count = _names.get(nodeClass, 0) + 1
+    _names[nodeClass] = count
+    return '{0}{1}'.format(nodeClass, count)
+
+
+def createNode(nodeClass, knobs=None, inpanel=True, group=None, name=None, nodeType=None):
+    """
+    Creates a node in the current context, or the given group.  The node type can be forced with
+    nodeType otherwise a node with a class ending in Group or Gizmo will be created as such
+    """
+    parent = group or thisGroup()
+    if nodeType is None:
+        nodeType = Node
+        if nodeClass == 'Group':
+            nodeType = Group
+        elif nodeClass.endswith('gizmo') or nodeClass.startswith('Gizmo'):
+            nodeType = Gizmo
+
+    node = nodeType(nodeClass, name or _uniqueName(nodeClass), parent=parent)
+    parent._nodes.append(node)
+    parent._children[node._name] = node
+    _runCallbacks('onCreate', node)
+
+    return node
+
+
+def allNodes(filter=None, group=None, recurseGroups=False):
+
+    group = group or thisGroup()
+    nodes = list()
+    for node in group._nodes:
+        if filter is None or node._class == filter:
+            nodes.append(node)
+
+        if recurseGroups and isinstance(node, Group) and not isinstance(node, Gizmo):
+            nodes.extend(allNodes(filter=filter, group=node, recurseGroups=True))
+
+    return nodes
+
+
+def selectedNodes(filter=None):
+    return [node for node in allNodes(filter=filter) if node._knobs['selected']._value]
+
+
+def selectedNode():
+    nodes = selectedNodes()
+    if not nodes:
+        raise ValueError('no node selected')
+    return nodes[-1]
+
+
+def toNode(name):
+
+    parts = name.split('.')
+    if parts and parts[0] == 'root':
+        parts = parts[1:]
+
+    group = _root
+    node = None
+    for part in parts:
+        node = getattr(group, '_children', dict()).get(part, None)
+        if node is None:
+            return None
+        group = node
+
+    return node
+
+
+def exists(name):
+    return toNode(name) is not None
+
+
+def delete(node):
+
+    if isinstance(node, Group):
+        for child in list(node._nodes):
+            delete(child)
+
+    _runCallbacks('onDestroy', node)
+    node._parent._nodes.remove(node)
+    node._parent._children.pop(node._name, None)
+    node._valid = False
+
+
+def dependencies(nodes, what=INPUTS | HIDDEN_INPUTS | EXPRESSIONS):
+
+    if isinstance(nodes, Node):
+        nodes = [nodes]
+
+    result = list()
+    for node in nodes:
+        if what & (INPUTS | HIDDEN_INPUTS):
+            result.extend(item for item in node._inputs if item is not None)
+        if what & EXPRESSIONS:
+            result.extend(node._expressionLinks)
+
+    return result
+
+
+def undo():
+    Undo.undo()
+
+
+def redo():
+    Undo.redo()
+
+
+def executeInMainThread(function, args=(), kwargs=None):
+
+    if not isinstance(args, tuple):
+        args = (args,)
+    function(*args, **(kwargs or dict()))
+
+
+def executeInMainThreadWithResult(function, args=(), kwargs=None):
+
+    if not isinstance(args, tuple):
+        args = (args,)
+    return function(*args, **(kwargs or dict()))
+
+
+def filename(node, default=None):
+
+    knob = node.knob('file')
+    if knob is None:
+        return default
+    return knob.value()
+
+
+def pluginPath():
+    return list()
+
+
+def pluginAddPath(path):
+    pass
+
+
+def ask(message):
+    return True
+
+
+def scriptClear():
+
+    for node in list(_root._nodes):
+        delete(node)
+    _names.clear()
+    del Undo._undoStack[:]
+    del Undo._redoStack[:]
+
@@ -0,0 +1,358 @@
+import heapq
+import math
+
+
+__release__ = 'release'
+__major__ = 1
+__minor__ = 0
+__bugfix__ = 0
+__version__ = '{release} {major:02}.{minor:02}.{bugfix:02}'.format(release=__release__,
+                                                                   major=__major__,
+                                                                   minor=__minor__,
+                                                                   bugfix=__bugfix__)
+
+
+'''
+Completion engines which can be plugged into CommonQt.QtGui.MultiCompleteLine.  An engine takes the
+full list of values once, with optional frequencies, and precomputes everything that is needed so
+that each keystroke only has to look up the current prefix.
+
+All engines share the same interface
+    setValues(values, frequencies=None)
+    complete(prefix, exclude=None, limit=None) -> list of ranked values
+'''
+
+
+class _TrieNode(object):
+
+    __slots__ = ('children', 'values')
+
+    def __init__(self):
+        self.children = dict()
+        self.values = list()
+
+
+class TrieCompletionEngine(object):
+    """
+    Prefix trie completion engine.  Each node of the trie holds the values below it already sorted by
+    rank so a lookup only has to walk the prefix and then read the values off in order
+
+    Kwargs:
+        caseSensitive (bool|optional): True or False if the prefix must match the case of the values
+                      default: True
+        maxResults (int|optional): This is the maximum number of values returned for a completion
+                   default: 50
+    """
+
+    def __init__(self, values=None, frequencies=None, **kwargs):
+        super(TrieCompletionEngine, self).__init__()
+
+        self.caseSensitive = kwargs.get('caseSensitive', True)
+        self.maxResults = kwargs.get('maxResults', 50)
+
+        self._root = _TrieNode()
+        self._frequencies = dict()
+
+        if values:
+            self.setValues(values, frequencies)
+
+    def __len__(self):
+        return len(self._root.values)
+
+    def _key(self, value):
+        return value if self.caseSensitive else value.lower()
+
+    def rankKey(self, value):
+        """
+        Args:
+            value (str): This is the value to get the rank for
+
+        Returns:
+            tuple: This is the sort key of the value, the most frequent values first then by name
+        """
+        return -self._frequencies.get(value, 0), value.lower(), value
+
+    def setValues(self, values, frequencies=None):
+        """
+        This will rebuild the trie from the given values
+        Args:
+            values (list|set): These are the values that are available for completion
+            frequencies (dict|optional): This is a dict of value to the number of times it occurs.
+                                         Values with higher frequencies are ranked first
+        """
+        self._frequencies = dict(frequencies or dict())
+        self._root = _TrieNode()
+
+        # As the values are inserted in rank order every list in the trie is already sorted
+        for value in sorted(set(values), key=self.rankKey):
+            node = self._root
+            node.values.append(value)
+            for character in self._key(value):
+                child = node.children.get(character, None)
+                if child is None:
+                    child = node.children[character] = _TrieNode()
+                child.values.append(value)
+                node = child
+
+    def complete(self, prefix, exclude=None, limit=None):
+        """
+        Args:
+            prefix (str): This is the text to complete
+
+        Kwargs:
+            exclude (set|optional): These are values that are not to be included in the results
+            limit (int|optional): This is the maximum number of results, defaults to maxResults
+
+        Returns:
+            list: This is the ranked values which start with the given prefix
+        """
+        limit = limit or self.maxResults
+
+        node = self._root
+        for character in self._key(prefix):
+            node = node.children.get(character, None)
+            if node is None:
+                return list()
+
+        results = list()
+        for value in node.values:
+            if exclude and value in exclude:
+                continue
+
+            results.append(value)
+            if len(results) >= limit:
+                break
+
+        return results
+
+
+class FuzzyCompletionEngine(object):
+    """
+    Fuzzy subsequence completion engine in the style of fzf.  A value matches when all the characters of
+    the query appear within it in order, ie: cmp will match comp and compositing.  Matches are scored with
+    bonuses for characters at the start of words and consecutive characters, penalties for gaps and are
+    then boosted by the frequency of the value.
+
+    Everything that does not depend on the query is precomputed when the values are set.  Each value has a
+    bitmask of the characters it contains so values which can't match are rejected without being scored,
+    and when the query is extended, ie: while typing, only the values that matched the previous query are
+    checked again
+
+    Kwargs:
+        caseSensitive (bool|optional): True or False if the query must match the case of the values
+                      default: False
+        maxResults (int|optional): This is the maximum number of values returned for a completion
+                   default: 50
+        frequencyWeight (float|optional): This is the score added for each order of magnitude of the
+                                          frequency of a value
+                        default: 4.0
+    """
+
+    scoreMatch = 16
+    scoreBoundary = 8
+    scoreConsecutive = 4
+    penaltyGapStart = 3
+    penaltyGapExtension = 1
+    penaltyLeading = 1
+    maxLeadingPenalty = 3
+    maxCachedQueries = 64
+
+    def __init__(self, values=None, frequencies=None, **kwargs):
+        super(FuzzyCompletionEngine, self).__init__()
+
+        self.caseSensitive = kwargs.get('caseSensitive', False)
+        self.maxResults = kwargs.get('maxResults', 50)
+        self.frequencyWeight = kwargs.get('frequencyWeight', 4.0)
+
+        self._values = list()
+        self._keys = list()
+        self._masks = list()
+        self._boundaries = list()
+        self._boosts = list()
+        self._ranked = list()
+
+        self._matches = dict()
+
+        self.setValues(values or list(), frequencies)
+
+    def __len__(self):
+        return len(self._values)
+
+    def _key(self, value):
+        return value if self.caseSensitive else value.lower()
+
+    @staticmethod
+    def _mask(text):
+        """
+        Args:
+            text (str): This is the text to get the character mask for
+
+        Returns:
+            int: This is a bitmask with a bit set for each of the characters in the text
+        """
+        mask = 0
+        for character in set(text):
+            mask |= 1 << (ord(character) % 63)
+
+        return mask
+
+    @staticmethod
+    def _getBoundaries(value):
+        """
+        Args:
+            value (str): This is the value to find the word boundaries of
+
+        Returns:
+            int: This is a bitmask with a bit set for each index which starts a word.  This is the first
+                 character, a character after a non alpha numeric character or the start of a camel case
+                 word or number
+        """
+        boundaries = 1
+        for index in range(1, len(value)):
+            previous = value[index - 1]
+            character = value[index]
+            if not previous.isalnum() and character.isalnum():
+                boundaries |= 1 << index
+            elif previous.islower() and character.isupper():
+                boundaries |= 1 << index
+            elif previous.isalpha() != character.isalpha() and character.isalnum():
+                boundaries |= 1 << index
+
+        return boundaries
+
+    def setValues(self, values, frequencies=None):
+        """
+        This will precompute all the data that is needed to score the given values
+        Args:
+            values (list|set): These are the values that are available for completion
+            frequencies (dict|optional): This is a dict of value to the number of times it occurs.
+                                         Values with higher frequencies are ranked first
+        """
+        frequencies = frequencies or dict()
+
+        self._values = sorted(set(values))
+        self._keys = [self._key(value) for value in self._values]
+        self._masks = [self._mask(key) for key in self._keys]
+        self._boundaries = [self._getBoundaries(value) for value in self._values]
+        self._boosts = [math.log10(1 + frequencies.get(value, 0)) * self.frequencyWeight
+                        for value in self._values]
+        self._ranked = sorted(range(len(self._values)),
+                              key=lambda index: (-self._boosts[index], self._keys[index]))
+
+        self._matches.clear()
+
+    def score(self, index, query):
+        """
+        Scores the value at the given index against the query.  The characters are first matched forward
+        to find the end of the match and then backwards from the end so the shortest match is scored
+        Args:
+            index (int): This is the index of the value to score
+            query (str): This is the query, which must already be in the case of the keys
+
+        Returns:
+            float|None: This is the score or None if the value doesn't match the query
+        """
+        key = self._keys[index]
+        position = -1
+        for character in query:
+            position = key.find(character, position + 1)
+            if position < 0:
+                return None
+
+        start = position
+        for character in reversed(query[:-1]):
+            start = key.rfind(character, 0, start)
+
+        boundaries = self._boundaries[index]
+        scoreMatch = self.scoreMatch
+        scoreBoundary = self.scoreBoundary
+        score = -min(start, self.maxLeadingPenalty) * self.penaltyLeading
+        previous = None
+        position = start - 1
+        for character in query:
+            position = key.find(character, position + 1)
+            bonus = scoreBoundary if boundaries >> position & 1 else 0
+            if previous is None:
+                bonus *= 2
+            elif position == previous + 1:
+                bonus = max(bonus, self.scoreConsecutive)
+            else:
+                score -= self.penaltyGapStart + (position - previous - 2) * self.penaltyGapExtension
+
+            score += scoreMatch + bonus
+            previous = position
+
+        return score + self._boosts[index]
+
+    def _match(self, query):
+        """
+        This will score all the values that match the query.  Only the values which matched the longest
+        previous query that the query starts with are checked, so each keystroke narrows the previous
+        results rather than checking all the values again
+        Args:
+            query (str): This is the query, which must already be in the case of the keys
+
+        Returns:
+            list: This is a list of the sort keys for each value that matches.  These are tuples of the
+                  negated score, the length and the key of the value and the index of the value
+        """
+        candidates = range(len(self._values))
+        for length in range(len(query) - 1, 0, -1):
+            previousScores = self._matches.get(query[:length], None)
+            if previousScores is not None:
+                candidates = [item[-1] for item in previousScores]
+                break
+
+        queryMask = self._mask(query)
+        masks = self._masks
+        keys = self._keys
+        scores = list()
+        for index in candidates:
+            if masks[index] & queryMask != queryMask:
+                continue
+
+            score = self.score(index, query)
+            if score is not None:
+                scores.append((-score, len(keys[index]), keys[index], index))
+
+        if len(self._matches) >= self.maxCachedQueries:
+            del self._matches[next(iter(self._matches))]
+        self._matches[query] = scores
+
+        return scores
+
+    def complete(self, prefix, exclude=None, limit=None):
+        """
+        Args:
+            prefix (str): This is the text to complete
+
+        Kwargs:
+            exclude (set|optional): These are values that are not to be included in the results
+            limit (int|optional): This is the maximum number of results, defaults to maxResults
+
+        Returns:
+            list: This is the best matching values for the prefix, best first
+        """
+        limit = limit or self.maxResults
+        query = self._key(prefix)
+
+        if not query:
+            results = list()
+            for index in self._ranked:
+                if exclude and self._values[index] in exclude:
+                    continue
+
+                results.append(self._values[index])
+                if len(results) >= limit:
+                    break
+
+            return results
+
+        scores = self._matches.get(query, None)
+        if scores is None:
+            scores = self._match(query)
+
+        if exclude:
+            scores = [item for item in scores if self._values[item[-1]] not in exclude]
+
+        return [self._values[item[-1]] for item in heapq.nsmallest(limit, scores)]
@@ -98,8 +98,7 @@ class Dependencies(object):
 
             if recurseGroups:
                 try:
-                    dependentNodes = dependentNodes.union(
-                        common.utilities.allNodes(context=connectedNode))
+                    dependentNodes.update(common.utilities.iterNodes(context=connectedNode))
                 except AttributeError:
                     pass
 
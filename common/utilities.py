@@ -1,12 +1,15 @@
 import os
 import nuke
+import queue
 import logging
 import threading
+import collections
+import concurrent.futures
 
 
 __release__ = 'release'
-__major__ = 1
-__minor__ = 1
+__major__ = 2
+__minor__ = 0
 __bugfix__ = 0
 __version__ = '{release} {major:02}.{minor:02}.{bugfix:02}'.format(release=__release__,
                                                                    major=__major__,
@@ -14,11 +17,309 @@ __version__ = '{release} {major:02}.{minor:02}.{bugfix:02}'.format(release=__rel
                                                                    bugfix=__bugfix__)
 
 
+def runInMainThread(function, *args, **kwargs):
+    """
+    Calls the function in the main thread and waits for the result.  If this is already the main
+    thread then the function is called straight away
+    Args:
+        function (callable): This is the function to call
+        *args: These are the args for the function
+
+    Returns:
+        object: This is the result of the function
+    """
+    if threading.current_thread() is threading.main_thread():
+        return function(*args, **kwargs)
+
+    return nuke.executeInMainThreadWithResult(function, args=args, kwargs=kwargs)
+
+
+class _SelectionTracker(object):
+    """
+    Tracks the current selection of nodes incrementally from the knobChanged callbacks on the
+    selected knob rather than polling nuke.selectedNodes.  Each change to the selection increments
+    the version so consumers can cheaply check if the selection has changed and collect only the
+    nodes that were added or removed since the version they last saw.
+
+    Only nodes at the root of the script are tracked, the same as nuke.selectedNodes.  Use the
+    global SelectionTracker instance rather than creating new instances
+    """
+
+    selectedKnobName = 'selected'
+    maxChanges = 1024
+
+    def __init__(self):
+        super(_SelectionTracker, self).__init__()
+
+        self._lock = threading.RLock()
+        self._registered = False
+        self._version = 0
+        self._selected = set()
+        self._changes = collections.deque(maxlen=self.maxChanges)
+
+    @property
+    def version(self):
+        """
+        Returns:
+            int: This is incremented every time the selection changes
+        """
+        return self._version
+
+    @property
+    def isRegistered(self):
+        """
+        Returns:
+            bool: True or False if the callbacks are registered and the selection is being tracked
+        """
+        return self._registered
+
+    def ensure(self):
+        """
+        This will ensure that the callbacks are registered and the selection has been collected.
+        When called from another thread this is done within a call to the main thread
+
+        Returns:
+            _SelectionTracker: This is the instance (self) so calls can be chained
+        """
+        if not self._registered:
+            runInMainThread(self._register)
+
+        return self
+
+    def _register(self):
+        """
+        Registers the callbacks and collects the selection.  This must be called from the main thread
+        """
+        if self._registered:
+            return
+
+        nuke.addKnobChanged(self._onKnobChanged)
+        nuke.addOnDestroy(self._onDestroy)
+        self._registered = True
+        self.refresh()
+
+    def refresh(self):
+        """
+        This will collect the selection from nuke and record any differences from the tracked
+        selection.  This is only needed if the selection has been changed in a way that did not
+        trigger the callbacks.  When called from another thread the selection is collected within a
+        call to the main thread
+        """
+        selected = set(runInMainThread(nuke.selectedNodes))
+        with self._lock:
+            for node in selected.difference(self._selected):
+                self._record(node, True)
+            for node in self._selected.difference(selected):
+                self._record(node, False)
+
+    def selectedNodes(self):
+        """
+        Returns:
+            set: This is a set of the currently selected nodes
+        """
+        with self._lock:
+            return set(self._selected)
+
+    def changes(self, version):
+        """
+        Collects the changes to the selection since the given version
+        Args:
+            version (int): This is the version the changes are to be collected from
+
+        Returns:
+            tuple|None: This is a tuple of the sets of nodes that have been added and removed from
+                        the selection.  If the changes for the version are no longer available then
+                        None is returned and the full selection should be collected instead
+        """
+        added = set()
+        removed = set()
+        with self._lock:
+            if version == self._version:
+                return added, removed
+
+            if version > self._version or not self._changes or self._changes[0][0] > version + 1:
+                return None
+
+            for changeVersion, node, selected in self._changes:
+                if changeVersion <= version:
+                    continue
+
+                if selected:
+                    added.add(node)
+                    removed.discard(node)
+                else:
+                    removed.add(node)
+                    added.discard(node)
+
+        return added, removed
+
+    def _record(self, node, selected):
+        """
+        Records the change to the selection for the given node
+        Args:
+            node (nuke.Node): This is the node whose selection has changed
+            selected (bool): True or False if the node is now selected
+        """
+        with self._lock:
+            if selected == (node in self._selected):
+                return
+
+            if selected:
+                self._selected.add(node)
+            else:
+                self._selected.discard(node)
+
+            self._version += 1
+            self._changes.append((self._version, node, selected))
+
+    def _onKnobChanged(self):
+        """
+        Triggered from nuke when a knob is changed.  Only changes to the selected knob are processed
+        """
+        knob = nuke.thisKnob()
+        if knob is None or knob.name() != self.selectedKnobName:
+            return
+
+        node = nuke.thisNode()
+        if '.' in node.fullName():
+            return
+
+        self._record(node, bool(knob.value()))
+
+    def _onDestroy(self):
+        """
+        Triggered from nuke when a node is destroyed so it is removed from the selection
+        """
+        self._record(nuke.thisNode(), False)
+
+
+SelectionTracker = _SelectionTracker()
+
+
+class _NodeCache(object):
+    """
+    Cache of the nodes collected by allNodes.  The results are keyed by the collection options and
+    the group they were collected from and are cleared whenever a node is created or destroyed, so
+    repeated calls between changes to the script are free.  If the script is changed in a way that
+    does not trigger the callbacks then refresh should be called.
+
+    A destroyed node is still in the script while the onDestroy callbacks run, so nothing is cached
+    from when a node is destroyed until nuke has finished destroying it.  The callbacks should be
+    registered at startup from the main thread, see ensure, so the cache is cleared before any other
+    onDestroy callbacks can read it.  Use the global NodeCache instance rather than creating new
+    instances
+    """
+
+    def __init__(self):
+        super(_NodeCache, self).__init__()
+
+        self._lock = threading.RLock()
+        self._registered = False
+        self._destroying = 0
+        self._results = dict()
+
+    def ensure(self):
+        """
+        This will ensure that the callbacks used to invalidate the cache are registered.  When called
+        from another thread the callbacks are registered within a call to the main thread
+
+        Returns:
+            _NodeCache: This is the instance (self) so calls can be chained
+        """
+        if not self._registered:
+            runInMainThread(self._register)
+
+        return self
+
+    def _register(self):
+        """
+        Registers the callbacks.  This must be called from the main thread
+        """
+        if self._registered:
+            return
+
+        nuke.addOnCreate(self.invalidate)
+        nuke.addOnDestroy(self._onDestroy)
+        self._registered = True
+
+    def get(self, key):
+        """
+        Args:
+            key (tuple): This is the key for the collection
+
+        Returns:
+            frozenset|None: This is the cached nodes or None if they have not been collected or a node
+                            is being destroyed
+        """
+        with self._lock:
+            if self._destroying:
+                return None
+
+            return self._results.get(key, None)
+
+    def put(self, key, nodes):
+        """
+        Args:
+            key (tuple): This is the key for the collection
+            nodes (set): This is the nodes that were collected
+
+        Returns:
+            frozenset: This is the nodes that were cached
+        """
+        nodes = frozenset(nodes)
+        with self._lock:
+            if not self._destroying:
+                self._results[key] = nodes
+
+        return nodes
+
+    def _onDestroy(self):
+        """
+        Triggered from nuke when a node is destroyed.  The cache is cleared and nothing is cached until
+        the node has been destroyed, which is once nuke has processed the destroy and runs the queued
+        call to _destroyed
+        """
+        with self._lock:
+            self._results.clear()
+            self._destroying += 1
+
+        nuke.executeInMainThread(self._destroyed)
+
+    def _destroyed(self):
+        """
+        Called once nuke has finished destroying a node so the nodes can be cached again
+        """
+        with self._lock:
+            self._destroying = max(0, self._destroying - 1)
+            self._results.clear()
+
+    def invalidate(self):
+        """
+        Clears all the cached nodes.  This is triggered from nuke when a node is created or destroyed
+        """
+        with self._lock:
+            self._results.clear()
+
+    def refresh(self):
+        """
+        Clears all the cached nodes after the script has been changed in a way that does not
+        trigger the callbacks
+        """
+        self.invalidate()
+
+
+NodeCache = _NodeCache()
+
+
 def allNodes(**kwargs):
     """
     This is an extension on nukes internal node collection and is used to collect all nodes in a
     script.  This extends the ability allowing for re-cursing gizmos
 
+    The results are cached until a node is created or destroyed, see NodeCache, so the returned set
+    is shared between calls and is immutable.  Before version 2 this returned a new set for every
+    call, callers that modify the nodes should copy them with set(allNodes())
+
     Kwargs:
         recurseGroups (bool|optional): True or False if the node collection should recurse groups
         recurseGizmos (bool|optional): True or False if the node collection should recurse gizmos
@@ -27,93 +328,445 @@ def allNodes(**kwargs):
         nodeClass (str|optional): This is a node class to limit the node collection to
 
     Returns:
-        set: This is a set of all the collected nodes
+        frozenset: This is a set of all the collected nodes.  Before version 2 this was a set
     """
     recurseGroups = kwargs.get('recurseGroups', False)
     recurseGizmos = kwargs.get('recurseGizmos', False)
     context = kwargs.get('context', None)
     nodeClass = kwargs.get('nodeClass', None)
 
-    if context:
-        with context:
-            return allNodes(recurseGroups=recurseGroups, recurseGizmos=recurseGizmos)
+    key = (recurseGroups, recurseGizmos, nodeClass, context or nuke.thisGroup())
+    nodes = NodeCache.ensure().get(key)
+    if nodes is None:
+        nodes = NodeCache.put(key, _collectNodes(context, recurseGroups, recurseGizmos, nodeClass))
+
+    return nodes
 
+
+def iterNodes(**kwargs):
+    """
+    Generator version of allNodes which yields the nodes one at a time rather than collecting them
+    all.  The nodes are visited depth first, each group or gizmo is visited as soon as it is found,
+    and the class and predicate are checked as the nodes are visited so only the nodes that are
+    wanted are ever yielded.  This allows a search to stop as soon as it has found what it needs
+
+    Kwargs:
+        predicate (callable|optional): This is called with each node and only the nodes it returns
+                                       True for are yielded.  This does not stop groups or gizmos
+                                       from being visited
+        classes (str|list|set|optional): This is a node class or classes to limit the nodes to
+        recurseGroups (bool|optional): True or False if the nodes within groups are visited
+        recurseGizmos (bool|optional): True or False if the nodes within gizmos are visited
+        context (nuke.Node|optional): This is the group to visit the nodes of, defaults to the
+                                      current group
+
+    Yields:
+        nuke.Node: The nodes that match the classes and predicate
+    """
+    predicate = kwargs.get('predicate', None)
+    classes = kwargs.get('classes', None)
+    recurseGroups = kwargs.get('recurseGroups', False)
+    recurseGizmos = kwargs.get('recurseGizmos', False)
+    context = kwargs.get('context', None) or nuke.thisGroup()
+
+    if isinstance(classes, str):
+        classes = {classes}
+
+    stack = [iter(context.nodes())]
+    while stack:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+            continue
+
+        if (not classes or node.Class() in classes) and (predicate is None or predicate(node)):
+            yield node
+
+        if isinstance(node, nuke.Gizmo):
+            if recurseGizmos:
+                stack.append(iter(node.nodes()))
+        elif recurseGroups and isinstance(node, nuke.Group):
+            stack.append(iter(node.nodes()))
+
+
+def _collectNodes(context, recurseGroups, recurseGizmos, nodeClass):
+    """
+    Collects the nodes for allNodes.  Gizmos are visited iteratively from a stack of contexts
+    rather than recursively, and all the nodes are added to a single set
+    Args:
+        context (nuke.Node|None): This is the node context to collect the nodes from or None to use
+                                  the current context
+        recurseGroups (bool): True or False if the node collection should recurse groups
+        recurseGizmos (bool): True or False if the node collection should recurse gizmos
+        nodeClass (str|None): This is a node class to limit the node collection to
+
+    Returns:
+        set: This is a set of all the collected nodes
+    """
+    nodes = set()
+    visited = set()
+    contexts = [context]
+    while contexts:
+        context = contexts.pop()
+        if context is None:
+            contextNodes = _getContextNodes(recurseGroups, recurseGizmos, nodeClass)
+        else:
+            with context:
+                contextNodes = _getContextNodes(recurseGroups, recurseGizmos, nodeClass)
+
+        classNodes, gizmos = contextNodes
+        nodes.update(classNodes)
+        for gizmo in gizmos:
+            if gizmo not in visited:
+                visited.add(gizmo)
+                contexts.append(gizmo)
+
+    return nodes
+
+
+def _getContextNodes(recurseGroups, recurseGizmos, nodeClass):
+    """
+    Args:
+        recurseGroups (bool): True or False if the node collection should recurse groups
+        recurseGizmos (bool): True or False if the gizmos are to be collected
+        nodeClass (str|None): This is a node class to limit the node collection to
+
+    Returns:
+        tuple: This is the nodes within the current context and the gizmos which are to be visited
+    """
+    if nodeClass and not recurseGizmos:
+        return nuke.allNodes(nodeClass, recurseGroups=recurseGroups), list()
+
+    contextNodes = nuke.allNodes(recurseGroups=recurseGroups)
+    classNodes = contextNodes
     if nodeClass:
-        baseList = set(nuke.allNodes(nodeClass, recurseGroups=recurseGroups))
-    else:
-        baseList = set(nuke.allNodes(recurseGroups=recurseGroups))
+        classNodes = nuke.allNodes(nodeClass, recurseGroups=recurseGroups)
+
+    if not recurseGizmos:
+        return classNodes, list()
+
+    return classNodes, [node for node in contextNodes if isinstance(node, nuke.Gizmo)]
+
+
+class _MainThreadQueue(object):
+    """
+    Queue of work that has to run in the main thread, ie: node mutations made from the processor
+    thread.  Work submitted from other threads is queued and a single call to
+    nuke.executeInMainThread runs everything that has been queued by the time it runs, so many small
+    mutations are coalesced into one batch.  Each batch runs within one undo group when any of its
+    work has an undo name.
+
+    Every submission returns a concurrent.futures.Future so callers can wait on the result.  When too
+    much work is pending the submitting thread is blocked until the main thread has caught up.  Work
+    submitted from the main thread runs straight away after any work that is already queued.  Use the
+    global MainThreadQueue instance rather than creating new instances
+    """
 
-    if any([recurseGizmos, recurseGroups]):
-        for node in baseList:
-            if recurseGizmos and isinstance(node, nuke.Gizmo):
-                logging.debug('Processing Gizmo:', node.fullName())
-                baseList = baseList.union(allNodes(recurseGroups=recurseGroups,
-                                          recurseGizmos=recurseGizmos,
-                                          context=node))
+    maxBatchSize = 256
+    maxPending = 4096
+
+    def __init__(self):
+        super(_MainThreadQueue, self).__init__()
+
+        self._lock = threading.RLock()
+        self._notFull = threading.Condition(self._lock)
+        self._pending = collections.deque()
+        self._scheduled = False
+        self._metrics = {'submitted': 0,
+                         'batches': 0,
+                         'blocked': 0}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    @property
+    def metrics(self):
+        """
+        Returns:
+            dict: This is the number of submissions, the number of batches that were run in the main
+                  thread and the number of submissions that had to wait for the queue to empty
+        """
+        with self._lock:
+            return dict(self._metrics)
+
+    def submit(self, function, args=(), kwargs=None, **options):
+        """
+        Queues the function to be called in the main thread
+        Args:
+            function (callable): This is the function to call
+            args (tuple|optional): These are the args for the function
+            kwargs (dict|optional): These are the kwargs for the function
+
+        Kwargs:
+            undoName (str|optional): This is the name of the undo group the function is run in.  When
+                                     a batch has more than one name the group is named by the count
+            timeout (float|optional): This is the maximum time in seconds to wait when the queue is
+                                      full, queue.Full is raised if it is still full
+
+        Returns:
+            concurrent.futures.Future: This is the future for the result of the function
+        """
+        future = concurrent.futures.Future()
+        job = (future, function, tuple(args), kwargs or dict(), options.get('undoName', None))
+
+        if threading.current_thread() is threading.main_thread():
+            with self._lock:
+                self._metrics['submitted'] += 1
+                self._pending.append(job)
+            self.flush()
+            return future
+
+        with self._notFull:
+            self._metrics['submitted'] += 1
+            if len(self._pending) >= self.maxPending:
+                self._metrics['blocked'] += 1
+                if not self._notFull.wait_for(lambda: len(self._pending) < self.maxPending,
+                                              options.get('timeout', None)):
+                    raise queue.Full('The main thread queue is full')
+
+            self._pending.append(job)
+            if self._scheduled:
+                return future
+            self._scheduled = True
+
+        nuke.executeInMainThread(self._dispatch)
+        return future
+
+    def flush(self):
+        """
+        Runs all the pending work straight away.  This must be called from the main thread
+        """
+        while self._runBatch():
+            pass
+
+    def _dispatch(self):
+        """
+        Called in the main thread to run the next batch.  If work is still pending once the batch has
+        run then another call is scheduled so nuke can process its events between the batches
+        """
+        with self._lock:
+            self._scheduled = False
+
+        if not self._runBatch():
+            return
+
+        with self._lock:
+            if not self._pending or self._scheduled:
+                return
+            self._scheduled = True
+
+        nuke.executeInMainThread(self._dispatch)
+
+    def _runBatch(self):
+        """
+        Runs up to maxBatchSize of the pending work within a single undo group
+        Returns:
+            bool: True or False if any work was run
+        """
+        with self._notFull:
+            batch = [self._pending.popleft()
+                     for _ in range(min(len(self._pending), self.maxBatchSize))]
+            if not batch:
+                return False
+
+            self._metrics['batches'] += 1
+            self._notFull.notify_all()
+
+        undoNames = [job[-1] for job in batch if job[-1]]
+        undoStack = None
+        if undoNames:
+            undoStack = nuke.Undo()
+            undoStack.begin(undoNames[0] if len(undoNames) == 1 else
+                            'Node Changes: {0}'.format(len(batch)))
+
+        try:
+            for future, function, args, kwargs, _ in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+                try:
+                    future.set_result(function(*args, **kwargs))
+                except Exception as error:
+                    logging.exception('Failed to run {0} in the main thread'.format(function))
+                    future.set_exception(error)
+        finally:
+            if undoStack is not None:
+                undoStack.end()
+
+        return True
+
+
+MainThreadQueue = _MainThreadQueue()
+
+
+def getSelectionChanges(nodes, current, **kwargs):
+    """
+    Compares the target selection against the current selection so that only the nodes whose
+    selection changes need to be written
+    Args:
+        nodes (set): These are the nodes that are to be selected
+        current (set): These are the nodes that are currently selected
+
+    Kwargs:
+        append (bool): True or False if the current selection is kept
+        deselect (bool): True or False if the given nodes are to be deselected rather than selected
+
+    Returns:
+        tuple: This is a tuple of the sets of nodes to select and the nodes to deselect
+    """
+    if kwargs.get('deselect', False):
+        return set(), set(nodes)
+
+    if kwargs.get('append', False):
+        return nodes.difference(current), set()
+
+    return nodes.difference(current), current.difference(nodes)
+
+
+def applySelectionChanges(toSelect, toDeselect):
+    """
+    This will write the selection changes to the nodes.  This must be called from the main thread,
+    any nodes which have been deleted are skipped
+    Args:
+        toSelect (set): These are the nodes to select
+        toDeselect (set): These are the nodes to deselect
 
-    return baseList
+    Returns:
+        int: This is the number of nodes that were changed
+    """
+    changed = 0
+    for nodes, value in ((toDeselect, False), (toSelect, True)):
+        for node in nodes:
+            try:
+                knob = node['selected']
+                if bool(knob.value()) == value:
+                    continue
+                knob.setValue(value)
+            except ValueError:
+                # The node has been deleted
+                continue
+            changed += 1
+
+    return changed
+
+
+def _updateSelection(nodes, **kwargs):
+    """
+    Collects the current selection and writes only the changes needed to reach the target
+    selection.  This must be called from the main thread
+    Args:
+        nodes (set): These are the nodes to select or deselect
+
+    Kwargs:
+        See getSelectionChanges
+
+    Returns:
+        int: This is the number of nodes that were changed
+    """
+    current = set(nuke.selectedNodes())
+    if nodes is None:
+        nodes = current
+
+    return applySelectionChanges(*getSelectionChanges(nodes, current, **kwargs))
 
 
 def select(nodes, **kwargs):
     """
     This will select all of the given nodes,  if the kwarg is passed this will append the current
-    selection.  If append is not passed then the current collection will be cleared
+    selection.  If append is not passed then the current collection will be cleared.  Only the nodes
+    whose selection changes are written to, and when called from another thread all the changes are
+    made within a single call to the main thread
     Args:
         nodes (set|nuke.Node|list): This is a set/list of nodes to select or a single node
 
     Kwargs:
         append (bool): True or False if this should append the current selection of nodes or not
-    """
-    append = kwargs.get('append', False)
-    selected = set()
-    if append:
-        selected = set(nuke.selectedNodes())
-
-    deselect()
 
+    Returns:
+        concurrent.futures.Future: This is the future for the number of nodes that were changed, see
+                                   MainThreadQueue.  Before version 2 this returned None.  When
+                                   called from the main thread the selection has already been made
+                                   and the future is done, from any other thread call result() to
+                                   wait for the selection to be made
+    """
     if isinstance(nodes, nuke.Node):
         nodes = {nodes}
     elif not isinstance(nodes, set):
         nodes = set(nodes)
 
-    nodes = nodes.union(selected)
-
-    if threading.current_thread() is not threading.main_thread():
-        nuke.executeInMainThread(select, args=(nodes,))
-        return
-
-    for node in nodes:
-        node['selected'].setValue(True)
+    return MainThreadQueue.submit(_updateSelection, args=(nodes,),
+                                  kwargs={'append': kwargs.get('append', False)})
 
 
 def deselect(nodes=None):
     """
     This will deselect all nodes in the node graph.  If a set/list of nodes are passed then they
-    will be the only nodes that are deselected
+    will be the only nodes that are deselected.  Only the nodes that are currently selected are
+    written to
 
     Kwargs:
         nodes (set|nuke.Node|list): This is a set/list of nodes to deselect or a single node
-    """
-    nodes = nodes or allNodes()
 
-    if isinstance(nodes, nuke.Node):
+    Returns:
+        concurrent.futures.Future: This is the future for the number of nodes that were changed, see
+                                   MainThreadQueue.  Before version 2 this returned None.  When
+                                   called from the main thread the nodes have already been
+                                   deselected and the future is done, from any other thread call
+                                   result() to wait for them to be deselected
+    """
+    if not nodes:
+        nodes = None
+    elif isinstance(nodes, nuke.Node):
         nodes = {nodes}
     elif not isinstance(nodes, set):
         nodes = set(nodes)
 
-    if threading.current_thread() is not threading.main_thread():
-        nuke.executeInMainThread(deselect, args=(nodes,))
-        return
+    return MainThreadQueue.submit(_updateSelection, args=(nodes,), kwargs={'deselect': True})
+
+
+def _deleteNodes(nodes):
+    """
+    This will delete the given nodes.  This must be called from the main thread, any nodes which
+    have already been deleted are skipped
+    Args:
+        nodes (set): These are the nodes to delete
 
+    Returns:
+        set: This is a set of the nodes that were deleted
+    """
+    deleted = set()
     for node in nodes:
-        node['selected'].setValue(False)
+        try:
+            nuke.delete(node)
+        except ValueError:
+            # The node has already been deleted
+            continue
+        deleted.add(node)
+
+    return deleted
 
 
-def delete(nodes):
+def delete(nodes, **kwargs):
     """
-    This will delete all the given nodes,
+    This will delete all the given nodes within a single undo group.  Deletion should always happen
+    in the main thread otherwise it can cause nuke to crash, so when called from another thread the
+    deletion is queued with the MainThreadQueue
     Args:
         nodes (set|nuke.Node|list): This is a set/list of nodes to delete or a single node
+
+    Kwargs:
+        useUndo (bool|optional): True or False if the nodes are to be deleted within their own undo
+                                 group.  This is False when the caller manages the undo group
+                default: True
+
+    Returns:
+        concurrent.futures.Future: This is the future for the set of nodes that were deleted, see
+                                   MainThreadQueue.  Before version 2 this returned None.  When
+                                   called from the main thread the nodes have already been deleted
+                                   and the future is done, from any other thread call result() to
+                                   wait for the nodes to be deleted.  result() also raises any error
+                                   from the deletion
     """
 
     if isinstance(nodes, nuke.Node):
@@ -121,38 +774,119 @@ def delete(nodes):
     elif not isinstance(nodes, set):
         nodes = set(nodes)
 
-    if threading.currentThread():
-        pass
+    undoName = None
+    if kwargs.get('useUndo', True):
+        undoName = 'Delete Nodes: {0}'.format(len(nodes))
 
-    undoStack = nuke.Undo()
-    undoStack.begin('Delete Nodes: {0}'.format(len(nodes)))
-    # Deletion should always happen in the main thread otherwise it can cause nuke to crash
-    if threading.current_thread() is not threading.main_thread():
-        nuke.executeInMainThread(delete, args=(nodes,))
-        return
+    return MainThreadQueue.submit(_deleteNodes, args=(nodes,), undoName=undoName)
 
-    for node in nodes:
-        nuke.delete(node)
 
-    undoStack.end()
+class _KnobSchemaCache(object):
+    """
+    Cache of the names of the file knobs for each node class.  Nodes of the same class almost always
+    share the same file knobs, so once the knobs of one node have been scanned the file knobs of
+    every other node of that class are fetched directly by name.  The schemas are keyed by the class
+    and the number of knobs on the node so nodes with added user knobs get their own schema.
+
+    Groups and gizmos have their knobs defined per instance so these are always scanned.  If a
+    cached knob is ever missing or is not a file knob then the node is scanned and the schema is
+    replaced.  A node that swaps one of its user knobs for a file knob, while keeping the same
+    number of knobs, is not detected so clear should be called after adding file knobs to existing
+    nodes.  Use the global KnobSchemaCache instance rather than creating new instances
+    """
+
+    def __init__(self):
+        super(_KnobSchemaCache, self).__init__()
+
+        self._lock = threading.RLock()
+        self._schemas = dict()
+        self._metrics = {'hits': 0,
+                         'misses': 0,
+                         'fallbacks': 0}
+
+    @property
+    def metrics(self):
+        """
+        Returns:
+            dict: This is the number of nodes where the schema was used, had to be created or where
+                  the node was scanned as it is a group or gizmo
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['schemas'] = len(self._schemas)
+
+        return metrics
+
+    def clear(self):
+        """
+        Removes all the cached schemas
+        """
+        with self._lock:
+            self._schemas.clear()
+
+    @staticmethod
+    def _scanFileKnobs(node):
+        """
+        Args:
+            node (nuke.Node): node to collect the knobs from
+
+        Returns:
+            set: This is all the file knobs found by checking every knob on the node
+        """
+        return {knob for knob in node.knobs().values() if isinstance(knob, nuke.File_Knob)}
+
+    def getFileKnobs(self, node):
+        """
+        Args:
+            node (nuke.Node): node to collect the knobs from
+
+        Returns:
+            set: set of all the file knobs present on the node or an empty set if there are none
+        """
+        if isinstance(node, nuke.Group):
+            with self._lock:
+                self._metrics['fallbacks'] += 1
+            return self._scanFileKnobs(node)
+
+        # The schemas are only ever replaced as a whole so they are read without the lock, which
+        # would cost more than the lookup itself
+        key = (node.Class(), node.numKnobs())
+        knobNames = self._schemas.get(key, None)
+
+        if knobNames is not None:
+            fileKnobs = set()
+            for knobName in knobNames:
+                knob = node.knob(knobName)
+                if not isinstance(knob, nuke.File_Knob):
+                    break
+                fileKnobs.add(knob)
+            else:
+                # The hits are only approximate when counted from several threads at once
+                self._metrics['hits'] += 1
+                return fileKnobs
+
+        fileKnobs = self._scanFileKnobs(node)
+        with self._lock:
+            self._metrics['misses'] += 1
+            self._schemas[key] = tuple(knob.name() for knob in fileKnobs)
+
+        return fileKnobs
+
+
+KnobSchemaCache = _KnobSchemaCache()
 
 
 def getFileKnobs(node):
     """
-    helper method to collect all the file knobs on a node
+    helper method to collect all the file knobs on a node.  The names of the file knobs are cached
+    for each node class, see KnobSchemaCache
     Args:
         node (nuke.Node): node to collect the knobs from
 
     Returns:
         set: set of all the file knobs present on the node or an empty set if there are none
     """
-    fileKnobs = set()
-    for knob in node.knobs():
-        knob = node[knob]
-        if isinstance(knob, nuke.File_Knob):
-            fileKnobs.add(knob)
-
-    return fileKnobs
+    return KnobSchemaCache.getFileKnobs(node)
 
 
 def getFilenames(node):
@@ -166,12 +900,11 @@ def getFilenames(node):
         set: set of all the filenames on the node or an empy set if there are none
     """
 
-    fileKnobs = getFileKnobs(node)
-
     filenames = set()
-    for knob in fileKnobs:
-        if knob.value():
-            filenames.add(knob.value())
+    for knob in getFileKnobs(node):
+        value = knob.value()
+        if value:
+            filenames.add(value)
 
     return filenames
 
@@ -10,8 +10,14 @@ class _Globals(object):
     tagTabName = 'nodeTagTab'
     tagSeparator = '|'
     potentialSeparators = [tagSeparator, ',', ' ', '\n']
-    baseTagSearchRegEx = '[a-zA-Z0-9\*{0}_-]+'
+    baseTagSearchRegEx = '[a-zA-Z0-9\*\(\)&!{0}_-]+'
     reTagSearchRegEx = '[\.a-zA-Z0-9\\{0}_-]+'
+    tagStringCacheSize = 1024
+    tagItemCacheSize = 1024
+    resultCacheSize = 32
+    debugEnvironmentVariable = 'NODETAG_DEBUG'
+    writeBatchSize = 100
+    writeTimeBudget = 0.05
 
     selectedIndex = 0
     tagSearchIndex = 1
@@ -0,0 +1,768 @@
+import threading
+
+import nuke
+
+import common.utilities
+import nodeTag.logic
+from nodeTag.globals import Globals
+
+'''
+Inverted index of all the tags in the current script.  This keeps a tag -> node map and a node -> tags map
+that allow tag queries to be answered without walking and re-parsing every node in the script.
+
+The index is built lazily the first time it is used and is then kept up to date through the knobChanged,
+onCreate and onDestroy callbacks along with the write functions in nodeTag.logic.  The index is cleared when a
+script is loaded or closed so it is rebuilt for the new script.  Undo and redo do not trigger the callbacks, so
+every node whose tag knob has been written is marked as dirty and the tag knobs of the dirty nodes are read again
+whenever the undo stack has changed, see sync.  Any other changes that do not trigger the callbacks need an explicit
+rebuild.  Nodes are stored by an internal integer id so that all set operations happen on plain integers rather
+than on nuke objects.
+
+Each tag is interned in a vocabulary that gives it an integer id.  The tags for a node are then stored as a
+single integer bitmask, with a bit set for the id of each tag, rather than a set of strings.  Checking if a node
+has a set of tags is then a single mask test and a wildcard query only needs to be resolved against the
+vocabulary once to get the mask of all the tags it matches.  Node classes are interned in the same vocabulary so
+they can be used as tags.
+
+Nodes are also categorized by where they live in the script so that queries can be scoped the same way that
+common.utilities.allNodes is
+    rootCategory: Nodes at the root of the script
+    groupCategory: Nodes inside of one or more groups
+    gizmoCategory: Nodes inside of a gizmo
+'''
+
+
+def _getUndoState():
+    """
+    This must be called from the main thread
+    Returns:
+        tuple: This is the number of undo and redo steps, which change whenever an edit is undone or redone
+    """
+    return nuke.Undo.undoSize(), nuke.Undo.redoSize()
+
+
+def iterBits(mask):
+    """
+    Args:
+        mask (int): This is the bitmask to iterate
+
+    Yields:
+        int: The index of each bit that is set in the mask, from lowest to highest
+    """
+    while mask:
+        lowestBit = mask & -mask
+        yield lowestBit.bit_length() - 1
+        mask ^= lowestBit
+
+
+class _TagVocabulary(object):
+    """
+    Interns tags as integer ids so that sets of tags can be stored and compared as integer bitmasks.  Ids are never
+    re-used until the vocabulary is cleared so that existing masks stay valid
+    """
+
+    def __init__(self):
+        super(_TagVocabulary, self).__init__()
+
+        self._ids = dict()
+        self._tags = list()
+
+    def __len__(self):
+        return len(self._tags)
+
+    def __contains__(self, tag):
+        return tag in self._ids
+
+    def clear(self):
+        """
+        Clears all the interned tags
+        """
+        self._ids.clear()
+        del self._tags[:]
+
+    def intern(self, tag):
+        """
+        Args:
+            tag (str): This is the tag to intern
+
+        Returns:
+            int: This is the id for the tag, if the tag has not been seen before a new id is given to it
+        """
+        tagId = self._ids.get(tag, None)
+        if tagId is None:
+            tagId = len(self._tags)
+            self._ids[tag] = tagId
+            self._tags.append(tag)
+
+        return tagId
+
+    def getId(self, tag):
+        """
+        Args:
+            tag (str): This is the tag to get the id for
+
+        Returns:
+            int|None: This is the id of the tag or None if it has not been interned
+        """
+        return self._ids.get(tag, None)
+
+    def getTag(self, tagId):
+        """
+        Args:
+            tagId (int): This is the id to get the tag for
+
+        Returns:
+            str: This is the tag for the given id
+        """
+        return self._tags[tagId]
+
+    def encode(self, tags):
+        """
+        Args:
+            tags (set|frozenset): This is the set of tags to encode, any new tags will be interned
+
+        Returns:
+            int: This is the bitmask for the given tags
+        """
+        mask = 0
+        for tag in tags:
+            mask |= 1 << self.intern(tag)
+
+        return mask
+
+    def mask(self, tags):
+        """
+        Args:
+            tags (set|frozenset): This is the set of tags to get the mask for.  Tags that have not been interned
+                                  are ignored
+
+        Returns:
+            int: This is the bitmask for the given tags
+        """
+        mask = 0
+        for tag in tags:
+            tagId = self._ids.get(tag, None)
+            if tagId is not None:
+                mask |= 1 << tagId
+
+        return mask
+
+    def decode(self, mask):
+        """
+        Args:
+            mask (int): This is the bitmask to decode
+
+        Returns:
+            frozenset: This is the set of tags for the mask
+        """
+        return frozenset(self._tags[tagId] for tagId in iterBits(mask))
+
+
+class _TagIndex(object):
+    """
+    Tag index for the current script.  Use the global TagIndex instance rather than creating new instances
+    """
+
+    rootCategory = 0
+    groupCategory = 1
+    gizmoCategory = 2
+
+    def __init__(self):
+        super(_TagIndex, self).__init__()
+
+        self._lock = threading.RLock()
+        self._built = False
+        self._registered = False
+        self._nextId = 0
+        self._generation = 0
+        self._statistics = dict()
+        self._undoState = None
+        self._dirty = dict()
+
+        self.tagVocabulary = _TagVocabulary()
+
+        self._ids = dict()
+        self._nodes = dict()
+        self._categories = dict()
+        self._nodeMasks = dict()
+        self._nodeClassBits = dict()
+        self._tagNodes = dict()
+        self._classNodes = dict()
+
+    @property
+    def isBuilt(self):
+        """
+        Returns:
+            bool: True or False if the index has been built and is being maintained
+        """
+        return self._built
+
+    @property
+    def generation(self):
+        """
+        This is incremented every time the index is modified so it can be used to determine if any cached results
+        that were built from the index are still valid
+
+        Returns:
+            int: This is the current generation of the index
+        """
+        return self._generation
+
+    def ensure(self):
+        """
+        This will ensure that the callbacks are registered and the index has been built.  This is called by all
+        the query functions so the index is only built when it is first needed.  The index is always built on the
+        main thread so when this is called from another thread, ie: the processor, it only ever reads the index.
+        When called from the main thread the dirty nodes are also synced, other threads should call sync once
+        before they start querying
+
+        Returns:
+            _TagIndex: This is the instance (self) so calls can be chained
+        """
+        if not self._built:
+            common.utilities.runInMainThread(self._ensure)
+        elif self._dirty and threading.current_thread() is threading.main_thread():
+            self._sync()
+
+        return self
+
+    def sync(self):
+        """
+        This will read the tag knobs of the dirty nodes again if the undo stack has changed since they were last
+        read, ie: after an undo or redo, and update any nodes where the tags differ.  When called from another
+        thread the knobs are read within a call to the main thread
+
+        Returns:
+            _TagIndex: This is the instance (self) so calls can be chained
+        """
+        if self._built and self._dirty:
+            common.utilities.runInMainThread(self._sync)
+
+        return self
+
+    def _sync(self):
+        """
+        Reads the tag knobs of the dirty nodes if the undo stack has changed.  This must be called from the main
+        thread
+        """
+        undoState = _getUndoState()
+        with self._lock:
+            if undoState == self._undoState:
+                return
+
+            self._undoState = undoState
+            for nodeId, tagString in list(self._dirty.items()):
+                try:
+                    knob = self._nodes[nodeId].knob(Globals.tagKnobName)
+                except ValueError:
+                    # The node is being destroyed and will be removed by the onDestroy callback
+                    continue
+
+                value = knob.value() if knob else None
+                if value != tagString:
+                    self._dirty[nodeId] = value
+                    self.update(self._nodes[nodeId],
+                                nodeTag.logic.getTagsFromString(value) if value else set())
+
+    def markDirty(self, nodes):
+        """
+        Marks the nodes as having had their tag knobs written so they are read again after an undo or redo, see
+        sync.  The current value of the tag knob is recorded so only the nodes which were changed by the undo are
+        updated.  This must be called from the main thread
+        Args:
+            nodes (set|list): These are the nodes that have had their tag knobs written
+        """
+        if not self._built:
+            return
+
+        with self._lock:
+            for node in nodes:
+                nodeId = self._ids.get(node, None)
+                if nodeId is None:
+                    continue
+
+                knob = node.knob(Globals.tagKnobName)
+                self._dirty[nodeId] = knob.value() if knob else None
+
+    def _ensure(self):
+        """
+        Registers the callbacks and builds the index if it has not been built.  This must be called from the main
+        thread
+        """
+        self.registerCallbacks()
+        if not self._built:
+            self._rebuild()
+
+    def registerCallbacks(self):
+        """
+        Register the nuke callbacks that are used to keep the index up to date
+        """
+        if self._registered:
+            return
+
+        nuke.addOnCreate(self._onCreate)
+        nuke.addOnDestroy(self._onDestroy)
+        nuke.addKnobChanged(self._onKnobChanged)
+        nuke.addOnScriptLoad(self._onScriptChanged)
+        nuke.addOnScriptClose(self._onScriptChanged)
+        self._registered = True
+
+    def rebuild(self):
+        """
+        This will clear and re-build the index from all the nodes in the script.  This should only be needed if
+        the tag knobs have been modified in a way that does not trigger any of the callbacks.  When called from
+        another thread the index is rebuilt within a call to the main thread
+        """
+        common.utilities.runInMainThread(self._rebuild)
+
+    def _rebuild(self):
+        """
+        Clears and re-builds the index.  This must be called from the main thread
+        """
+        with self._lock:
+            self.clear()
+            for node in common.utilities.allNodes(recurseGroups=True, recurseGizmos=True):
+                self.update(node)
+            self._undoState = _getUndoState()
+            self._built = True
+
+    def clear(self):
+        """
+        Clears all the data from the index
+        """
+        with self._lock:
+            self.tagVocabulary.clear()
+            self._ids.clear()
+            self._nodes.clear()
+            self._categories.clear()
+            self._nodeMasks.clear()
+            self._nodeClassBits.clear()
+            self._tagNodes.clear()
+            self._classNodes.clear()
+            self._statistics.clear()
+            self._dirty.clear()
+            self._undoState = None
+            self._generation += 1
+            self._built = False
+
+    def _getCategory(self, node):
+        """
+        Determines where the given node lives in the script
+        Args:
+            node (nuke.Node): This is the node to get the category for
+
+        Returns:
+            int: This is one of the root, group or gizmo categories
+        """
+        parts = node.fullName().split('.')
+        if len(parts) == 1:
+            return self.rootCategory
+
+        for index in range(1, len(parts)):
+            # The parents are resolved from the root as nuke.toNode is relative to the current group
+            parent = nuke.toNode('.'.join(['root'] + parts[:index]))
+            if isinstance(parent, nuke.Gizmo):
+                return self.gizmoCategory
+
+        return self.groupCategory
+
+    def _getId(self, node):
+        """
+        Collects the id for the given node.  If the node has not yet been added to the index it will be added
+        Args:
+            node (nuke.Node): This is the node to collect the id for
+
+        Returns:
+            int: This is the internal id for the node
+        """
+        nodeId = self._ids.get(node, None)
+        if nodeId is None:
+            nodeId = self._nextId
+            self._nextId += 1
+            self._ids[node] = nodeId
+            self._nodes[nodeId] = node
+            self._categories[nodeId] = self._getCategory(node)
+            self._generation += 1
+
+            classId = self.tagVocabulary.intern(node.Class())
+            self._nodeClassBits[nodeId] = 1 << classId
+            self._classNodes.setdefault(classId, set()).add(nodeId)
+
+        return nodeId
+
+    def update(self, node, tags=None):
+        """
+        This will update the index for the given node.  If no tags are given then they will be read from the
+        node without creating any knobs
+        Args:
+            node (nuke.Node): This is the node to update the index for
+            tags (set|optional): These are the tags that are now on the node
+        """
+        if tags is None:
+            knob = node.knob(Globals.tagKnobName)
+            tags = nodeTag.logic.getTagsFromString(knob.value()) if knob else set()
+
+        with self._lock:
+            nodeId = self._getId(node)
+            existingMask = self._nodeMasks.get(nodeId, 0)
+            mask = self.tagVocabulary.encode(tags)
+            if existingMask == mask:
+                return
+
+            for tagId in iterBits(existingMask & ~mask):
+                tagNodes = self._tagNodes.get(tagId)
+                tagNodes.discard(nodeId)
+                if not tagNodes:
+                    del self._tagNodes[tagId]
+
+            for tagId in iterBits(mask & ~existingMask):
+                self._tagNodes.setdefault(tagId, set()).add(nodeId)
+
+            if mask:
+                self._nodeMasks[nodeId] = mask
+            else:
+                self._nodeMasks.pop(nodeId, None)
+            self._generation += 1
+
+    def validate(self, nodeTags):
+        """
+        Checks the index against the tags that were read from the nodes and updates any nodes where they differ,
+        ie: after an undo or redo which does not trigger the callbacks.  Nodes that are not in the index are left
+        to the onCreate callback.  This does not touch the nodes so it is safe to call from any thread
+        Args:
+            nodeTags (dict): This is the set of tags read from each node, keyed by the node
+
+        Returns:
+            set: This is a set of the nodes that were out of date
+        """
+        staleNodes = set()
+        if not self._built:
+            return staleNodes
+
+        with self._lock:
+            for node, tags in nodeTags.items():
+                nodeId = self._ids.get(node, None)
+                if nodeId is None:
+                    continue
+
+                if self.tagVocabulary.decode(self._nodeMasks.get(nodeId, 0)) != frozenset(tags):
+                    staleNodes.add(node)
+                    self.update(node, tags)
+
+        return staleNodes
+
+    def remove(self, node):
+        """
+        Removes the given node from the index
+        Args:
+            node (nuke.Node): This is the node to remove
+        """
+        with self._lock:
+            nodeId = self._ids.pop(node, None)
+            if nodeId is None:
+                return
+
+            for tagId in iterBits(self._nodeMasks.pop(nodeId, 0)):
+                tagNodes = self._tagNodes.get(tagId)
+                tagNodes.discard(nodeId)
+                if not tagNodes:
+                    del self._tagNodes[tagId]
+
+            classId = self._nodeClassBits.pop(nodeId).bit_length() - 1
+            classNodes = self._classNodes.get(classId, set())
+            classNodes.discard(nodeId)
+            if not classNodes:
+                self._classNodes.pop(classId, None)
+
+            del self._nodes[nodeId]
+            del self._categories[nodeId]
+            self._dirty.pop(nodeId, None)
+            self._generation += 1
+
+    def getCategories(self, **kwargs):
+        """
+        Converts the allNodes style kwargs into the categories of nodes that are to be included
+
+        Kwargs:
+            recurseGroups (bool|optional): True or False if nodes within groups are to be included
+            recurseGizmos (bool|optional): True or False if nodes within gizmos are to be included
+
+        Returns:
+            set: This is a set of the categories to include
+        """
+        categories = {self.rootCategory}
+        if kwargs.get('recurseGroups', False):
+            categories.add(self.groupCategory)
+        if kwargs.get('recurseGizmos', False):
+            categories.add(self.gizmoCategory)
+
+        return categories
+
+    def _postings(self, classTag):
+        """
+        Args:
+            classTag (bool): True or False if the node classes should be included as tags
+
+        Returns:
+            list(dict): The tag id to node ids maps that are to be searched
+        """
+        if classTag:
+            return [self._tagNodes, self._classNodes]
+
+        return [self._tagNodes]
+
+    def vocabulary(self, classTag=False):
+        """
+        Args:
+            classTag (bool|optional): True or False if the node classes should be included as tags
+
+        Returns:
+            set: This is a set of all the tags that are currently on at least one node
+        """
+        with self._lock:
+            return {self.tagVocabulary.getTag(tagId)
+                    for postings in self._postings(classTag) for tagId in postings}
+
+    def tagMask(self, tags):
+        """
+        Args:
+            tags (set): This is a set of exact tags
+
+        Returns:
+            int: This is the mask with the bits of all the given tags
+        """
+        with self._lock:
+            return self.tagVocabulary.mask(tags)
+
+    def nodeMask(self, nodeId, classTag=False):
+        """
+        Args:
+            nodeId (int): This is the id of the node to get the mask for
+            classTag (bool|optional): True or False if the node class should be included as a tag
+
+        Returns:
+            int: This is the bitmask of the tags on the node
+        """
+        mask = self._nodeMasks.get(nodeId, 0)
+        if classTag:
+            mask |= self._nodeClassBits.get(nodeId, 0)
+
+        return mask
+
+    def tagNodeIds(self, tag, classTag=False):
+        """
+        Args:
+            tag (str): This is the exact tag to collect the node ids for
+            classTag (bool|optional): True or False if the node classes should be included as tags
+
+        Returns:
+            set: This is a set of all the ids of the nodes with the given tag
+        """
+        nodeIds = set()
+        with self._lock:
+            tagId = self.tagVocabulary.getId(tag)
+            for postings in self._postings(classTag):
+                nodeIds.update(postings.get(tagId, ()))
+
+        return nodeIds
+
+    def classNodeIds(self, nodeClass):
+        """
+        Args:
+            nodeClass (str): This is the node class to collect the node ids for
+
+        Returns:
+            set: This is a set of all the ids of the nodes of the given class
+        """
+        with self._lock:
+            classId = self.tagVocabulary.getId(nodeClass)
+            return set(self._classNodes.get(classId, ()))
+
+    def tagNodeCount(self, tag, classTag=False):
+        """
+        Args:
+            tag (str): This is the exact tag to count the nodes for
+            classTag (bool|optional): True or False if the node classes should be included as tags
+
+        Returns:
+            int: This is the number of nodes with the given tag
+        """
+        with self._lock:
+            tagId = self.tagVocabulary.getId(tag)
+            return sum(len(postings.get(tagId, ())) for postings in self._postings(classTag))
+
+    def nodeTagsById(self, nodeId, classTag=False):
+        """
+        Args:
+            nodeId (int): This is the id of the node to get the tags for
+            classTag (bool|optional): True or False if the node class should be included as a tag
+
+        Returns:
+            frozenset: This is the tags for the node
+        """
+        with self._lock:
+            return self.tagVocabulary.decode(self.nodeMask(nodeId, classTag=classTag))
+
+    def allNodeIds(self, categories=None):
+        """
+        Args:
+            categories (set|optional): This is a set of categories to limit the ids to
+
+        Returns:
+            set: This is a set of the ids for all the nodes in the index
+        """
+        with self._lock:
+            if categories is None:
+                return set(self._nodes.keys())
+
+            return {nodeId for nodeId, category in self._categories.items() if category in categories}
+
+    def filterNodeIds(self, nodeIds, categories):
+        """
+        Limits the given node ids to the given categories
+        Args:
+            nodeIds (set): This is the set of ids to filter
+            categories (set): This is the set of categories that are allowed
+
+        Returns:
+            set: This is the set of the ids that are within the given categories
+        """
+        with self._lock:
+            return {nodeId for nodeId in nodeIds if self._categories.get(nodeId) in categories}
+
+    def nodeTags(self, node):
+        """
+        Args:
+            node (nuke.Node): This is the node to get the tags for
+
+        Returns:
+            frozenset|None: This is the tags for the node or None if the node is not in the index
+        """
+        with self._lock:
+            nodeId = self._ids.get(node, None)
+            if nodeId is None:
+                return None
+
+            return self.tagVocabulary.decode(self._nodeMasks.get(nodeId, 0))
+
+    def allTags(self, categories=None, classTag=False):
+        """
+        Args:
+            categories (set|optional): This is a set of categories to limit the tags to
+            classTag (bool|optional): True or False if the node classes should be included as tags
+
+        Returns:
+            set: This is a set of all the tags which are on at least one node in the given categories
+        """
+        tags = set()
+        with self._lock:
+            for postings in self._postings(classTag):
+                for tagId, nodeIds in postings.items():
+                    if categories is None or any(self._categories.get(nodeId) in categories
+                                                 for nodeId in nodeIds):
+                        tags.add(self.tagVocabulary.getTag(tagId))
+
+        return tags
+
+    def tagStatistics(self, categories=None):
+        """
+        This will collect the tag counts, the node class breakdown and the co-occurrence of the tags in a single
+        pass over the tagged nodes.  Nodes which share the same tags and class are only expanded once.  The results
+        are cached until the generation of the index changes so they should be treated as read-only
+
+        Args:
+            categories (set|optional): This is a set of categories to limit the statistics to
+
+        Returns:
+            dict: This is the statistics in the form
+                  counts: {tag: number of nodes}
+                  classes: {tag: {node class: number of nodes}}
+                  cooccurrence: {tag: {other tag: number of nodes with both tags}}
+                  generation: the generation of the index the statistics were collected at
+        """
+        cacheKey = None if categories is None else frozenset(categories)
+        with self._lock:
+            statistics = self._statistics.get(cacheKey, None)
+            if statistics is not None and statistics['generation'] == self._generation:
+                return statistics
+
+            groupedMasks = dict()
+            for nodeId, mask in self._nodeMasks.items():
+                if categories is not None and self._categories.get(nodeId) not in categories:
+                    continue
+
+                key = (mask, self._nodeClassBits.get(nodeId, 0))
+                groupedMasks[key] = groupedMasks.get(key, 0) + 1
+
+            counts = dict()
+            classes = dict()
+            cooccurrence = dict()
+            for (mask, classBits), count in groupedMasks.items():
+                tags = [self.tagVocabulary.getTag(tagId) for tagId in iterBits(mask)]
+                nodeClass = self.tagVocabulary.getTag(classBits.bit_length() - 1) if classBits else None
+                for tag in tags:
+                    counts[tag] = counts.get(tag, 0) + count
+
+                    tagClasses = classes.setdefault(tag, dict())
+                    tagClasses[nodeClass] = tagClasses.get(nodeClass, 0) + count
+
+                    tagCooccurrence = cooccurrence.setdefault(tag, dict())
+                    for otherTag in tags:
+                        if otherTag != tag:
+                            tagCooccurrence[otherTag] = tagCooccurrence.get(otherTag, 0) + count
+
+            statistics = {'counts': counts,
+                          'classes': classes,
+                          'cooccurrence': cooccurrence,
+                          'generation': self._generation}
+            self._statistics[cacheKey] = statistics
+
+        return statistics
+
+    def toNodes(self, nodeIds):
+        """
+        Args:
+            nodeIds (set): This is a set of node ids to convert
+
+        Returns:
+            set: This is a set of the nuke nodes for the given ids
+        """
+        with self._lock:
+            return {self._nodes[nodeId] for nodeId in nodeIds if nodeId in self._nodes}
+
+    def _onCreate(self):
+        """
+        Triggered from nuke when a node is created
+        """
+        if self._built:
+            self.update(nuke.thisNode())
+
+    def _onDestroy(self):
+        """
+        Triggered from nuke when a node is destroyed
+        """
+        if self._built:
+            self.remove(nuke.thisNode())
+
+    def _onScriptChanged(self):
+        """
+        Triggered from nuke when a script is loaded or closed.  The index is cleared so it is rebuilt for the
+        new script the next time it is used
+        """
+        self.clear()
+
+    def _onKnobChanged(self):
+        """
+        Triggered from nuke when a knob is changed.  Only changes to the tag knob are processed
+        """
+        if not self._built:
+            return
+
+        knob = nuke.thisKnob()
+        if knob is not None and knob.name() == Globals.tagKnobName:
+            node = nuke.thisNode()
+            self.update(node)
+            self.markDirty([node])
+
+
+TagIndex = _TagIndex()
@@ -4,10 +4,13 @@ import re
 import nuke
 import nukescripts
 
+import common.completion
+import common.utilities
 from CommonQt import QtCore, QtGui
 from nodeTag.globals import Globals
 from nodeTag.interface.widgets import tagItem, customAction
 import nodeTag.interface.processor
+import nodeTag.index
 import nodeTag.logic
 
 
@@ -41,7 +44,8 @@ class NodeTagManager(QtGui.BaseWidget):
         self.advancedSearchLayout = QtGui.QHBoxLayout()
 
         self.selectionDrop = QtGui.FilteredComboBox()
-        self.tagSearchLine = QtGui.MultiCompleteLine()
+        self.tagSearchLine = QtGui.MultiCompleteLine(
+            completionEngine=common.completion.FuzzyCompletionEngine())
         self.limitToSelectedCheck = QtGui.QCheckBox('Limit To Selected')
 
         self.advancedSearchLabel = QtGui.QLabel('Advanced Options:')
@@ -53,21 +57,33 @@ class NodeTagManager(QtGui.BaseWidget):
 
         self.setterLayout = QtGui.QVBoxLayout()
         self.setterControlLayout = QtGui.QHBoxLayout()
-        self.tagSetterLine = QtGui.MultiCompleteLine()
+        # New tags are often being typed when setting so only the existing tags that start with
+        # the text are offered rather than fuzzy matches
+        self.tagSetterLine = QtGui.MultiCompleteLine(
+            completionEngine=common.completion.TrieCompletionEngine())
         self.tagSetButton = QtGui.QPushButton('Set')
         self.tagRemoveButton = QtGui.QPushButton('Remove')
         self.selectNodesButton = QtGui.QPushButton('Select')
         self.deleteNodesButton = QtGui.QPushButton('Delete')
         self.clearTagsButton = QtGui.QPushButton('Clear')
+        self.cancelButton = QtGui.QPushButton('Cancel')
         self.appendCheck = QtGui.QCheckBox('Append')
 
-        self.tagItemList = QtGui.CustomListWidget()
+        self.tagItemList = QtGui.CustomListView()
+        self.tagItemModel = tagItem.TagItemModel(self.tagItemList)
+        self.tagItemDelegate = tagItem.TagItemDelegate(self.tagItemList)
 
         self.progressBar = QtGui.QProgressBar()
         self.progressInfo = QtGui.QLabel(nodeTag.__version__.upper())
+        self.debugLabel = None
 
         self.processor = nodeTag.interface.processor.Processor()
         self.mouseFilter = QtGui.MouseEventFilter.globalInstance()
+        self.updateScheduler = QtCore.UpdateScheduler(self.updateData,
+                                                      stateFunction=self._getUpdateState)
+        self.refreshShortcut = QtGui.QShortcut(QtGui.QKeySequence.Refresh, self)
+        self.inputBlocker = QtGui.InputBlocker(allowed=[self.cancelButton])
+        self.refreshShortcut.setContext(QtCore.Qt.WidgetWithChildrenShortcut)
 
         self.data = dict()
         self.items = list()
@@ -99,6 +115,7 @@ class NodeTagManager(QtGui.BaseWidget):
         self.setterControlLayout.addWidget(self.selectNodesButton)
         self.setterControlLayout.addWidget(self.deleteNodesButton)
         self.setterControlLayout.addWidget(self.clearTagsButton)
+        self.setterControlLayout.addWidget(self.cancelButton)
         self.setterControlWidget.setLayout(self.setterLayout)
         self.setterLayout.addWidget(self.progressBar)
 
@@ -129,10 +146,21 @@ class NodeTagManager(QtGui.BaseWidget):
         self.tagSetterLine.ignoreExisting = True
         self.setterControlWidget.setFixedHeight(100)
         self.progressInfo.setFixedWidth(200)
+        self.cancelButton.setVisible(False)
+        self.tagItemList.setModel(self.tagItemModel)
+        self.tagItemList.setItemDelegate(self.tagItemDelegate)
+
+        if os.getenv(Globals.debugEnvironmentVariable):
+            self.debugLabel = QtGui.QLabel(self.tagItemList.viewport())
+            self.debugLabel.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+            self.debugLabel.setStyleSheet('background-color: rgba(0, 0, 0, 160); color: #38d100; '
+                                          'padding: 2px;')
 
         self.tagSearchLine.setPlaceholderText('Search tags here')
         self.tagSearchLine.ignoreExisting = True
         self.tagSearchLine.separators = [' ', ',', '|']
+        # The operators at the start of a tag in an expression are not part of the tag to complete
+        self.tagSearchLine.prefixCharacters = '(!'
 
         self.tagSetterLine.setPlaceholderText('Set tags here')
         self.tagSetterLine.separators = [' ', ',', '|']
@@ -161,7 +189,9 @@ class NodeTagManager(QtGui.BaseWidget):
 
         self.processor.tagItems.connect(self.createWidgets)
         self.processor.actionCompleted.connect(self.completeAction)
+        self.processor.actionProgress.connect(self.actionProgress)
         self.dataUpdated.connect(self.processor.dataReceived)
+        self.refreshShortcut.activated.connect(self.refresh)
 
         self.tagSearchLine.editingFinished.connect(self.updateData)
         self.tagSearchLine.itemComplete.connect(self.updateData)
@@ -182,10 +212,11 @@ class NodeTagManager(QtGui.BaseWidget):
         self.deleteNodesButton.pressed.connect(lambda: self.processAction(
             self.processor.actionDelete))
         self.clearTagsButton.pressed.connect(lambda: self.processAction(self.processor.actionClear))
+        self.cancelButton.pressed.connect(self.cancelAction)
 
         self.useRegExCheck.stateChanged.connect(self.updateSearchRegex)
 
-        self.mouseFilter.mouseReleased.connect(self.updateData)
+        self.mouseFilter.mouseReleased.connect(self.updateScheduler.request)
         self.registerCallbacks()
 
     def updateSearchRegex(self):
@@ -209,8 +240,12 @@ class NodeTagManager(QtGui.BaseWidget):
         """
         Register callbacks so interactions in the node graph will connect with the manager
         """
+        common.utilities.SelectionTracker.ensure()
+        common.utilities.NodeCache.ensure()
+        nodeTag.index.TagIndex.ensure()
+        tagItem.TagItemRegistry.registerCallbacks()
         nuke.addOnDestroy(self.menuActionDelete)
-        nuke.addOnUserCreate(self.updateData)
+        nuke.addOnUserCreate(self.updateScheduler.request)
 
     def removeMargins(self):
 
@@ -223,6 +258,30 @@ class NodeTagManager(QtGui.BaseWidget):
                 parentLayout.setContentsMargins(0, 0, 0, 0)
             parentWidget = parentWidget.parentWidget()
 
+    def _getUpdateState(self):
+        """
+        This is the state that the tag list depends on when it is updated from interactions in
+        nuke.  If this hasn't changed then there is nothing to update
+        Returns:
+            tuple: This is the current selection and the generation of the tag index
+        """
+        # The index is synced first so any tags that were changed by an undo or redo are picked up
+        return common.utilities.SelectionTracker.version, nodeTag.index.TagIndex.sync().generation
+
+    def refresh(self, *args):
+        """
+        Triggered when the user explicitly refreshes the manager.  The cached nodes, selection and
+        tag index are collected again from nuke and the update is run without checking the state
+        first, so any changes that the callbacks missed are picked up
+        Args:
+            *args: Unused in place to avoid errors when it gets called from signals
+        """
+        common.utilities.NodeCache.refresh()
+        common.utilities.SelectionTracker.refresh()
+        nodeTag.index.TagIndex.rebuild()
+        self.updateScheduler.invalidate()
+        self.updateData(forceUpdate=True)
+
     def updateData(self, *args, **kwargs):
         """
         Triggered when any of the tag search options are changed and will re-evaluate and re-process
@@ -239,6 +298,7 @@ class NodeTagManager(QtGui.BaseWidget):
 
         if self.selectionDrop.currentIndex() == Globals.tagSearchIndex:
             self.data['tags'] = self.tagSearchLine.values
+            self.data['expression'] = str(self.tagSearchLine.text())
             self.data['limitToSelected'] = self.limitToSelectedCheck.isChecked()
             self.data['classTag'] = self.addClassCheck.isChecked()
             self.data['caseSensitive'] = self.caseSensitiveCheck.isChecked()
@@ -252,8 +312,9 @@ class NodeTagManager(QtGui.BaseWidget):
             tagSeparators = self.tagSearchLine.separators.pattern.replace('[', '').replace(']', '')
             self.tagSearchLine.setRegEx(Globals.baseTagSearchRegEx.format(''.join(tagSeparators)))
 
-        self.tagSearchLine.setCompletionValues(list(nodeTag.logic.getAllTags()))
-        self.tagSetterLine.setCompletionValues(list(nodeTag.logic.getAllTags()))
+        tagCounts = nodeTag.logic.getTagStatistics()['counts']
+        self.tagSearchLine.setCompletionValues(list(tagCounts), frequencies=tagCounts)
+        self.tagSetterLine.setCompletionValues(list(tagCounts), frequencies=tagCounts)
         self.dataUpdated.emit(self.data)
 
     def menuActionSet(self, rows):
@@ -325,6 +386,7 @@ class NodeTagManager(QtGui.BaseWidget):
                 return
 
         self.data['tags'] = self.tagSearchLine.values
+        self.data['expression'] = str(self.tagSearchLine.text())
         actionFilters = {'type': self.processor.action,
                          'action': action,
                          'setTags': self.tagSetterLine.values,
@@ -334,55 +396,81 @@ class NodeTagManager(QtGui.BaseWidget):
             if not nodes:
                 nodes = set()
                 for row in rows:
-                    item = self.tagItemList.item(row)
-                    widget = self.tagItemList.itemWidget(item)
-                    node = widget.tagItem.node
-                    nodes.add(node)
+                    nodes.add(self.tagItemList.item(row).node)
             else:
                 actionFilters['nukeDelete'] = True
             actionFilters['nodes'] = nodes
 
+        if action not in [self.processor.actionSelect] and not actionFilters.get('nukeDelete'):
+            # The action is made in batches within a single undo group so nothing else can be
+            # edited until it has completed or been cancelled
+            self.inputBlocker.start()
+            self.cancelButton.setVisible(True)
+            self.progressInfo.setText('{0}...'.format(action.capitalize()))
+
         self.dataUpdated.emit(actionFilters)
         if action not in [self.processor.actionSelect]:
             self.tagSetterLine.setText('')
 
+    def cancelAction(self):
+        """
+        Cancels the action that is running in the processor.  The processor is called directly as
+        its thread is busy running the action so it wont receive any signals until it has finished
+        """
+        self.processor.cancelAction()
+        self.progressInfo.setText('Cancelling...')
+
+    @QtCore.Slot(str, int, int, float)
+    def actionProgress(self, action, completed, total, remaining):
+        """
+        Triggered from the processor after each batch of an action has been run
+        Args:
+            action (str): This is the action that is running
+            completed (int): This is the number of nodes that have been processed
+            total (int): This is the total number of nodes
+            remaining (float): This is the estimated time remaining in seconds
+        """
+        self.progressBar.setRange(0, total)
+        self.progressBar.setValue(completed)
+        self.progressInfo.setText('{0}: {1}/{2} ({3:.1f}s left)'.format(action.capitalize(),
+                                                                         completed, total,
+                                                                         remaining))
+
     @QtCore.Slot(set)
     def createWidgets(self, tagItems):
         """
         Triggered when a signal is received from the processor.  The signal will contain the tag
-        data items that will be used to create the tag widget items that are to be added to the list
+        data items that are to be shown in the list.  The model is updated with a keyed diff so only
+        the rows which have changed are updated and only the rows that are visible are painted by
+        the delegate
 
         Args:
-            tagItems (set[tagItem.TagItem]): List of the tag data items that need to have widgets
-                                             created for
-        """
-        currentNames = list()
-        self.items = tagItems
-        for index, item in enumerate(self.tagItemList.widgets):
-            try:
-                currentNames.append(item.tagItem.node.fullName())
-            except ValueError:
-                self.tagItemList.removeItem(index)
-
-        names = {item.name for item in tagItems if nuke.exists(item.name)}
-        total = len(names)
-        if set(currentNames) != names:
-            self.progressBar.setRange(0, total)
-            self.tagItemList.clear()
-            for index, item in enumerate(sorted(tagItems, key=(lambda a: a.name))):
-                self.progressBar.setValue(index)
-                self.progressInfo.setText('{name} {count}/{total}'.format(name=item.node.fullName(),
-                                                                          count=index,
-                                                                          total=total))
-                widget = tagItem.TagItemWidget(item, updateSignal=self.dataUpdated)
-                self.tagItemList.addWidget(widget)
-
-            self.progressBar.setValue(total)
-            self.progressInfo.setText(nodeTag.__version__.upper())
+            tagItems (set[tagItem.TagItem]): List of the tag data items that are to be shown
+        """
+        self.tagItemModel.updateItems(tagItems, filters=self.data)
+        self.items = set(self.tagItemModel.items)
+
+        self.progressBar.setRange(0, len(self.items))
+        self.progressBar.setValue(len(self.items))
+        self.updateDebugOverlay()
 
-        for widget in self.tagItemList.widgets:
-            if nuke.exists(widget.tagItem.name):
-                widget.updateLabels()
+    def updateDebugOverlay(self):
+        """
+        Updates the debug overlay on the tag list with the hit rate of the processors result cache
+        and the number of tag items.  The overlay is only shown when the debug environment variable
+        is set, see Globals.debugEnvironmentVariable
+        """
+        if self.debugLabel is None:
+            return
+
+        metrics = self.processor.resultCache.metrics
+        self.debugLabel.setText('Result Cache: {hits} hits, {misses} misses ({hitRate:.0%}), '
+                                '{size} cached | Tag Items: {items}'.format(
+                                    items=len(tagItem.TagItemRegistry), **metrics))
+        self.debugLabel.adjustSize()
+        self.debugLabel.move(self.tagItemList.viewport().width() - self.debugLabel.width() - 4, 4)
+        self.debugLabel.show()
+        self.debugLabel.raise_()
 
     @QtCore.Slot(str)
     def completeAction(self, data):
@@ -393,21 +481,21 @@ class NodeTagManager(QtGui.BaseWidget):
         """
 
         action = data.get('action', None)
+        self.inputBlocker.stop()
+        self.cancelButton.setVisible(False)
+        if data.get('cancelled', False):
+            self.progressInfo.setText('{0} Cancelled'.format(str(action).capitalize()))
+        else:
+            self.progressInfo.setText(nodeTag.__version__.upper())
+
         inTagSearchMode = self.selectionDrop.currentIndex() == Globals.tagSearchIndex
         if action in [self.processor.actionSelect] and not inTagSearchMode:
-            # We specifically create the items passed as for some reason the update wont add
-            # back just the currently selected items.
-            # TODO:  Figure out why this is happening and change to just update
-            self.items = data.get('tagItems', set())
-            self.tagItemList.clear()
-            self.createWidgets(self.items)
-
-        elif action in [self.processor.actionDelete]:
-            self.tagItemList.clear()
-            self.items = list()
-            self.updateData(forceUpdate=True)
+            # The items for the selection are passed with the action as the update wont add back
+            # just the currently selected items
+            self.createWidgets(data.get('tagItems', set()))
         else:
-            self.tagItemList.clear()
+            # The list is diffed against the updated items so deleted nodes are removed and only
+            # the rows where the tags changed are refreshed
             self.updateData(forceUpdate=True)
 
     @QtCore.Slot()
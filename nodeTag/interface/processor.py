@@ -1,5 +1,12 @@
-import nuke
+import re
+import logging
+import threading
+import collections
+
+import nodeTag.index
 import nodeTag.logic
+import nodeTag.query
+import nodeTag.snapshot
 
 from CommonQt import QtCore
 import common.utilities
@@ -7,16 +14,158 @@ from nodeTag.interface.widgets import tagItem
 from nodeTag.globals import Globals
 
 
+class ResultCache(object):
+    """
+    LRU cache of the nodes found for each search.  The searches are keyed by their normalized filters
+    and the generation of the tag index, so toggling the search options back and forth only runs the
+    search once.  As the generation changes whenever a tag or node is changed all the results are
+    dropped at that point.
+
+    The selection is not part of the key as the processor checks it against the snapshots after the
+    search, so toggling limitToSelected is also served from the cache
+
+    Kwargs:
+        maxSize (int|optional): This is the maximum number of searches that are cached
+                default: Globals.resultCacheSize
+    """
+
+    # These are the filters that change the nodes found and their defaults within findNodes
+    filterDefaults = (('caseSensitive', True),
+                      ('exactMatch', True),
+                      ('matchAll', True),
+                      ('useRegex', False),
+                      ('classTag', False),
+                      ('recurseGroups', False),
+                      ('recurseGizmos', False),
+                      ('nodeClass', None))
+
+    def __init__(self, **kwargs):
+        super(ResultCache, self).__init__()
+
+        self.maxSize = kwargs.get('maxSize', Globals.resultCacheSize)
+
+        self._lock = threading.RLock()
+        self._generation = None
+        self._results = collections.OrderedDict()
+        self._metrics = {'hits': 0,
+                         'misses': 0,
+                         'evictions': 0,
+                         'invalidations': 0}
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def metrics(self):
+        """
+        Returns:
+            dict: This is the hits, misses, evictions and invalidations of the cache along with
+                  the hit rate and the number of cached searches
+        """
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['size'] = len(self._results)
+
+        lookups = metrics['hits'] + metrics['misses']
+        metrics['hitRate'] = metrics['hits'] / float(lookups) if lookups else 0.0
+
+        return metrics
+
+    def getKey(self, filters):
+        """
+        Normalizes the filters so that searches which will always find the same nodes share a key
+        Args:
+            filters (dict): This is the filters for the search
+
+        Returns:
+            tuple: This is the generation of the tag index and the normalized filters
+        """
+        expression = filters.get('expression', None)
+        useRegex = filters.get('useRegex', False)
+        if nodeTag.query.TagQuery.isExpression(expression) and not useRegex:
+            tags = expression.strip()
+        else:
+            tags = tuple(sorted(set(filters.get('tags', None) or ())))
+
+        normalizedFilters = tuple(filters.get(key, default) for key, default in self.filterDefaults)
+
+        return nodeTag.index.TagIndex.generation, tags, normalizedFilters
+
+    def get(self, key):
+        """
+        Args:
+            key (tuple): This is the key for the search, see getKey
+
+        Returns:
+            frozenset|None: This is the nodes found by the search or None if it is not cached
+        """
+        with self._lock:
+            if key[0] != self._generation:
+                if self._results:
+                    self._metrics['invalidations'] += 1
+                self._results.clear()
+                self._generation = key[0]
+
+            nodes = self._results.get(key, None)
+            if nodes is None:
+                self._metrics['misses'] += 1
+                return None
+
+            self._metrics['hits'] += 1
+            self._results.move_to_end(key)
+            return nodes
+
+    def put(self, key, nodes):
+        """
+        Caches the nodes found by a search.  The nodes are not cached if the tag index has been
+        modified since the key was created
+        Args:
+            key (tuple): This is the key for the search, see getKey
+            nodes (set): This is the nodes that were found by the search
+
+        Returns:
+            frozenset: This is the nodes that were cached
+        """
+        nodes = frozenset(nodes)
+        with self._lock:
+            if key[0] != self._generation:
+                return nodes
+
+            self._results[key] = nodes
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxSize:
+                self._results.popitem(last=False)
+                self._metrics['evictions'] += 1
+
+        return nodes
+
+    def clear(self):
+        """
+        Removes all the cached searches
+        """
+        with self._lock:
+            self._results.clear()
+
+
 class _Processor(QtCore.QObject):
     """
     Base processor object that will handle all the processing for the node tags and the creation of
     the tag items for the UI
+
+    The processor runs on its own thread so it never touches the nodes directly.  The nodes are
+    found from the tag index and the selection tracker, a snapshot of the nodes is taken in a
+    single call to the main thread and all the parsing, matching and formatting is then done on the
+    snapshots.  Any writes are sent back to the main thread in batches, see nodeTag.snapshot
+
+    Actions which write to the nodes report their progress after each batch and can be cancelled
+    from the UI thread with cancelAction
     """
 
     _globalInstance = None
     _thread = QtCore.QThread()
     tagItems = QtCore.Signal(set)
     actionCompleted = QtCore.Signal(dict)
+    actionProgress = QtCore.Signal(str, int, int, float)
 
     action = 'action'
     update = 'update'
@@ -33,6 +182,10 @@ class _Processor(QtCore.QObject):
 
         self._nodes = set()
         self._data = dict()
+        self._selectionVersion = None
+        self._cancelToken = None
+
+        self.resultCache = ResultCache()
 
     @QtCore.Slot(dict)
     def dataReceived(self, data):
@@ -53,34 +206,112 @@ class _Processor(QtCore.QObject):
             self._data.update(data)
             self._runAction()
 
+    def cancelAction(self):
+        """
+        Cancels the action that is currently running, the action will stop before its next batch.
+        This is to be called directly rather than from a signal as the processor thread will be busy
+        running the action
+        """
+        cancelToken = self._cancelToken
+        if cancelToken is not None:
+            cancelToken.cancel()
+
+    def _reportProgress(self, completed, total, remaining):
+        """
+        Emits the progress of the current action after each of its batches
+        Args:
+            completed (int): This is the number of nodes that have been processed
+            total (int): This is the total number of nodes
+            remaining (float): This is the estimated time remaining in seconds
+        """
+        self.actionProgress.emit(self._data.get('action', ''), completed, total, remaining)
+
     def _update(self, forceUpdate=False):
         """
         This will check all the nodes either getting selected nodes or nodes with the tags in the
-        filters.  Once the nodes have been collected then tag items will be created and emitted
+        filters.  Once the nodes have been collected then they are snapshot and the tag items will
+        be created and emitted
         Args:
             forceUpdate (bool|optional): True or False if we want to force the update process
         """
 
         selectionType = self._data.get('selection', Globals.selectedIndex)
         if selectionType == Globals.selectedIndex:
-            nodes = nuke.selectedNodes()
+            tracker = common.utilities.SelectionTracker.ensure()
+            if tracker.version == self._selectionVersion and not forceUpdate:
+                return
+
+            if forceUpdate:
+                # The nodes may have been replaced by an action so the selection is collected again
+                # rather than applying the changes to them
+                tracker.refresh()
+
+            changes = None
+            version = tracker.version
+            if not forceUpdate and self._selectionVersion is not None:
+                changes = tracker.changes(self._selectionVersion)
+
+            if changes is None:
+                nodes = tracker.selectedNodes()
+            else:
+                added, removed = changes
+                nodes = self._nodes.difference(removed).union(added)
+            self._selectionVersion = version
         else:
+            self._selectionVersion = None
             forceUpdate = True
+            # Any tags that were changed by an undo or redo are read again before the index is used
+            nodeTag.index.TagIndex.sync()
             if not self._data.get('tags', None):
                 nodes = set()
             else:
-                nodes = nodeTag.logic.findNodes(**self._data)
+                try:
+                    self._data['query'] = nodeTag.query.TagQuery.fromFilters(self._data)
+                    cacheKey = self.resultCache.getKey(self._data)
+                    nodes = self.resultCache.get(cacheKey)
+                    if nodes is None:
+                        # The selection is checked against the snapshots so nuke is not queried
+                        nodes = nodeTag.logic.findNodes(**dict(self._data, limitToSelected=False))
+                        nodes = self.resultCache.put(cacheKey, nodes)
+                except (ValueError, re.error) as error:
+                    # Expressions are incomplete while they are still being typed
+                    logging.debug(error)
+                    nodes = set()
 
         if nodes == self._nodes and not forceUpdate:
             return
 
-        self._nodes = nodes
-        tagItems = {tagItem.TagItem.globalInstance(node) for node in self._nodes}
+        snapshots = nodeTag.snapshot.collectSnapshots(nodes)
+        if selectionType != Globals.selectedIndex:
+            # Any changes the index missed, ie: from an undo, are corrected from the snapshots and
+            # the nodes that no longer match are dropped
+            staleNodes = nodeTag.index.TagIndex.validate(
+                {snapshot.node: snapshot.getTags() for snapshot in snapshots})
+            if staleNodes:
+                query = self._data['query']
+                snapshots = [snapshot for snapshot in snapshots if snapshot.node not in staleNodes or
+                             query.matches(snapshot.getTags(classTag=query.classTag))]
 
-        for item in tagItems:
-            item.updateFilters(self._data)
+            if self._data.get('limitToSelected', False):
+                snapshots = [snapshot for snapshot in snapshots if snapshot.selected]
 
-        self.tagItems.emit(tagItems)
+        self._nodes = {snapshot.node for snapshot in snapshots}
+        self.tagItems.emit(self._createTagItems(snapshots))
+
+    def _createTagItems(self, snapshots):
+        """
+        Creates the tag items for the given snapshots with the current filters.  The items are shared
+        with the interface so they are never modified here, and the tags are only formatted by the
+        delegate for the rows that are painted
+        Args:
+            snapshots (list[nodeTag.snapshot.NodeSnapshot]): These are the snapshots of the nodes
+
+        Returns:
+            set: This is a set of the tag items
+        """
+        # The items keep the filters so they are copied as the data is updated by the next action
+        filters = dict(self._data)
+        return {tagItem.TagItem.fromSnapshot(snapshot, filters=filters) for snapshot in snapshots}
 
     def _runAction(self):
         """
@@ -103,31 +334,58 @@ class _Processor(QtCore.QObject):
             This will select all the nodes that are in the current filter
         """
         action = self._data.get('action', None)
-
-        nodes = self._data.get('nodes', self._nodes)
-        if action == self.actionSet:
-            nodeTag.logic.tagNodes(nodes,
-                                   self._data.get('setTags'),
-                                   append=self._data.get('append'))
-        elif action == self.actionRemove:
-            for node in nodes:
-                nodeTag.logic.removeTags(node,
-                                         self._data.get('setTags'))
-        elif action == self.actionClear:
-            for node in nodes:
-                nodeTag.logic.clearTags(node)
-        elif action == self.actionDelete:
-            if not self._data.get('nukeDelete', False):
-                common.utilities.delete(nodes)
-            for node in nodes:
-                tagItem.TagItem.removeInstance(node)
-            self._nodes = set()
-        elif action == self.actionSelect:
-            self._data['tagItems'] = {tagItem.TagItem.globalInstance(node) for node in nodes}
-            self._nodes = nodes
-            common.utilities.select(nodes)
-
-        self.actionCompleted.emit(self._data)
+        self._cancelToken = nodeTag.snapshot.CancelToken()
+        batchKwargs = {'cancelToken': self._cancelToken,
+                       'progressCallback': self._reportProgress}
+
+        try:
+            nodes = self._data.get('nodes', self._nodes)
+            if action in [self.actionSet, self.actionRemove, self.actionClear]:
+                snapshots = nodeTag.snapshot.collectSnapshots(nodes)
+                if action == self.actionSet:
+                    undoName = 'Modify Tags: {0}'.format(len(snapshots))
+                    changes = nodeTag.logic.getTagChanges(snapshots,
+                                                          add=self._data.get('setTags'),
+                                                          append=self._data.get('append'))
+                elif action == self.actionRemove:
+                    undoName = 'Remove Tags: {0}'.format(len(snapshots))
+                    changes = nodeTag.logic.getTagChanges(snapshots,
+                                                          remove=self._data.get('setTags'))
+                else:
+                    undoName = 'Clear Tags: {0}'.format(len(snapshots))
+                    changes = nodeTag.logic.getTagChanges(snapshots, clear=True)
+
+                nodeTag.snapshot.executeInBatches(nodeTag.logic.applyTagChanges, changes,
+                                                  undoName=undoName, useUndo=False, **batchKwargs)
+            elif action == self.actionDelete:
+                deletedNodes = nodes
+                if not self._data.get('nukeDelete', False):
+                    undoName = 'Delete Nodes: {0}'.format(len(nodes))
+                    results = nodeTag.snapshot.executeInBatches(common.utilities.delete,
+                                                                list(nodes), undoName=undoName,
+                                                                useUndo=False, **batchKwargs)
+                    # delete returns a future for the nodes it deleted, as the batches run in the
+                    # main thread they are already done.  Only the nodes that were deleted are
+                    # removed as the action may have been cancelled
+                    deletedNodes = set().union(*(future.result() for future in results))
+                for node in deletedNodes:
+                    tagItem.TagItem.removeInstance(node)
+                self._nodes = set()
+                self._selectionVersion = None
+            elif action == self.actionSelect:
+                snapshots = nodeTag.snapshot.collectSnapshots(nodes)
+                self._data['tagItems'] = self._createTagItems(snapshots)
+                self._nodes = {snapshot.node for snapshot in snapshots}
+                self._selectionVersion = None
+                # The selection is made in the main thread so it is waited on before the interface
+                # is told that the action has completed
+                common.utilities.select(nodes).result()
+        finally:
+            # The action is always completed, even if it failed, so the interface is not left
+            # blocking the input
+            self._data['cancelled'] = self._cancelToken.isCancelled
+            self._cancelToken = None
+            self.actionCompleted.emit(self._data)
 
     @classmethod
     def globalInstance(cls):
@@ -97,9 +97,8 @@ class CustomAction(QtGui.BaseWidget):
                              items
         """
         globalAttrs = globals()
-        globalAttrs['items'] = [item.tagItem for item in self.searchWidget.tagItemList.widgets]
-        globalAttrs['selectedItems'] = [item.tagItem for item in
-                                        self.searchWidget.tagItemList.selectedWidgets]
+        globalAttrs['items'] = self.searchWidget.tagItemList.items
+        globalAttrs['selectedItems'] = self.searchWidget.tagItemList.selectedItems
 
         output = self.commandEntry.runCode(selected=selected, globalAttrs=globalAttrs)
         self.commandOutput.insertPlainText(output)
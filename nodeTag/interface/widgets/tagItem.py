@@ -1,81 +1,424 @@
+import re
+import sys
+import bisect
+import weakref
+import threading
+import collections
+
 import nuke
-import copy
 import nodeTag.logic
+import nodeTag.query
+import nodeTag.snapshot
 
 from CommonQt import QtGui, QtCore
+from nodeTag.globals import Globals
 
 
-class TagItemWidget(QtGui.BaseWidget):
+class TagItemModel(QtCore.QAbstractListModel):
     """
-    Simple widget item to display the node and its tag data
+    List model of the tag items.  The model only holds the tag items, all of the display information
+    is collected from the items when the rows are requested so only the visible rows are ever
+    processed.
+
+    The rows are keyed by the full name of the nodes so when the items are updated only the rows
+    for the nodes that are new or missing are inserted or removed and only the rows where the tags
+    have changed are refreshed, see updateItems
     """
 
-    def __init__(self, tagItem, updateSignal=None):
-        super(TagItemWidget, self).__init__()
+    itemRole = QtCore.Qt.UserRole
+    classRole = QtCore.Qt.UserRole + 1
+    tagsRole = QtCore.Qt.UserRole + 2
+
+    # These are the filters that change how the tags are formatted
+    filterKeys = ('selection', 'tags', 'expression', 'classTag', 'caseSensitive', 'exactMatch',
+                  'matchAll', 'useRegex')
+
+    def __init__(self, parent=None):
+        super(TagItemModel, self).__init__(parent)
+
+        self._keys = list()
+        self._items = list()
+        self._tags = list()
+        self._filters = None
+
+    @property
+    def items(self):
+        """
+        Returns:
+            list: All the tag items in the model
+        """
+        return list(self._items)
+
+    def item(self, row):
+        """
+        Args:
+            row (int): This is the row to collect the item for
+
+        Returns:
+            TagItem: This is the tag item for the given row
+        """
+        return self._items[row]
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self._items)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        """
+        Collects the data for the given index from the tag item
+        Args:
+            index (QtCore.QModelIndex): This is the index to collect the data for
+            role (int): This is the role of the data
+
+        Returns:
+            object: This is the data for the given role or None if the role is not handled
+        """
+        if not index.isValid() or index.row() >= len(self._items):
+            return None
+
+        item = self._items[index.row()]
+        if role == self.itemRole:
+            return item
+
+        try:
+            if role in [QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole]:
+                return item.fullName
+            elif role == self.classRole:
+                return item.nodeClass
+            elif role == self.tagsRole:
+                return '|'.join(item.formattedTags)
+        except (ValueError, AttributeError):
+            # The node has been deleted
+            return ''
+
+        return None
+
+    @staticmethod
+    def _getKeyedItems(tagItems):
+        """
+        Args:
+            tagItems (set[TagItem]): These are the tag items to key
+
+        Returns:
+            dict: This is the tag items keyed by the full name of their node.  Any items where the node
+                  has been deleted are skipped
+        """
+        keyedItems = dict()
+        for item in tagItems:
+            try:
+                keyedItems[item.fullName] = item
+            except (ValueError, AttributeError):
+                continue
+
+        return keyedItems
+
+    @staticmethod
+    def _getRanges(rows):
+        """
+        Args:
+            rows (list[int]): This is a sorted list of rows
+
+        Returns:
+            list: This is a list of tuples of the first and last row of each run of consecutive rows
+        """
+        ranges = list()
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
 
-        self.updateSignal = updateSignal
-        self.tagItem = tagItem
+        return [tuple(rowRange) for rowRange in ranges]
 
-        self.masterLayout = QtGui.QVBoxLayout()
-        self.nodeInfoLayout = QtGui.QHBoxLayout()
+    def setItems(self, tagItems):
+        """
+        This will replace all the items in the model with the given tag items
+        Args:
+            tagItems (set[TagItem]): These are the tag items for the model
+        """
+        keyedItems = self._getKeyedItems(tagItems)
 
-        self.nameLabel = QtGui.QLabel()
-        self.classLabel = QtGui.QLabel()
-        self.tagsLabel = QtGui.QLabel()
-        self.filters = dict()
+        self.beginResetModel()
+        self._keys = sorted(keyedItems)
+        self._items = [keyedItems[key] for key in self._keys]
+        self._tags = [frozenset(item.tags) for item in self._items]
+        self.endResetModel()
 
-    def initializeDefaults(self):
+    def updateItems(self, tagItems, filters=None):
         """
-        Set the defaults for the widget
+        This will update the model to match the given tag items.  Rows are only removed for the
+        nodes that are no longer present and only inserted for the nodes that are new.  The
+        remaining rows are only refreshed if the tags on the node have changed, or all the rows are
+        refreshed if the filters have changed as the formatting of the tags will have changed
+        Args:
+            tagItems (set[TagItem]): These are the tag items for the model
+            filters (dict|optional): This is the filters the tag items were collected with
         """
-        self.updateLabels()
+        filters = {key: (filters or dict()).get(key, None) for key in self.filterKeys}
+        filtersChanged = filters != self._filters
+        self._filters = filters
+
+        keyedItems = self._getKeyedItems(tagItems)
+        if not self._keys or not keyedItems:
+            self.setItems(keyedItems.values())
+            return
+
+        removedRows = [row for row, key in enumerate(self._keys) if key not in keyedItems]
+        for firstRow, lastRow in reversed(self._getRanges(removedRows)):
+            self.beginRemoveRows(QtCore.QModelIndex(), firstRow, lastRow)
+            del self._keys[firstRow:lastRow + 1]
+            del self._items[firstRow:lastRow + 1]
+            del self._tags[firstRow:lastRow + 1]
+            self.endRemoveRows()
+
+        changedRows = list()
+        for row, key in enumerate(self._keys):
+            item = keyedItems[key]
+            tags = frozenset(item.tags)
+            if item is not self._items[row] or tags != self._tags[row]:
+                self._items[row] = item
+                self._tags[row] = tags
+                changedRows.append(row)
+
+        existingKeys = set(self._keys)
+        insertGroups = list()
+        for key in sorted(key for key in keyedItems if key not in existingKeys):
+            position = bisect.bisect_left(self._keys, key)
+            if insertGroups and insertGroups[-1][0] == position:
+                insertGroups[-1][1].append(key)
+            else:
+                insertGroups.append((position, [key]))
+
+        offset = 0
+        for position, keys in insertGroups:
+            row = position + offset
+            items = [keyedItems[key] for key in keys]
+            self.beginInsertRows(QtCore.QModelIndex(), row, row + len(keys) - 1)
+            self._keys[row:row] = keys
+            self._items[row:row] = items
+            self._tags[row:row] = [frozenset(item.tags) for item in items]
+            self.endInsertRows()
+            offset += len(keys)
+
+        if filtersChanged:
+            self.refresh()
+            return
+
+        for firstRow, lastRow in self._getRanges(changedRows):
+            self.dataChanged.emit(self.index(firstRow, 0), self.index(lastRow, 0))
+
+    def refresh(self):
+        """
+        This will notify the views that the data on all rows has changed, ie: when the filters have changed.  Only
+        the rows that are visible will be repainted
+        """
+        if self._items:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self._items) - 1, 0))
+
+
+class TagItemDelegate(QtGui.QStyledItemDelegate):
+    """
+    Paints the node name, class and the coloured tags for each of the rows of the TagItemModel
+    """
+
+    margin = 4
 
-    def initializeInterface(self):
+    def paint(self, painter, option, index):
+        """
+        Paints the row for the given index
+        Args:
+            painter (QtGui.QPainter): This is the painter used to paint the row
+            option (QtGui.QStyleOptionViewItem): This is the style options for the row
+            index (QtCore.QModelIndex): This is the index of the row
         """
-        Set the base interface.
-        Adding widgets to layouts and setting base layouts.
-        Sets base values on widgets
+        styleOption = QtGui.QStyleOptionViewItem(option)
+        self.initStyleOption(styleOption, index)
+        styleOption.text = ''
+        widget = styleOption.widget
+        style = widget.style() if widget else QtGui.QApplication.style()
+        style.drawControl(QtGui.QStyle.CE_ItemViewItem, styleOption, painter, widget)
+
+        rect = option.rect.adjusted(self.margin, self.margin, -self.margin, -self.margin)
+        lineHeight = option.fontMetrics.height()
+        infoRect = QtCore.QRect(rect.left(), rect.top(), rect.width(), lineHeight)
+
+        painter.save()
+        painter.drawText(infoRect, QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                         'Name: {0}'.format(index.data(QtCore.Qt.DisplayRole)))
+        painter.drawText(infoRect, QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter,
+                         'Class: {0}'.format(index.data(TagItemModel.classRole)))
+
+        document = QtGui.QTextDocument()
+        document.setDocumentMargin(0)
+        document.setDefaultFont(option.font)
+        document.setHtml(index.data(TagItemModel.tagsRole))
+        painter.translate(rect.left(), rect.top() + lineHeight + self.margin)
+        document.drawContents(painter, QtCore.QRectF(0, 0, rect.width(), lineHeight))
+        painter.restore()
+
+    def sizeHint(self, option, index):
         """
-        self.nodeInfoLayout.addWidget(self.nameLabel)
-        self.nodeInfoLayout.addStretch()
-        self.nodeInfoLayout.addWidget(self.classLabel)
+        Returns:
+            QtCore.QSize: This is the size of each row, which is two lines of text
+        """
+        return QtCore.QSize(option.rect.width(), option.fontMetrics.height() * 2 + self.margin * 3)
+
+
+class _TagItemRegistry(object):
+    """
+    Registry of the tag items keyed by the hash of their node.  The items are only held by weak
+    references so any item that is still in use, ie: shown in the tag list, is always found while
+    items that are no longer used can be garbage collected.  The most recently used items are also
+    held in a bounded LRU cache so they are not re-created every time the list changes.
+
+    Items are removed when their node is destroyed so the registry stays the same size over long
+    sessions.  Use the global TagItemRegistry instance rather than creating new instances
+
+    Kwargs:
+        maxSize (int|optional): This is the number of recently used items that are kept alive
+                default: Globals.tagItemCacheSize
+    """
+
+    def __init__(self, **kwargs):
+        super(_TagItemRegistry, self).__init__()
 
-        self.masterLayout.addLayout(self.nodeInfoLayout)
-        self.masterLayout.addWidget(self.tagsLabel)
+        self.maxSize = kwargs.get('maxSize', Globals.tagItemCacheSize)
+
+        self._lock = threading.RLock()
+        self._registered = False
+        self._items = weakref.WeakValueDictionary()
+        self._recent = collections.OrderedDict()
+        self._metrics = {'hits': 0,
+                         'misses': 0,
+                         'evictions': 0,
+                         'removals': 0}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def registerCallbacks(self):
+        """
+        Register the nuke callbacks that are used to remove the items for destroyed nodes.  This
+        should be called from the main thread
+        """
+        if self._registered:
+            return
 
-        self.setLayout(self.masterLayout)
-        self.tagsLabel.setText('|'.join(self.tagItem.formattedTags))
+        nuke.addOnDestroy(self._onDestroy)
+        self._registered = True
 
-    def initializeSignals(self):
+    def get(self, key):
         """
-        Connects all the signals for the current instance (self)
+        Args:
+            key (int): This is the hash of the node
+
+        Returns:
+            TagItem|None: This is the item for the node or None if there is no item
         """
-        if self.updateSignal:
-            self.updateSignal.connect(self.tagItem.updateFilters)
+        with self._lock:
+            item = self._items.get(key, None)
+            if item is None:
+                self._metrics['misses'] += 1
+                return None
+
+            self._metrics['hits'] += 1
+            self._touch(key, item)
+            return item
 
-    def updateLabels(self):
+    def add(self, key, item):
         """
-        Updates the labels on self to reflect the information for the current node
+        Adds the item to the registry
+        Args:
+            key (int): This is the hash of the node
+            item (TagItem): This is the item for the node
         """
-        self.nameLabel.setText('Name: {0}'.format(self.tagItem.node.fullName()))
-        self.classLabel.setText('Class: {0}'.format(self.tagItem.node.Class()))
-        self.tagsLabel.setText('|'.join(self.tagItem.formattedTags))
+        with self._lock:
+            self._items[key] = item
+            self._touch(key, item)
+
+    def remove(self, key):
+        """
+        Removes the item from the registry
+        Args:
+            key (int): This is the hash of the node
+        """
+        with self._lock:
+            if self._items.pop(key, None) is not None:
+                self._metrics['removals'] += 1
+            self._recent.pop(key, None)
+
+    def clear(self):
+        """
+        Removes all the items from the registry
+        """
+        with self._lock:
+            self._items.clear()
+            self._recent.clear()
+
+    def _touch(self, key, item):
+        """
+        Marks the item as the most recently used, evicting the least recently used item from the
+        cache if it is full
+        Args:
+            key (int): This is the hash of the node
+            item (TagItem): This is the item for the node
+        """
+        self._recent[key] = item
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.maxSize:
+            self._recent.popitem(last=False)
+            self._metrics['evictions'] += 1
+
+    def memoryReport(self):
+        """
+        Returns:
+            dict: This is the number of items that are alive and cached, the approximate size of
+                  the items in bytes and the hits, misses, evictions and removals of the registry
+        """
+        with self._lock:
+            items = list(self._items.values())
+            report = dict(self._metrics)
+            report['items'] = len(items)
+            report['cached'] = len(self._recent)
+            report['maxSize'] = self.maxSize
+
+        size = 0
+        for item in items:
+            size += sys.getsizeof(item) + sys.getsizeof(item.filters)
+            formattedTags = item.cachedFormattedTags
+            if formattedTags is not None:
+                size += sys.getsizeof(formattedTags) + sum(sys.getsizeof(tag) for tag in formattedTags)
+        report['bytes'] = size
+
+        return report
+
+    def _onDestroy(self):
+        """
+        Triggered from nuke when a node is destroyed so its item is removed
+        """
+        self.remove(nuke.thisNode().__hash__())
+
+
+TagItemRegistry = _TagItemRegistry()
 
 
 class TagItem(QtCore.QObject):
     """
-    Data item for handling the tags on a node and providing basic information for the tag gui
+    Data item for handling the tags on a node and providing basic information for the tag gui.  The
+    items are shared through the TagItemRegistry, see globalInstance and fromSnapshot
     """
 
     colourMatchingTag = '#38d100'
     colourMissingTag = '#ff5e5e'
 
-    _globalInstances = dict()
-
     def __init__(self, node, filters=None):
         super(TagItem, self).__init__()
 
         self._node = None
+        self._snapshot = None
         self.node = node
 
         self._name = None
@@ -103,19 +446,45 @@ class TagItem(QtCore.QObject):
         is cleared to avoid and issues later.  Once that has been done it will either set the node to the value or
         do a call to nuke collecting the node by name
         Args:
-            value (str|nuke.Node): Either the node object or the name of the node
+            value (str|nuke.Node|nodeTag.snapshot.NodeSnapshot): Either the node object, the name of the node or a
+                                                                 snapshot of the node
         """
         self._name = None
         self._formattedTags = None
+        self._snapshot = None
         if self._node:
-            self._globalInstances[self._node.__hash__()] = None
+            TagItemRegistry.remove(self._node.__hash__())
+
+        if isinstance(value, nodeTag.snapshot.NodeSnapshot):
+            self._snapshot = value
+            self._node = value.node
 
-        if isinstance(value, nuke.Node):
+        elif isinstance(value, nuke.Node):
             self._node = value
 
         else:
             self._node = nuke.toNode(value)
 
+    @property
+    def snapshot(self):
+        """
+        Returns:
+            nodeTag.snapshot.NodeSnapshot|None: This is the snapshot of the node the item was last updated from
+        """
+        return self._snapshot
+
+    def setSnapshot(self, snapshot):
+        """
+        Updates the item from a new snapshot of its node.  All the information for the item is then read from the
+        snapshot rather than the node so the item can be processed from any thread
+        Args:
+            snapshot (nodeTag.snapshot.NodeSnapshot): This is the new snapshot of the node
+        """
+        self._snapshot = snapshot
+        self._node = snapshot.node
+        self._name = None
+        self._formattedTags = None
+
     @property
     def name(self):
         """
@@ -123,16 +492,41 @@ class TagItem(QtCore.QObject):
             str: The name of the node that pertains to the current instance (self)
         """
         if self._name is None:
-            self._name = self.node.name()
+            self._name = self._snapshot.name if self._snapshot else self.node.name()
 
         return self._name
 
+    @property
+    def fullName(self):
+        """
+        Returns:
+            str: The full name of the node that pertains to the current instance (self)
+        """
+        if self._snapshot:
+            return self._snapshot.fullName
+
+        return self.node.fullName()
+
+    @property
+    def nodeClass(self):
+        """
+        Returns:
+            str: The class of the node that pertains to the current instance (self)
+        """
+        if self._snapshot:
+            return self._snapshot.nodeClass
+
+        return self.node.Class()
+
     @property
     def tags(self):
         """
         Returns:
             set: This is a set of all the tags that are present on the node
         """
+        if self._snapshot:
+            return set(self._snapshot.getTags(classTag=self.filters.get('classTag', False)))
+
         return nodeTag.logic.getTags(self.node, **self.filters)
 
     @property
@@ -146,26 +540,21 @@ class TagItem(QtCore.QObject):
         """
         if self._formattedTags is None:
             self.blockSignals(True)
-            search = self.filters.get('tags', set())
-
-            if not isinstance(search, set):
-                search = set(search)
+            query = self.filters.get('query', None)
+            if query is None:
+                try:
+                    query = nodeTag.query.TagQuery.fromFilters(self.filters)
+                except (ValueError, re.error):
+                    # The search is still being typed so there is nothing to highlight yet
+                    query = nodeTag.query.TagQuery.compile(())
 
             tags = {self.colourMissingTag: set(),
                     self.colourMatchingTag: set()}
-            existingTags = copy.copy(self.tags)
-
-            for tag in search:
-                matchedTags = list(nodeTag.logic.getTagMatches(self.node, tag, **self.filters))
-
-                if len(matchedTags) > 1:
-                    for matchedTag in matchedTags:
-                        tags[self.colourMatchingTag].add(matchedTag)
+            existingTags = set(self.tags)
 
-                    continue
-
-                elif matchedTags:
-                    tags[self.colourMatchingTag].add(matchedTags[0])
+            for tag, matchedTags in query.termMatches(existingTags).items():
+                if matchedTags:
+                    tags[self.colourMatchingTag].update(matchedTags)
                 else:
                     tags[self.colourMissingTag].add(tag)
 
@@ -183,6 +572,15 @@ class TagItem(QtCore.QObject):
 
         return self._formattedTags
 
+    @property
+    def cachedFormattedTags(self):
+        """
+        Unlike formattedTags this will not format the tags if they have not been formatted yet
+        Returns:
+            list|None: This is the formatted tags or None if they have not been formatted
+        """
+        return self._formattedTags
+
     @QtCore.Slot(dict)
     def updateFilters(self, filters):
         """
@@ -202,14 +600,46 @@ class TagItem(QtCore.QObject):
         """
         if not isinstance(node, nuke.Node):
             node = nuke.toNode(node)
-
-        instance = cls._globalInstances.get(node.__hash__(), None)
-        if instance:
-            try:
-                del cls._globalInstances[node.__hash__]
-            except KeyError:
+            if node is None:
                 return
 
+        TagItemRegistry.remove(node.__hash__())
+
+    def isCurrent(self, snapshot, filters):
+        """
+        Args:
+            snapshot (nodeTag.snapshot.NodeSnapshot): This is the latest snapshot of the node
+            filters (dict): This is the latest filters
+
+        Returns:
+            bool: True or False if the item would show the same information for the given snapshot and filters
+        """
+        if self._snapshot is None or self._snapshot.state != snapshot.state:
+            return False
+
+        return all(self.filters.get(key, None) == filters.get(key, None) for key in TagItemModel.filterKeys)
+
+    @classmethod
+    def fromSnapshot(cls, snapshot, filters=None):
+        """
+        Collects the cached instance of the Tag item for the node of the given snapshot.  Instances are shared with
+        the interface so they are never modified here, if the node or the filters have changed then a new instance
+        replaces the cached one.  This does not touch the node so it is safe to call from any thread
+        Args:
+            snapshot (nodeTag.snapshot.NodeSnapshot): This is the snapshot of the node
+            filters (dict|optional): information dict with all the filters and their settings
+
+        Returns:
+            TagItem: Instance of the TagItem for the node of the snapshot
+        """
+        filters = filters or dict()
+        instance = TagItemRegistry.get(snapshot.nodeId)
+        if instance is None or not instance.isCurrent(snapshot, filters):
+            instance = cls(snapshot, filters=filters)
+            TagItemRegistry.add(snapshot.nodeId, instance)
+
+        return instance
+
     @classmethod
     def globalInstance(cls, node):
         """
@@ -224,9 +654,9 @@ class TagItem(QtCore.QObject):
         if not isinstance(node, nuke.Node):
             node = nuke.toNode(node)
 
-        instance = cls._globalInstances.get(node.__hash__(), None)
-        if not instance:
+        instance = TagItemRegistry.get(node.__hash__())
+        if instance is None:
             instance = cls(node)
-            cls._globalInstances[node.__hash__()] = instance
+            TagItemRegistry.add(node.__hash__(), instance)
 
         return instance
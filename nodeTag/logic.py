@@ -1,9 +1,13 @@
 import nuke
-import copy
 import re
 import logging
+import functools
+import itertools
 
 import common.utilities
+import nodeTag.index
+import nodeTag.query
+import nodeTag.snapshot
 
 from nodeTag.globals import Globals
 
@@ -29,7 +33,9 @@ Kwargs:
     append (bool|optional): True or False if the given tag is to be appended to the nodes tags or if it shall
                             replace the existing tags
            default: False
-    create (bool|optional): True or False if we should create the tag knob if one does not yet exist
+    create (bool|optional): True or False if we should create the tag knob if one does not yet exist.  This is only
+                            used when writing tags, all of the query functions are read-only and will never create
+                            the tag knobs
            default: True
     classTag (bool|optional): True or False if we are to include the nodes class as a tag
              default: False     
@@ -85,18 +91,7 @@ def addTag(node, tag, **kwargs):
        ignoreErrors (bool|optional): True of False if errors are to be ignored when processing the tag knob
                     default: False
     """
-    append = kwargs.get('append', False)
-
-    existingTags = set()
-    if append:
-        existingTags = getTags(node, **kwargs)
-
-    validTag = validateTag(tag, **kwargs)
-
-    existingTags.add(validTag)
-    tags = Globals.tagSeparator.join(existingTags)
-    knob = getTagKnob(node, **kwargs)
-    knob.setValue(tags)
+    modifyTags({node}, add=[tag], **kwargs)
 
 
 def addTags(node, tags, **kwargs):
@@ -109,21 +104,10 @@ def addTags(node, tags, **kwargs):
 
     See module level docs for possible Kwargs
     """
-    if isinstance(tags, str):
-        tags = getTagsFromString(tags)
-
-    if isinstance(tags, set):
-        tags = list(tags)
-
-    tags = copy.copy(tags)
     if not tags:
         return
 
-    firstTag = tags.pop(0)
-    addTag(node, firstTag, **kwargs)
-    kwargs['append'] = True
-    for tag in tags:
-        addTag(node, tag, **kwargs)
+    modifyTags({node}, add=tags, **kwargs)
 
 
 def removeTag(node, tag, **kwargs):
@@ -135,15 +119,7 @@ def removeTag(node, tag, **kwargs):
 
     See module level docs for possible Kwargs
     """
-    tagMatches = getTagMatches(node, tag, **kwargs)
-    tags = list(getTags(node, **kwargs))
-    for tag in tagMatches:
-        tags.remove(tag)
-
-    if tags:
-        addTags(node, tags, **kwargs)
-    else:
-        clearTags(node)
+    modifyTags({node}, remove=[tag], **kwargs)
 
     return hasTag(node, tag)
 
@@ -157,8 +133,7 @@ def removeTags(node, tags, **kwargs):
 
     See module level docs for possible Kwargs
     """
-    for tag in tags:
-        removeTag(node, tag, **kwargs)
+    modifyTags({node}, remove=tags, **kwargs)
 
 
 def clearTags(node):
@@ -167,8 +142,7 @@ def clearTags(node):
     Args:
         node (nuke.Node): This is the node in which to remove the tags from
     """
-    knob = getTagKnob(node, create=True)
-    knob.setValue('')
+    modifyTags({node}, clear=True)
 
 
 def tagNodes(nodes, tags, **kwargs):
@@ -180,20 +154,166 @@ def tagNodes(nodes, tags, **kwargs):
 
     See module level docs for possible Kwargs
     """
-    for node in nodes:
-        addTags(node, tags, **kwargs)
+    if not tags:
+        return
+
+    modifyTags(nodes, add=tags, **kwargs)
+
+
+def modifyTags(nodes, add=None, remove=None, **kwargs):
+    """
+    This is the batch path for changing the tags on nodes.  The tags to add are validated and the tags to remove are
+    compiled once for the whole batch.  Each node then has its tags read once, all of the changes applied and is
+    only written to once, if its tags have actually changed.  All of the writes are done within a single undo group
+
+    Args:
+        nodes (list|set|nuke.Node): These are the nodes in which to modify the tags on
+        add (list|set|str|optional): These are the tags to add to the nodes
+        remove (list|set|str|optional): These are the tags to remove from the nodes.  These are matched against the
+                                        existing tags in the same way as getTagMatches
+
+    Kwargs:
+        append (bool|optional): True or False if the added tags are to be appended to the nodes tags or if they
+                                shall replace the existing tags.  This has no effect if there are no tags to add
+               default: False
+        clear (bool|optional): True or False if all the existing tags are to be removed from the nodes
+              default: False
+        undoName (str|optional): This is the name that will be used for the undo group
+
+    See module level docs and getTagMatches docs for possible additional Kwargs
+
+    Returns:
+        set: This is a set of all the nodes that had their tags changed
+    """
+    if isinstance(nodes, nuke.Node):
+        nodes = {nodes}
+    elif not isinstance(nodes, set):
+        nodes = set(nodes)
+
+    kwargs.setdefault('undoName', 'Modify Tags: {0}'.format(len(nodes)))
+    changes = getTagChanges(nodeTag.snapshot.takeSnapshots(nodes), add=add, remove=remove, **kwargs)
+
+    return applyTagChanges(changes, **kwargs)
+
+
+def getTagChanges(snapshots, add=None, remove=None, **kwargs):
+    """
+    This works out the new tags for each of the given node snapshots without touching the nodes, so it is safe to
+    call from any thread.  The changes can then be written with applyTagChanges.  The kwargs are the same as
+    modifyTags
+
+    Args:
+        snapshots (list[nodeTag.snapshot.NodeSnapshot]): These are the snapshots of the nodes to modify
+        add (list|set|str|optional): These are the tags to add to the nodes
+        remove (list|set|str|optional): These are the tags to remove from the nodes
+
+    Returns:
+        dict: This is the new set of tags for each of the nodes where the tags have changed, keyed by their node
+    """
+    append = kwargs.get('append', False)
+    clear = kwargs.get('clear', False)
+
+    addedTags = validateTags(add, **kwargs) if add else set()
+
+    # The tags to remove are never parsed as an expression, each tag is its own term so wildcards and
+    # regexes are kept and characters such as ! are taken literally
+    removeTerms = list()
+    if remove:
+        removeTags = _splitTagString(remove) if isinstance(remove, str) else set(remove)
+        removeTerms = [nodeTag.query.TagTerm(tag,
+                                             caseSensitive=kwargs.get('caseSensitive', True),
+                                             exactMatch=kwargs.get('exactMatch', True),
+                                             useRegex=kwargs.get('useRegex', False))
+                       for tag in sorted(removeTags) if tag]
+
+    # Without append any added tags replace the tags that already exist, the same as addTags
+    keepExisting = not clear and (append or not add)
+
+    changes = dict()
+    for snapshot in snapshots:
+        existingTags = snapshot.getTags()
+
+        tags = set(existingTags) if keepExisting else set()
+        for term in removeTerms:
+            tags.difference_update(term.matches(tags))
+        tags.update(addedTags)
+
+        if tags == existingTags or (not tags and not snapshot.hasTagKnob):
+            continue
+
+        changes[snapshot.node] = tags
+
+    return changes
+
+
+def applyTagChanges(changes, **kwargs):
+    """
+    This will write the tags to each of the nodes within a single undo group.  This must be called from the main
+    thread, see nodeTag.snapshot.executeInBatches
+    Args:
+        changes (dict): This is the set of tags for each node, see getTagChanges
+
+    Kwargs:
+        undoName (str|optional): This is the name that will be used for the undo group
+        useUndo (bool|optional): True or False if the writes are to be made within their own undo
+                                 group.  This is False when the caller manages the undo group
+                default: True
+
+    See getTagKnob for the kwargs used when creating the tag knobs
+
+    Returns:
+        set: This is a set of all the nodes that had their tags written
+    """
+    modifiedNodes = set()
+    undoStack = nuke.Undo()
+    useUndo = kwargs.get('useUndo', True)
+    if useUndo:
+        undoStack.begin(kwargs.get('undoName', 'Modify Tags: {0}'.format(len(changes))))
+    try:
+        for node, tags in changes.items():
+            try:
+                knob = getTagKnob(node, **kwargs)
+            except ValueError:
+                # The node has been deleted since the changes were made
+                continue
+
+            if not knob:
+                continue
+
+            knob.setValue(Globals.tagSeparator.join(sorted(tags)))
+            _updateIndex(node, tags)
+            modifiedNodes.add(node)
+    finally:
+        if useUndo:
+            undoStack.end()
+
+    # The writes can be undone without triggering any callbacks so the index reads them again after an undo
+    nodeTag.index.TagIndex.markDirty(modifiedNodes)
+    return modifiedNodes
+
+
+def _updateIndex(node, tags):
+    """
+    This will update the tag index with the tags that have just been written to the node.  If the index has not
+    yet been built then there is nothing to update as the tags will be read when it is built
+    Args:
+        node (nuke.Node): This is the node that has been updated
+        tags (set): This is the set of tags that are now on the node
+    """
+    if nodeTag.index.TagIndex.isBuilt:
+        nodeTag.index.TagIndex.update(node, {tag for tag in tags if tag})
 
 
 def getTags(node, **kwargs):
     """
-    This will collect all of the tags from the given node and return a set of all the collected tags
+    This will collect all of the tags from the given node and return a set of all the collected tags.  This is
+    read-only and will not create the tag knob if the node does not have one
     Args:
         node (nuke.Node): This is the node in which to collect the tags from
+
     Kwargs:
         classTag (bool|optional): True or False if the nodes class should be included as a tag
                  default: False
-        create (bool|optional): True or False if we should create the tag knob if one does not yet exist
-               default: True
 
     See module level docs for any additional possible Kwargs
 
@@ -202,9 +322,9 @@ def getTags(node, **kwargs):
     """
     classTag = kwargs.get('classTag', False)
 
-    knob = getTagKnob(node, **kwargs)
+    knob = getTagKnob(node, create=False)
     if not knob:
-        return set()
+        return {node.Class()} if classTag else set()
 
     tags = set(getTagsFromString(knob.value()))
     if classTag:
@@ -216,26 +336,63 @@ def getTags(node, **kwargs):
 def getTagsFromString(tags):
     """
     This will take a given string and attempt to extract any tags from it.  This will also validate all of the collected
-    tags to ensure that they conform with the tag rules
+    tags to ensure that they conform with the tag rules.  As most nodes share a handful of identical tag strings the
+    results are cached against the raw string, see getTagStringCacheInfo
     Args:
         tags (str): This is a formatted string that contains possible tags.  The tags should be separated by any of the
                     following characters [' ', '|', '\n', ',']
 
     Returns:
-        set: This is a set of the collected tags
+        frozenset: This is a frozenset of the collected tags
     """
     if not isinstance(tags, str):
         raise TypeError('Expected a String {0} found'.format(type(tags)))
 
+    return _parseTagString(tags)
+
+
+@functools.lru_cache(maxsize=Globals.tagStringCacheSize)
+def _parseTagString(tags):
+    """
+    Args:
+        tags (str): This is a formatted string that contains possible tags
+
+    Returns:
+        frozenset: This is a frozenset of the collected tags
+    """
+    tags = validateTags(_splitTagString(tags), ignoreErrors=True, subInvalidTags=False)
+
+    return frozenset(tags)
+
+
+def _splitTagString(tags):
+    """
+    Splits a formatted string in to its tags without validating them, so search tags such as wildcards are kept
+    Args:
+        tags (str): This is a formatted string that contains possible tags
+
+    Returns:
+        set: This is a set of the tags in the string
+    """
     for separator in Globals.potentialSeparators:
         tags = tags.replace(separator, Globals.tagSeparator)
 
-    tags = [tag.strip(Globals.tagSeparator) for tag in tags.split(Globals.tagSeparator) if tag]
-    tags = set(tags)
+    return {tag.strip(Globals.tagSeparator) for tag in tags.split(Globals.tagSeparator) if tag}
 
-    tags = validateTags(tags, ignoreErrors=True, subInvalidTags=False)
 
-    return tags
+def getTagStringCacheInfo():
+    """
+    Returns:
+        functools._CacheInfo: This is the hits, misses, maxsize and currsize of the tag string cache
+    """
+    return _parseTagString.cache_info()
+
+
+def clearTagStringCache():
+    """
+    This will clear the tag string cache and reset the hit and miss counters
+    """
+    _parseTagString.cache_clear()
 
 
 def getTagKnob(node, **kwargs):
@@ -293,50 +450,51 @@ def getTagMatches(node, tag, **kwargs):
     Returns:
         set: This is a set of all the tag matches found on the node
     """
-    caseSensitive = kwargs.get('caseSensitive', True)
-    exactMatch = kwargs.get('exactMatch', True)
-    useRegex = kwargs.get('useRegex', False)
-
-    tags = getTags(node, **kwargs)
-    casedTags = {existingTag.lower(): existingTag for existingTag in tags}
-    matches = set()
-    if not caseSensitive:
-        tag = tag.lower()
-        tags = casedTags.keys()
-
-    if '*' in tag or useRegex:
-        if not useRegex:
-            tag = tag.replace('*', r'\w*')
-        if caseSensitive:
-            regex = re.compile(tag)
-        else:
-            regex = re.compile(tag, flags=re.IGNORECASE)
-        regexMatch = re.findall(regex, ' '.join(tags))
-        if regexMatch:
-            matches = set([casedTags.get(match.lower()) for match in regexMatch if match in tags])
+    return matchTags(tag, getTags(node, **kwargs), **kwargs)
+
+
+def matchTags(tag, tags, **kwargs):
+    """
+    This will take the given set of tags and get all the tags which match the given tag.  See the docstring for the
+    getTagMatches function for the forms that the tag can take
+    Args:
+        tag (str|nodeTag.query.TagTerm): This is the search query/tag to find matches for.  This can also be a
+                                         pre-compiled term in which case the kwargs are ignored
+        tags (set): This is the set of tags to check for matches
 
-    elif not exactMatch:
-        for existingTag in tags:
-            if tag in existingTag:
-                matches.add(casedTags.get(existingTag.lower()))
+    See getTagMatches docs for acceptable kwargs
 
-    else:
-        if tag in tags:
-            return {casedTags.get(tag.lower())}
+    Returns:
+        set: This is a set of all the tags which match the given tag
+    """
+    if not isinstance(tag, nodeTag.query.TagTerm):
+        tag = nodeTag.query.TagTerm(tag,
+                                    caseSensitive=kwargs.get('caseSensitive', True),
+                                    exactMatch=kwargs.get('exactMatch', True),
+                                    useRegex=kwargs.get('useRegex', False))
 
-    return matches
+    return tag.matches(tags)
 
 
-def findNodes(tags, **kwargs):
+def findNodes(tags=None, **kwargs):
     """
     This will search and find all nodes that have the given tags.  This uses the getTagMatches to
     determine if there are any matching tags.  See the docstring for the getTagMatches function
     for more information
 
+    The nodes that are searched are resolved by the scope planner, see _getNodeScope, so that only
+    the narrowest collection of nodes is ever visited
+
     Args:
-        tags (list|str|set): This is a list of tags that will be used to search for nodes
+        tags (list|str|set|nodeTag.query.TagQuery): This is a list of tags that will be used to
+                                                    search for nodes, a tag expression string such
+                                                    as (comp|roto) & !deprecated or a pre-compiled
+                                                    query.  See nodeTag.query for the expression
+                                                    syntax
 
     Kwargs:
+        query (nodeTag.query.TagQuery|optional): This is a pre-compiled query to use instead of
+                                                 the given tags.
         matchAll (bool|optional): True or False if nodes must match all the given tags.  If set to
                                   False then as long as one tag matches the node will be considered
                                   a match
@@ -347,76 +505,247 @@ def findNodes(tags, **kwargs):
         limitToSelected (bool:optional): True or False if the node collection should be limited to
                                          only nodes within the current selection
               default: False
+        nodeClass (str|optional): This is a node class to limit the search to
+        limit (int|optional): This is the maximum number of nodes to find, ie: for a preview of
+                              the matches or to check if there are any matches.  Only the nodes of
+                              a node class are streamed, see _getNodeScope, so the search stops at
+                              the first matches.  The tag index only turns the first matches into
+                              nodes and the given nodes or the selection are still collected in
+                              full before they are searched
 
     See module level docs for possible additional Kwargs
 
     Returns:
         set: This is a set of all nodes found which match the search parameters provided
     """
-    matchAll = kwargs.get('matchAll', True)
-    nodes = kwargs.get('nodes', common.utilities.allNodes(**kwargs))
+    query = kwargs.get('query', None) or nodeTag.query.TagQuery.compile(tags, **kwargs)
+    limit = kwargs.get('limit', None)
 
-    if isinstance(tags, str):
-        tags = getTagsFromString(tags)
+    nodes = _getNodeScope(**kwargs)
+    if nodes is None:
+        return _findIndexedNodes(query,
+                                 recurseGroups=kwargs.get('recurseGroups', False),
+                                 recurseGizmos=kwargs.get('recurseGizmos', False),
+                                 limitToSelected=kwargs.get('limitToSelected', False),
+                                 nodeClass=kwargs.get('nodeClass', None),
+                                 limit=limit)
 
-    matches = set()
-    if matchAll:
-        filterFunction = all
-    else:
-        filterFunction = any
+    return set(itertools.islice((node for node in nodes if hasTag(node, query)), limit))
 
+
+def _getNodeScope(**kwargs):
+    """
+    This is the scope planner for the node searches.  It will resolve the narrowest collection of
+    nodes that can be given by nuke for the given kwargs.  In order of preference this is:
+        The nodes explicitly given
+        The current selection from nuke.selectedNodes when limited to the selection
+        The nodes of the given class from nuke.allNodes when limited to a node class
+    If none of these apply then None is returned and the whole script is to be searched using the
+    tag index, which is where the node list is only ever materialized for the matches.
+
+    The nodes of a class are only streamed when a limit is given, from common.utilities.iterNodes
+    with the selection checked as they are visited, so the search can stop at the first matches.
+    Without a limit they are collected in full from common.utilities.allNodes
+
+    Kwargs:
+        nodes (set|list|optional): This is a set or list of nodes to limit the scope to
+        limitToSelected (bool|optional): True or False if the scope is limited to the selection
+        nodeClass (str|optional): This is a node class to limit the scope to
+        recurseGroups (bool|optional): True or False if nodes within groups are to be included
+        recurseGizmos (bool|optional): True or False if nodes within gizmos are to be included
+        limit (int|optional): This is the maximum number of nodes that will be searched for
+
+    Returns:
+        set|generator|None: This is the nodes to search or None if the tag index is to be used
+    """
+    nodes = kwargs.get('nodes', None)
     limitToSelected = kwargs.get('limitToSelected', False)
+    nodeClass = kwargs.get('nodeClass', None)
+    recurseGroups = kwargs.get('recurseGroups', False)
+    recurseGizmos = kwargs.get('recurseGizmos', False)
+
+    if nodes is not None:
+        if limitToSelected:
+            nodes = [node for node in nodes if node['selected'].value()]
+        if nodeClass:
+            nodes = [node for node in nodes if node.Class() == nodeClass]
+        return set(nodes)
+
+    # nuke only returns the selection for the current context, so selections within groups and
+    # gizmos are resolved through the tag index instead
+    if limitToSelected and not any([recurseGroups, recurseGizmos]):
+        if nodeClass:
+            return set(nuke.selectedNodes(nodeClass))
+        return set(nuke.selectedNodes())
+
+    if nodeClass and kwargs.get('limit', None):
+        return common.utilities.iterNodes(classes=nodeClass,
+                                          recurseGroups=recurseGroups,
+                                          recurseGizmos=recurseGizmos,
+                                          predicate=_isSelected if limitToSelected else None)
+
+    # Gizmos are not found when limited to a class so these are left to the tag index
+    if nodeClass and not recurseGizmos:
+        nodes = common.utilities.allNodes(nodeClass=nodeClass, recurseGroups=recurseGroups)
+        if limitToSelected:
+            nodes = {node for node in nodes if node['selected'].value()}
+        return nodes
 
-    for node in nodes:
-        if limitToSelected and not node['selected'].value():
-            continue
+    return None
 
-        matchedTags = dict()
-        for tag in tags:
-            matchedTags[tag] = hasTag(node, tag, **kwargs)
 
-        if filterFunction(matchedTags.values()):
-            matches.add(node)
-            continue
+def _findIndexedNodes(query, **kwargs):
+    """
+    This will use the tag index to find all the nodes which match the given query.  The query is evaluated by the
+    query planner as sets of node ids, see nodeTag.query.QueryPlanner.  This means that the time taken is
+    proportional to the number of matches rather than the number of nodes in the script
+
+    Args:
+        query (nodeTag.query.TagQuery): This is the compiled query used to search for nodes
 
-    return matches
+    Kwargs:
+        recurseGroups (bool|optional): True or False if nodes within groups are to be included
+        recurseGizmos (bool|optional): True or False if nodes within gizmos are to be included
+        limitToSelected (bool|optional): True or False if the matches are limited to the selection
+        nodeClass (str|optional): This is a node class to limit the matches to
+        limit (int|optional): This is the maximum number of nodes to return
+
+    Returns:
+        set: This is a set of all nodes found which match the search parameters provided
+    """
+    limit = kwargs.get('limit', None)
+    index = nodeTag.index.TagIndex.ensure()
+    planner = nodeTag.query.QueryPlanner(index,
+                                         categories=index.getCategories(**kwargs),
+                                         classTag=query.classTag)
+
+    nodeIds = planner.evaluate(query)
+    if kwargs.get('nodeClass', None):
+        nodeIds &= index.classNodeIds(kwargs.get('nodeClass'))
+
+    if not kwargs.get('limitToSelected', False):
+        if limit:
+            nodeIds = set(itertools.islice(nodeIds, limit))
+        return index.toNodes(nodeIds)
+
+    return set(itertools.islice(filter(_isSelected, index.toNodes(nodeIds)), limit))
+
+
+def _isSelected(node):
+    """
+    Args:
+        node (nuke.Node): This is the node to check
+
+    Returns:
+        bool: True or False if the node is selected
+    """
+    return node['selected'].value()
 
 
 def getAllTags(**kwargs):
     """
     This will collect all of the tags that are present in the current session.  If there are given
-    nodes passed then this will only collect the tags for those nodes
+    nodes passed then this will only collect the tags for those nodes.  The nodes are resolved in
+    the same way as findNodes, see _getNodeScope
 
     Kwargs:
         nodes (set|list|optional): This is a set or list of nodes in which to collect the tags from
+        limitToSelected (bool|optional): True or False if only the tags of the selection are to be
+                                         collected
+        nodeClass (str|optional): This is a node class to limit the tag collection to
+        recurseGizmos (bool|optional): True or False if tags on nodes within gizmos are included
 
     Returns:
         set: This is a set of all the tags which have been collected for the nodes
     """
+    classTag = kwargs.get('classTag', False)
+    scopeKwargs = dict(kwargs, recurseGroups=kwargs.get('recurseGroups', True))
 
-    tags = set()
+    nodes = _getNodeScope(**scopeKwargs)
+    if nodes is None:
+        index = nodeTag.index.TagIndex.ensure()
+        categories = index.getCategories(**scopeKwargs)
+        if not any([kwargs.get('limitToSelected', False), kwargs.get('nodeClass', None)]):
+            return index.allTags(categories, classTag=classTag)
 
-    nodes = kwargs.get('nodes',
-                       common.utilities.allNodes(recurseGroups=True,
-                                                 recurseGizmos=kwargs.get('recurseGizmos', False)))
+        nodes = _findIndexedNodes(nodeTag.query.TagQuery.compile((), matchAll=True), **scopeKwargs)
 
+    tags = set()
     for node in nodes:
-        nodeTags = getTags(node, **kwargs)
-        if nodeTags:
-            tags = tags.union(nodeTags)
+        tags.update(_getIndexedTags(node, classTag))
+
+    return tags
+
+
+def getTagStatistics(**kwargs):
+    """
+    This will collect the statistics for all of the tags in the current session.  This is a single pass over the
+    tagged nodes and the result is cached until the script is modified so repeated calls are free.  The result is
+    shared between calls and should not be modified
+
+    Kwargs:
+        recurseGroups (bool|optional): True or False if nodes within groups are to be included
+                      default: True
+        recurseGizmos (bool|optional): True or False if nodes within gizmos are to be included
+                      default: False
+
+    Returns:
+        dict: This is the statistics in the form
+              counts: {tag: number of nodes}
+              classes: {tag: {node class: number of nodes}}
+              cooccurrence: {tag: {other tag: number of nodes with both tags}}
+              generation: the generation of the tag index the statistics were collected at
+    """
+    index = nodeTag.index.TagIndex.ensure()
+    categories = index.getCategories(recurseGroups=kwargs.get('recurseGroups', True),
+                                     recurseGizmos=kwargs.get('recurseGizmos', False))
+
+    return index.tagStatistics(categories)
+
+
+def _getIndexedTags(node, classTag=False):
+    """
+    This will get the tags for the node from the tag index, falling back to reading the tag knob if
+    the node is not within the index
+
+    Args:
+        node (nuke.Node): This is the node to get the tags for
+
+    Kwargs:
+        classTag (bool|optional): True or False if the nodes class should be included as a tag
+
+    Returns:
+        set|frozenset: This is the tags for the node
+    """
+    tags = nodeTag.index.TagIndex.ensure().nodeTags(node)
+    if tags is None:
+        return getTags(node, classTag=classTag)
+
+    if classTag:
+        return tags.union({node.Class()})
 
     return tags
 
 
 def hasTag(node, tag, **kwargs):
     """
-    This will determine if the given node has the given tag
+    This will determine if the given node has the given tag.  The tag can also be a pre-compiled
+    query or term in which case the kwargs for matching are ignored
 
     see getTagMatches docs for acceptable kwargs
     Returns:
         bool: True or False if the given node has the given tag
     """
-    return bool(getTagMatches(node, tag, **kwargs))
+    classTag = kwargs.get('classTag', False)
+    if isinstance(tag, nodeTag.query.TagQuery):
+        classTag = tag.classTag
+
+    tags = _getIndexedTags(node, classTag)
+
+    if isinstance(tag, nodeTag.query.TagQuery):
+        return tag.matches(tags)
+
+    return bool(matchTags(tag, tags, **kwargs))
 
 
 def validateTag(tag, **kwargs):
@@ -495,6 +824,44 @@ def validateTags(tags, **kwargs):
     return validTags
 
 
+def stripEmptyTagKnobs(nodes=None):
+    """
+    This is a one-shot migration to remove the tag knobs from nodes that have no tags.  Older versions created the
+    tag knobs on every node that was searched which bloats the script.  All the knobs are removed within a single
+    undo group
+
+    Kwargs:
+        nodes (set|list|optional): This is a set or list of nodes to process.  If this is not given then all nodes
+                                   in the script, including nodes within groups, will be processed
+
+    Returns:
+        set: This is a set of all the nodes that had their tag knobs removed
+    """
+    if nodes is None:
+        nodes = common.utilities.allNodes(recurseGroups=True)
+
+    strippedNodes = set()
+    undoStack = nuke.Undo()
+    undoStack.begin('Strip Empty Tag Knobs')
+    try:
+        for node in nodes:
+            tagKnob = node.knob(Globals.tagKnobName)
+            if not tagKnob or tagKnob.value().strip():
+                continue
+
+            node.removeKnob(tagKnob)
+            tagTab = node.knob(Globals.tagTabName)
+            if tagTab:
+                node.removeKnob(tagTab)
+            strippedNodes.add(node)
+    finally:
+        undoStack.end()
+
+    nodeTag.index.TagIndex.markDirty(strippedNodes)
+    logging.info('Removed empty tag knobs from {0} nodes'.format(len(strippedNodes)))
+    return strippedNodes
+
+
 def createKnobs(node):
     """
     This will create the required knobs on the node if they are not yet present
@@ -1,2 +1,7 @@
+import nuke
+
+import nodeTag.logic
 import nodeTag.interface.main
 nodeTag.interface.main.start()
+
+nuke.menu('Nuke').addCommand('Edit/Node Tag/Strip Empty Tag Knobs', nodeTag.logic.stripEmptyTagKnobs)
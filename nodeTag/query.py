@@ -0,0 +1,656 @@
+import re
+import functools
+
+import nodeTag.logic
+
+'''
+Compiled tag queries.  A query is compiled once from the search tags and the search kwargs and can then be
+tested against any number of tag sets without re-compiling any regex or wildcard patterns.
+
+The forms a tag can take are the same as described in nodeTag.logic.getTagMatches
+    Exact Match: The tag must be an exact match, taking into account caseSensitive
+    Partial Match: When exactMatch is False the tag only needs to be within an existing tag
+    Wildcard: A * in the tag will match any number of word characters
+    Regex: When useRegex is True the tag is a regular expression which must match the whole tag
+
+Queries can also be given as a boolean expression string, for example (comp|roto) & !deprecated & shot_*
+    &: Both sides must match
+    |: Either side must match
+    !: The following tag or group must not match
+    (): Groups part of the expression
+Tags that are only separated by spaces or commas are combined with & when matchAll is True otherwise with |.
+A string is treated as an expression if it contains any of the &|!() characters so a | always means or, ie: comp|roto
+matches either tag whatever matchAll is.  Expressions are not parsed when useRegex is enabled as the operators are
+valid regex characters
+
+Expressions are evaluated against the tag index by the QueryPlanner.  This estimates how many nodes each part of
+the expression will match and evaluates the most selective parts first, combining the results as sets of node ids
+'''
+
+_expressionCharacters = re.compile('[&|!()]')
+_expressionTokens = re.compile(r'[()&|!]|[^()&|!\s,]+')
+
+
+class TagTerm(object):
+    """
+    A single compiled tag from a query
+    """
+
+    __slots__ = ('tag', 'isExact', '_test')
+
+    def __init__(self, tag, caseSensitive=True, exactMatch=True, useRegex=False):
+        super(TagTerm, self).__init__()
+
+        self.tag = tag
+        self.isExact = False
+
+        if '*' in tag or useRegex:
+            if not useRegex:
+                tag = tag.replace('*', r'\w*')
+            regex = re.compile(tag, flags=0 if caseSensitive else re.IGNORECASE)
+            self._test = lambda existingTag: regex.fullmatch(existingTag) is not None
+
+        elif not exactMatch:
+            if caseSensitive:
+                self._test = lambda existingTag: tag in existingTag
+            else:
+                loweredTag = tag.lower()
+                self._test = lambda existingTag: loweredTag in existingTag.lower()
+
+        elif caseSensitive:
+            self.isExact = True
+            self._test = tag.__eq__
+
+        else:
+            loweredTag = tag.lower()
+            self._test = lambda existingTag: existingTag.lower() == loweredTag
+
+    def test(self, tag):
+        """
+        Args:
+            tag (str): This is the existing tag to check
+
+        Returns:
+            bool: True or False if the given tag matches the term
+        """
+        return self._test(tag)
+
+    def matches(self, tags):
+        """
+        Args:
+            tags (set|frozenset): This is the set of existing tags to check
+
+        Returns:
+            set: This is a set of all the given tags which match the term
+        """
+        if self.isExact:
+            return {self.tag} if self.tag in tags else set()
+
+        return {tag for tag in tags if self._test(tag)}
+
+    def hasMatch(self, tags):
+        """
+        Args:
+            tags (set|frozenset): This is the set of existing tags to check
+
+        Returns:
+            bool: True or False if any of the given tags match the term
+        """
+        if self.isExact:
+            return self.tag in tags
+
+        return any(self._test(tag) for tag in tags)
+
+
+class TermExpression(object):
+    """
+    Expression node for a single tag term
+    """
+
+    __slots__ = ('term',)
+
+    def __init__(self, term):
+        self.term = term
+
+    def evaluate(self, tags):
+        """
+        Args:
+            tags (set|frozenset): This is the set of tags from a node
+
+        Returns:
+            bool: True or False if the given tags satisfy the expression
+        """
+        return self.term.hasMatch(tags)
+
+    def evaluateMask(self, mask, termMask):
+        """
+        Args:
+            mask (int): This is the tag bitmask of a node from the tag index
+            termMask (callable): This is called with each term and returns the mask of the tags it matches
+
+        Returns:
+            bool: True or False if the given mask satisfies the expression
+        """
+        return bool(mask & termMask(self.term))
+
+    def iterTerms(self, negated=False):
+        """
+        Args:
+            negated (bool|optional): True or False if the current branch of the expression is negated
+
+        Yields:
+            tuple(TagTerm, bool): Each term in the expression and if it is negated
+        """
+        yield self.term, negated
+
+
+class NotExpression(object):
+    """
+    Expression node that negates its child
+    """
+
+    __slots__ = ('child',)
+
+    def __init__(self, child):
+        self.child = child
+
+    def evaluate(self, tags):
+        return not self.child.evaluate(tags)
+
+    def evaluateMask(self, mask, termMask):
+        return not self.child.evaluateMask(mask, termMask)
+
+    def iterTerms(self, negated=False):
+        return self.child.iterTerms(negated=not negated)
+
+
+class AndExpression(object):
+    """
+    Expression node where all the children must match
+    """
+
+    __slots__ = ('children',)
+
+    def __init__(self, children):
+        self.children = tuple(children)
+
+    def evaluate(self, tags):
+        return all(child.evaluate(tags) for child in self.children)
+
+    def evaluateMask(self, mask, termMask):
+        return all(child.evaluateMask(mask, termMask) for child in self.children)
+
+    def iterTerms(self, negated=False):
+        for child in self.children:
+            for item in child.iterTerms(negated=negated):
+                yield item
+
+
+class OrExpression(AndExpression):
+    """
+    Expression node where at least one of the children must match
+    """
+
+    __slots__ = ()
+
+    def evaluate(self, tags):
+        return any(child.evaluate(tags) for child in self.children)
+
+    def evaluateMask(self, mask, termMask):
+        return any(child.evaluateMask(mask, termMask) for child in self.children)
+
+
+class _ExpressionParser(object):
+    """
+    Recursive descent parser for tag expressions.  Precedence from lowest to highest is |, & and then !
+    """
+
+    def __init__(self, text, termFactory, matchAll=True):
+        super(_ExpressionParser, self).__init__()
+
+        self.text = text
+        self.termFactory = termFactory
+        self.tokens = self._tokenize(text, '&' if matchAll else '|')
+        self.position = 0
+
+    @staticmethod
+    def _tokenize(text, implicitOperator):
+        """
+        Splits the text into tokens adding in the implicit operator between any tags or groups that are only
+        separated by whitespace or commas
+        """
+        tokens = list()
+        for token in _expressionTokens.findall(text):
+            if tokens and token not in '&|)' and tokens[-1] not in '&|!(':
+                tokens.append(implicitOperator)
+            tokens.append(token)
+
+        return tokens
+
+    def _peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def _next(self):
+        token = self._peek()
+        if token is None:
+            raise ValueError('Unexpected end of tag expression: {0}'.format(self.text))
+        self.position += 1
+        return token
+
+    def parse(self):
+        """
+        Returns:
+            AndExpression|OrExpression|NotExpression|TermExpression|None: This is the root of the parsed
+                                                                            expression or None if it was empty
+        """
+        if not self.tokens:
+            return None
+
+        expression = self._parseOr()
+        if self._peek() is not None:
+            raise ValueError('Unexpected {0} in tag expression: {1}'.format(self._peek(), self.text))
+
+        return expression
+
+    def _parseOr(self):
+        children = [self._parseAnd()]
+        while self._peek() == '|':
+            self._next()
+            children.append(self._parseAnd())
+
+        return children[0] if len(children) == 1 else OrExpression(children)
+
+    def _parseAnd(self):
+        children = [self._parseUnary()]
+        while self._peek() == '&':
+            self._next()
+            children.append(self._parseUnary())
+
+        return children[0] if len(children) == 1 else AndExpression(children)
+
+    def _parseUnary(self):
+        token = self._next()
+        if token == '!':
+            return NotExpression(self._parseUnary())
+
+        if token == '(':
+            expression = self._parseOr()
+            if self._next() != ')':
+                raise ValueError('Missing ) in tag expression: {0}'.format(self.text))
+            return expression
+
+        if token in '&|)':
+            raise ValueError('Unexpected {0} in tag expression: {1}'.format(token, self.text))
+
+        return TermExpression(self.termFactory(token))
+
+
+class TagQuery(object):
+    """
+    Compiled set of tags, or tag expression, used to search for nodes.  Use TagQuery.compile rather than creating
+    instances directly so that identical queries share the same compiled instance
+
+    Args:
+        tags (list|tuple|str): These are the tags for the query or an expression string
+
+    Kwargs:
+        caseSensitive (bool|optional): True or False if the tag check should take the case of the tags into account
+                      default: True
+        exactMatch (bool|optional): True or False if the tag should be an exact match to the search query
+                   default: True
+        useRegex (bool|optional): True or False if the tags are regular expressions
+                 default: False
+        matchAll (bool|optional): True or False if all the tags must match.  If False then only one tag must match
+                 default: True
+        classTag (bool|optional): True or False if the nodes class is to be included as a tag
+                 default: False
+    """
+
+    def __init__(self, tags, **kwargs):
+        super(TagQuery, self).__init__()
+
+        self.caseSensitive = kwargs.get('caseSensitive', True)
+        self.exactMatch = kwargs.get('exactMatch', True)
+        self.useRegex = kwargs.get('useRegex', False)
+        self.matchAll = kwargs.get('matchAll', True)
+        self.classTag = kwargs.get('classTag', False)
+
+        terms = dict()
+
+        def termFactory(tag):
+            if tag not in terms:
+                terms[tag] = TagTerm(tag,
+                                     caseSensitive=self.caseSensitive,
+                                     exactMatch=self.exactMatch,
+                                     useRegex=self.useRegex)
+            return terms[tag]
+
+        if isinstance(tags, str):
+            self.expression = _ExpressionParser(tags, termFactory, matchAll=self.matchAll).parse()
+        else:
+            children = [TermExpression(termFactory(tag)) for tag in tags]
+            if not children:
+                self.expression = None
+            elif len(children) == 1:
+                self.expression = children[0]
+            elif self.matchAll:
+                self.expression = AndExpression(children)
+            else:
+                self.expression = OrExpression(children)
+
+        self.terms = tuple(terms.values())
+        self.tags = tuple(terms.keys())
+        self.positiveTerms = tuple(term for term, negated in self.iterTerms() if not negated)
+
+    def iterTerms(self):
+        """
+        Yields:
+            tuple(TagTerm, bool): Each term in the query and if it is negated
+        """
+        if self.expression is None:
+            return iter(())
+
+        return self.expression.iterTerms()
+
+    def matches(self, tags):
+        """
+        Args:
+            tags (set|frozenset): This is the set of tags from a node
+
+        Returns:
+            bool: True or False if the given tags satisfy the query
+        """
+        if self.expression is None:
+            # Keeps the behaviour of all() and any() when there is nothing to check
+            return self.matchAll
+
+        return self.expression.evaluate(tags)
+
+    def termMatches(self, tags):
+        """
+        Args:
+            tags (set|frozenset): This is the set of tags from a node
+
+        Returns:
+            dict: This is the tag of each term, that is not negated, mapped to the set of given tags which match it
+        """
+        return {term.tag: term.matches(tags) for term in self.positiveTerms}
+
+    @staticmethod
+    def isExpression(text):
+        """
+        Args:
+            text (str): This is the text to check
+
+        Returns:
+            bool: True or False if the given text should be parsed as an expression
+        """
+        return isinstance(text, str) and bool(_expressionCharacters.search(text))
+
+    @classmethod
+    def compile(cls, tags, **kwargs):
+        """
+        This will compile the given tags and search kwargs into a query.  If the given tags are already a query
+        then it will be returned as is
+
+        Args:
+            tags (list|set|str|TagQuery): These are the tags to compile or an expression string
+
+        See TagQuery docs for accepted kwargs
+
+        Raises:
+            ValueError: If the given tags are an invalid expression
+
+        Returns:
+            TagQuery: This is the compiled query
+        """
+        if isinstance(tags, cls):
+            return tags
+
+        if cls.isExpression(tags) and not kwargs.get('useRegex', False):
+            tags = tags.strip()
+        elif isinstance(tags, str):
+            tags = tuple(sorted(nodeTag.logic.getTagsFromString(tags)))
+        else:
+            tags = tuple(sorted(tags or ()))
+
+        return _compile(tags,
+                        kwargs.get('caseSensitive', True),
+                        kwargs.get('exactMatch', True),
+                        kwargs.get('useRegex', False),
+                        kwargs.get('matchAll', True),
+                        kwargs.get('classTag', False))
+
+    @classmethod
+    def fromFilters(cls, filters):
+        """
+        Compiles a query from a filter dict, such as the data sent from the interface to the processor.  If there
+        is an expression in the filters it will be used over the tags
+        Args:
+            filters (dict): This is a dict with the tags and any of the TagQuery kwargs
+
+        Raises:
+            ValueError: If the expression in the filters is invalid
+
+        Returns:
+            TagQuery: This is the compiled query
+        """
+        kwargs = {key: value for key, value in filters.items() if key not in ['tags', 'expression']}
+        expression = filters.get('expression', None)
+        if cls.isExpression(expression) and not kwargs.get('useRegex', False):
+            return cls.compile(expression, **kwargs)
+
+        return cls.compile(filters.get('tags', None), **kwargs)
+
+
+class QueryPlanner(object):
+    """
+    Evaluates a query against the tag index as sets of node ids.  The number of nodes each part of the expression
+    will match is estimated from the index so the most selective parts of an & are evaluated first.  The remaining
+    parts are then checked against the tag bitmask of each node left in the result.  Each term is only resolved
+    against the vocabulary once to get the mask of the tags it matches, and all the terms that resolve to a single
+    tag are combined into one mask so a plain list of tags is a single mask test per node
+
+    Args:
+        index (nodeTag.index._TagIndex): This is the tag index to evaluate against
+        categories (set|optional): This is a set of the index categories to limit the nodes to
+        classTag (bool|optional): True or False if the node classes should be included as tags
+    """
+
+    def __init__(self, index, categories=None, classTag=False):
+        super(QueryPlanner, self).__init__()
+
+        self.index = index
+        self.categories = categories
+        self.classTag = classTag
+
+        self._vocabulary = None
+        self._universe = None
+        self._matchedTags = dict()
+        self._termMasks = dict()
+        self._estimates = dict()
+
+    @property
+    def vocabulary(self):
+        """
+        Returns:
+            set: All the tags in the index
+        """
+        if self._vocabulary is None:
+            self._vocabulary = self.index.vocabulary(classTag=self.classTag)
+
+        return self._vocabulary
+
+    @property
+    def universe(self):
+        """
+        Returns:
+            set: The ids of all the nodes that can be matched, this is used when negating
+        """
+        if self._universe is None:
+            self._universe = self.index.allNodeIds(self.categories)
+
+        return self._universe
+
+    def matchedTags(self, term):
+        """
+        Args:
+            term (TagTerm): This is the term to resolve
+
+        Returns:
+            set: This is all the tags in the index which match the term
+        """
+        if term not in self._matchedTags:
+            self._matchedTags[term] = term.matches(self.vocabulary)
+
+        return self._matchedTags[term]
+
+    def termMask(self, term):
+        """
+        Args:
+            term (TagTerm): This is the term to resolve
+
+        Returns:
+            int: This is the bitmask of all the tags in the index which match the term
+        """
+        if term not in self._termMasks:
+            self._termMasks[term] = self.index.tagMask(self.matchedTags(term))
+
+        return self._termMasks[term]
+
+    def estimate(self, expression):
+        """
+        Estimates the number of nodes the expression will match without building any sets of nodes
+        Args:
+            expression (TermExpression|NotExpression|AndExpression|OrExpression): The expression to estimate
+
+        Returns:
+            int: The estimated number of nodes
+        """
+        if expression in self._estimates:
+            return self._estimates[expression]
+
+        if isinstance(expression, TermExpression):
+            estimate = sum(self.index.tagNodeCount(tag, classTag=self.classTag)
+                           for tag in self.matchedTags(expression.term))
+        elif isinstance(expression, NotExpression):
+            estimate = max(0, len(self.universe) - self.estimate(expression.child))
+        elif isinstance(expression, OrExpression):
+            estimate = min(len(self.universe), sum(self.estimate(child) for child in expression.children))
+        else:
+            estimate = min(self.estimate(child) for child in expression.children)
+
+        self._estimates[expression] = estimate
+        return estimate
+
+    def evaluate(self, query):
+        """
+        Args:
+            query (TagQuery): This is the query to evaluate
+
+        Returns:
+            set: This is the set of ids for all the nodes that match the query
+        """
+        if query.expression is None:
+            # Keeps the behaviour of all() and any() when there is nothing to check
+            return set(self.universe) if query.matchAll else set()
+
+        nodeIds = self._evaluate(query.expression)
+        if self.categories is not None:
+            nodeIds = self.index.filterNodeIds(nodeIds, self.categories)
+
+        return nodeIds
+
+    def _evaluate(self, expression):
+        """
+        Args:
+            expression (TermExpression|NotExpression|AndExpression|OrExpression): The expression to evaluate
+
+        Returns:
+            set: This is a new set of the ids for all the nodes that match the expression
+        """
+        if isinstance(expression, TermExpression):
+            nodeIds = set()
+            for tag in self.matchedTags(expression.term):
+                nodeIds.update(self.index.tagNodeIds(tag, classTag=self.classTag))
+            return nodeIds
+
+        if isinstance(expression, NotExpression):
+            return self.universe.difference(self._evaluate(expression.child))
+
+        if isinstance(expression, OrExpression):
+            return set().union(*[self._evaluate(child) for child in expression.children])
+
+        # Negated children are removed from the result rather than evaluated against the whole universe
+        included = [child for child in expression.children if not isinstance(child, NotExpression)]
+        excluded = [child.child for child in expression.children if isinstance(child, NotExpression)]
+        included.sort(key=self.estimate)
+        excluded.sort(key=self.estimate, reverse=True)
+
+        if included:
+            nodeIds = self._evaluate(included.pop(0))
+        else:
+            nodeIds = set(self.universe)
+
+        # Terms are always checked against the node masks, single tag terms are combined into one mask
+        requiredMask = 0
+        excludedMask = 0
+        termMasks = list()
+        remaining = list()
+        for child, exclude in [(child, False) for child in included] + [(child, True) for child in excluded]:
+            if not isinstance(child, TermExpression):
+                remaining.append((child, exclude))
+                continue
+
+            mask = self.termMask(child.term)
+            if exclude:
+                excludedMask |= mask
+            elif not mask:
+                return set()
+            elif mask & (mask - 1) == 0:
+                requiredMask |= mask
+            else:
+                termMasks.append(mask)
+
+        if requiredMask or excludedMask or termMasks:
+            nodeMask = self.index.nodeMask
+            classTag = self.classTag
+            filteredIds = set()
+            for nodeId in nodeIds:
+                mask = nodeMask(nodeId, classTag=classTag)
+                if mask & requiredMask != requiredMask or mask & excludedMask:
+                    continue
+                if all(mask & termMask for termMask in termMasks):
+                    filteredIds.add(nodeId)
+            nodeIds = filteredIds
+
+        for child, exclude in remaining:
+            if not nodeIds:
+                break
+
+            if len(nodeIds) < self.estimate(child):
+                nodeIds = {nodeId for nodeId in nodeIds
+                           if child.evaluateMask(self.index.nodeMask(nodeId, classTag=self.classTag),
+                                                 self.termMask) != exclude}
+            elif exclude:
+                nodeIds.difference_update(self._evaluate(child))
+            else:
+                nodeIds.intersection_update(self._evaluate(child))
+
+        return nodeIds
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(tags, caseSensitive, exactMatch, useRegex, matchAll, classTag):
+    """
+    Cached constructor for TagQuery.compile so that repeated compiles of the same query, ie: from every tag item
+    in the interface, share a single compiled instance
+    """
+    return TagQuery(tags,
+                    caseSensitive=caseSensitive,
+                    exactMatch=exactMatch,
+                    useRegex=useRegex,
+                    matchAll=matchAll,
+                    classTag=classTag)
@@ -0,0 +1,256 @@
+import time
+import threading
+
+import nuke
+
+import common.utilities
+import nodeTag.logic
+from nodeTag.globals import Globals
+
+'''
+Immutable snapshots of the nodes for the processor thread.  Nuke objects are only safe to use from the
+main thread so the main thread takes a snapshot of the few values the tag tools need from each node, the
+name, class, raw tag string and selection, and everything else is done on the snapshots from any thread.
+
+The snapshots are taken in a single call to the main thread, see collectSnapshots, and any writes that result
+from them are sent back to the main thread in batches, see executeInBatches.  The node held by a snapshot is
+only a handle for these writes and should never be accessed outside of the main thread
+'''
+
+
+class CancelToken(object):
+    """
+    Thread safe flag used to cancel a long running action from another thread, ie: from the UI
+    while the processor thread is running the action
+    """
+
+    def __init__(self):
+        super(CancelToken, self).__init__()
+
+        self._event = threading.Event()
+
+    @property
+    def isCancelled(self):
+        """
+        Returns:
+            bool: True or False if the action has been cancelled
+        """
+        return self._event.is_set()
+
+    def cancel(self):
+        """
+        Flags the action as cancelled, it will stop before the next batch is started
+        """
+        self._event.set()
+
+
+class NodeSnapshot(object):
+    """
+    Read-only record of the values of a node at the time the snapshot was taken
+
+    Args:
+        node (nuke.Node): This is the node, which must only be used from the main thread
+        nodeId (int): This is the hash of the node, the same key used by the tag item registry
+        name (str): This is the name of the node
+        fullName (str): This is the full name of the node including any parent groups
+        nodeClass (str): This is the class of the node
+        tagString (str|None): This is the raw value of the tag knob or None if there is no tag knob
+        selected (bool): True or False if the node was selected
+    """
+
+    __slots__ = ('node', 'nodeId', 'name', 'fullName', 'nodeClass', 'tagString', 'selected')
+
+    def __init__(self, node, nodeId, name, fullName, nodeClass, tagString, selected):
+        for slot, value in zip(self.__slots__, (node, nodeId, name, fullName, nodeClass, tagString,
+                                                selected)):
+            object.__setattr__(self, slot, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('NodeSnapshot is read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError('NodeSnapshot is read-only')
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, self.fullName)
+
+    @classmethod
+    def fromNode(cls, node):
+        """
+        Takes a snapshot of the given node.  This must be called from the main thread
+        Args:
+            node (nuke.Node): This is the node to take the snapshot of
+
+        Returns:
+            NodeSnapshot: This is the snapshot of the node
+        """
+        knob = node.knob(Globals.tagKnobName)
+        return cls(node,
+                   node.__hash__(),
+                   node.name(),
+                   node.fullName(),
+                   node.Class(),
+                   knob.value() if knob else None,
+                   bool(node['selected'].value()))
+
+    @property
+    def state(self):
+        """
+        Returns:
+            tuple: This is the values of the snapshot that are shown for the node, used to check if a
+                   node has changed between two snapshots
+        """
+        return self.nodeId, self.name, self.fullName, self.nodeClass, self.tagString
+
+    @property
+    def hasTagKnob(self):
+        """
+        Returns:
+            bool: True or False if the node had a tag knob
+        """
+        return self.tagString is not None
+
+    def getTags(self, classTag=False):
+        """
+        Parses the tags from the tag string, this is safe to use from any thread
+        Kwargs:
+            classTag (bool|optional): True or False if the nodes class should be included as a tag
+
+        Returns:
+            frozenset: This is the tags that were on the node
+        """
+        tags = nodeTag.logic.getTagsFromString(self.tagString or '')
+        if classTag:
+            return tags.union({self.nodeClass})
+
+        return tags
+
+
+def takeSnapshots(nodes):
+    """
+    Takes a snapshot of each of the given nodes.  This must be called from the main thread, any
+    nodes which have been deleted are skipped
+    Args:
+        nodes (set|list): These are the nodes to take the snapshots of
+
+    Returns:
+        list: This is a list of the snapshots
+    """
+    snapshots = list()
+    for node in nodes:
+        try:
+            snapshots.append(NodeSnapshot.fromNode(node))
+        except ValueError:
+            # The node has been deleted
+            continue
+
+    return snapshots
+
+
+def collectSnapshots(nodes):
+    """
+    Takes a snapshot of each of the given nodes from any thread.  If this is not called from the
+    main thread then all the snapshots are taken within a single call to the main thread
+    Args:
+        nodes (set|list): These are the nodes to take the snapshots of
+
+    Returns:
+        list: This is a list of the snapshots
+    """
+    if threading.current_thread() is threading.main_thread():
+        return takeSnapshots(nodes)
+
+    return nuke.executeInMainThreadWithResult(takeSnapshots, args=(list(nodes),))
+
+
+def _beginUndo(undoName):
+    """
+    Opens an undo group.  This must be called from the main thread
+    Args:
+        undoName (str): This is the name of the undo group
+
+    Returns:
+        nuke.Undo: This is the undo group that is to be ended once all the edits have been made
+    """
+    undoStack = nuke.Undo()
+    undoStack.begin(undoName)
+    return undoStack
+
+
+def executeInBatches(function, items, **kwargs):
+    """
+    Calls the function in the main thread for each batch of the given items, the batch being passed
+    as the first argument.  Each batch is waited on so that all the writes have been made when this
+    returns.
+
+    Each batch is timed and the size of the next batch is adjusted so that a batch takes roughly the
+    time budget.  When called from another thread nuke processes its events between the batches so
+    it stays responsive, the progress can be reported and the batches can be cancelled.
+
+    If an undo name is given then all the batches are made within a single undo group that is opened
+    before the first batch and closed after the last one, or once the batches are cancelled, so the
+    whole call is undone in one step.  As nuke processes its events between the batches any input to
+    nuke that could make other edits should be blocked until this returns, ie: with an InputBlocker,
+    otherwise those edits are folded in to the group.  The function should not open its own undo
+    groups
+    Args:
+        function (callable): This is the function that will make the writes for a batch
+        items (list|dict): These are the items to split in to batches.  A dict is split in to dicts
+
+    Kwargs:
+        batchSize (int|optional): This is the number of items in the first batch
+                  default: Globals.writeBatchSize
+        timeBudget (float|optional): This is the time in seconds each batch should take, if this is
+                                     0 then the batch size is never adjusted
+                   default: Globals.writeTimeBudget
+        cancelToken (CancelToken|optional): This is checked before each batch is started
+        progressCallback (callable|optional): This is called after each batch with the number of
+                                              items completed, the total number of items and the
+                                              estimated time remaining in seconds
+        undoName (str|optional): This is the name of the undo group for all the batches
+        All other kwargs are passed to the function
+
+    Returns:
+        list: This is the results of each batch that was run
+    """
+    batchSize = max(1, kwargs.pop('batchSize', Globals.writeBatchSize))
+    timeBudget = kwargs.pop('timeBudget', Globals.writeTimeBudget)
+    cancelToken = kwargs.pop('cancelToken', None)
+    progressCallback = kwargs.pop('progressCallback', None)
+    undoName = kwargs.pop('undoName', None)
+
+    isDict = isinstance(items, dict)
+    keys = list(items)
+
+    undoStack = None
+    if undoName and keys:
+        undoStack = common.utilities.runInMainThread(_beginUndo, undoName)
+
+    results = list()
+    position = 0
+    start = time.perf_counter()
+    try:
+        while position < len(keys):
+            if cancelToken is not None and cancelToken.isCancelled:
+                break
+
+            batch = keys[position:position + batchSize]
+            if isDict:
+                batch = {key: items[key] for key in batch}
+
+            batchStart = time.perf_counter()
+            results.append(common.utilities.runInMainThread(function, batch, **kwargs))
+            elapsed = time.perf_counter() - batchStart
+            position += len(batch)
+
+            if progressCallback is not None:
+                remaining = (time.perf_counter() - start) / position * (len(keys) - position)
+                progressCallback(position, len(keys), remaining)
+
+            if timeBudget and elapsed > 0:
+                batchSize = max(1, min(batchSize * 2, int(len(batch) * timeBudget / elapsed)))
+    finally:
+        if undoStack is not None:
+            common.utilities.runInMainThread(undoStack.end)
+
+    return results
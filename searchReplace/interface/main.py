@@ -45,6 +45,7 @@ class SearchReplacePane(QtGui.BaseWidget):
         self.versionLabel = QtGui.QLabel()
 
         self.mouseFilter = QtGui.MouseEventFilter.globalInstance()
+        self.updateScheduler = QtCore.UpdateScheduler(self.updateInfo)
 
         self._historyPath = None
         self._history = None
@@ -108,7 +109,7 @@ class SearchReplacePane(QtGui.BaseWidget):
         self.replaceLine.editingFinished.connect(self.updateInfo)
         self.caseSensitiveCheck.stateChanged.connect(self.updateInfo)
         self.useRegexCheck.stateChanged.connect(self.updateInfo)
-        self.mouseFilter.mouseReleased.connect(self.updateInfo)
+        self.mouseFilter.mouseReleased.connect(self.updateScheduler.request)
 
     def removeMargins(self):
         """
@@ -126,17 +127,13 @@ class SearchReplacePane(QtGui.BaseWidget):
     def nodes(self):
         """
         Returns:
-             set: the current selection of  nodes.  All nodes if not set to selected
+             list|generator: the current selection of  nodes.  All nodes if not set to selected,
+                             which are streamed from common.utilities.iterNodes
         """
         if self.selectionModeDrop.currentText() == self.selectedNodes:
-            nodes = nuke.selectedNodes()
-        else:
-            nodes = common.utilities.allNodes()
-
-        if not isinstance(nodes, set):
-            nodes = set(nodes)
+            return nuke.selectedNodes()
 
-        return nodes
+        return common.utilities.iterNodes()
 
     @property
     def historyPath(self):
@@ -16,16 +16,25 @@ def getNodeInfo(nodes, search, replace, **kwargs):
                     out: formatted output value (html formatted with)
                     matches: list(all of the matches found in the source)
     Args:
-        nodes (set|list): iterator of all the nodes to process
+        nodes (set|list|None): iterator of all the nodes to process.  If this is None then the nodes
+                               are streamed from common.utilities.iterNodes
         search (str): search string used to find matches
         replace (str): string to be used when processing replace
 
     kwargs:
         useRegex (bool|optional): True or False if the search is regex formatted
         caseSensitive (bool|optional): True of False if the search should be case-sensitive
+        recurseGroups (bool|optional): True or False if the nodes within groups are processed when
+                                       no nodes are given
+        limit (int|optional): This is the maximum number of nodes to return, the search stops as
+                              soon as this many nodes have been found
     Returns:
         dict: Dictionary of all the nodes which have knobs that match the given search
     """
+    limit = kwargs.get('limit', None)
+    if nodes is None:
+        nodes = common.utilities.iterNodes(recurseGroups=kwargs.get('recurseGroups', False))
+
     searchData = dict()
     for node in nodes:
         nodeData = dict()
@@ -34,17 +43,19 @@ def getNodeInfo(nodes, search, replace, **kwargs):
             continue
 
         for knob in fileKnobs:
-            matches = getMatches(knob.value(), search, **kwargs)
+            value = knob.value()
+            matches = getMatches(value, search, **kwargs)
             if not matches:
                 continue
 
-            source = getFormattedText(knob.value(), matches)
-            nodeData[knob.name()] = {'in': source,
-                                     'out': getFormattedText(knob.value(), matches, replace),
+            nodeData[knob.name()] = {'in': getFormattedText(value, matches),
+                                     'out': getFormattedText(value, matches, replace),
                                      'matches': matches}
 
         if nodeData:
             searchData[node.fullName()] = nodeData
+            if limit and len(searchData) >= limit:
+                break
 
     return searchData
 
@@ -0,0 +1,73 @@
+import os
+import sys
+import unittest
+
+_testDir = os.path.dirname(os.path.abspath(__file__))
+_rootDir = os.path.dirname(_testDir)
+# The stubs are only ever placed on the path here so that they can never shadow a real nuke
+sys.path.insert(0, os.path.join(_rootDir, 'benchmarks', 'stubs'))
+sys.path.insert(0, _rootDir)
+
+import nuke
+
+import common.utilities
+import nodeTag.index
+import nodeTag.logic
+
+
+'''
+Tests for keeping the tag index in sync with the script.  These run with plain python using the
+synthetic nuke module within benchmarks/stubs
+
+Usage:
+    python -m unittest discover tests
+'''
+
+
+class TestIndexUndo(unittest.TestCase):
+
+    def setUp(self):
+        nuke.scriptClear()
+        common.utilities.NodeCache.refresh()
+
+        self.nodes = [nuke.createNode('Blur') for _ in range(3)]
+        nodeTag.logic.tagNodes(self.nodes, ['comp', 'keep'])
+        nodeTag.index.TagIndex.rebuild()
+
+    def tearDown(self):
+        nuke.scriptClear()
+        nodeTag.index.TagIndex.clear()
+
+    def testUndoRemove(self):
+        nodeTag.logic.modifyTags(self.nodes[:2], remove=['comp'])
+        self.assertEqual(nodeTag.logic.findNodes(['comp']), {self.nodes[2]})
+
+        nuke.undo()
+        self.assertEqual(nodeTag.logic.findNodes(['comp']), set(self.nodes))
+        self.assertTrue(nodeTag.logic.hasTag(self.nodes[0], 'comp'))
+        self.assertIn('comp', nodeTag.logic.getAllTags())
+
+        nuke.redo()
+        self.assertEqual(nodeTag.logic.findNodes(['comp']), {self.nodes[2]})
+        self.assertFalse(nodeTag.logic.hasTag(self.nodes[0], 'comp'))
+
+    def testUndoClear(self):
+        nodeTag.logic.modifyTags(self.nodes, remove=['comp', 'keep'])
+        self.assertNotIn('keep', nodeTag.logic.getAllTags())
+
+        nuke.undo()
+        self.assertEqual(nodeTag.logic.findNodes(['keep']), set(self.nodes))
+        self.assertEqual(nodeTag.logic.getAllTags(), {'comp', 'keep'})
+
+    def testSyncFromOtherThread(self):
+        nodeTag.logic.modifyTags(self.nodes, remove=['comp'])
+        nuke.undo()
+
+        generation = nodeTag.index.TagIndex.generation
+        nodeTag.index.TagIndex.sync()
+        self.assertNotEqual(nodeTag.index.TagIndex.generation, generation)
+        self.assertEqual(nodeTag.index.TagIndex.nodeTags(self.nodes[0]), {'comp', 'keep'})
+
+
+if __name__ == '__main__':
+    unittest.main()